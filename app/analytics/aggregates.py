@@ -0,0 +1,35 @@
+from sqlalchemy import text
+from app.analytics.labels import label_dictionary
+from app.core.db import engine
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Materialized views read by the analytics handlers, refreshed after loads
+AGGREGATE_VIEWS = ["finance.survey_label_stats"]
+
+
+def refresh_aggregates(db_engine=engine) -> float:
+    """
+    Refresh the survey aggregates without blocking readers.
+    Call after finance.survey_metrics has been (re)loaded.
+    Returns the refresh time in seconds.
+    """
+    start = time.perf_counter()
+
+    # CONCURRENTLY cannot run inside a transaction block
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for view in AGGREGATE_VIEWS:
+            conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+
+    label_dictionary.invalidate()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Refreshed {len(AGGREGATE_VIEWS)} aggregate views in {elapsed:.2f}s")
+    return elapsed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Refreshed survey aggregates in {refresh_aggregates():.2f}s")
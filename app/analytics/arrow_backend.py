@@ -0,0 +1,95 @@
+from pathlib import Path
+from app.analytics.labels import match_topics
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+SURVEY_PARQUET_PATH = Path(
+    os.getenv(
+        "SURVEY_PARQUET_PATH", "data/processed/structured/raq_results_long.parquet"
+    )
+)
+
+
+class SurveyTable:
+    """
+    In-process survey analytics over the long-format Parquet file.
+    The file is memory-mapped with Arrow and aggregated once per load into
+    the same shape as finance.survey_label_stats. It is reloaded when the
+    file's modification time or size changes.
+    """
+
+    def __init__(self, path: Path = SURVEY_PARQUET_PATH):
+        self.path = Path(path)
+        self._signature = None
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Arrow is imported on first load, so the default postgres backend
+        # does not pay for it at startup
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(self.path, memory_map=True)
+        stats = (
+            table.group_by(["item_code", "item_label"])
+            .aggregate(
+                [([], "count_all"), ("value", "mean"), ("period", "count_distinct")]
+            )
+            .rename_columns(
+                [
+                    "item_code",
+                    "item_label",
+                    "response_count",
+                    "avg_value",
+                    "period_count",
+                ]
+            )
+        )
+        labels = dict(
+            zip(
+                stats.column("item_code").to_pylist(),
+                stats.column("item_label").to_pylist(),
+            )
+        )
+        logger.info(f"Loaded {table.num_rows} survey rows from {self.path}")
+        return stats, match_topics(labels)
+
+    def refresh(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._state = self._load()
+                    self._signature = signature
+
+        return self._state
+
+    def topic_stats(self, topic: str, limit: int = 20) -> list[dict]:
+        stats, topics = self.refresh()
+        item_codes = topics.get(topic, [])
+        if not item_codes:
+            return []
+
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        rows = stats.filter(
+            pc.is_in(stats.column("item_code"), value_set=pa.array(item_codes))
+        ).sort_by([("response_count", "descending"), ("item_label", "ascending")])
+
+        return [
+            {
+                "answer": row["item_label"],
+                "responses": int(row["response_count"]),
+                "avg_value": row["avg_value"],
+            }
+            for row in rows.slice(0, limit).to_pylist()
+        ]
+
+
+survey_table = SurveyTable()
@@ -1,31 +1,115 @@
 from sqlalchemy import text
+from app.analytics.arrow_backend import survey_table
+from app.analytics.labels import label_dictionary
+from app.core.metrics import stage
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# "postgres" reads the aggregate views, "arrow" aggregates the survey Parquet in-process
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "postgres")
 
-def profitability_expectations(engine):
+# topic -> {"handler": async fn(engine), "description": str}
+HANDLERS: dict[str, dict] = {}
+
+TOPIC_STATS_SQL = text("""
+    SELECT item_label, response_count, avg_value
+    FROM finance.survey_label_stats
+    WHERE item_code = ANY(:item_codes)
+    ORDER BY response_count DESC, item_label
+    LIMIT :limit
+""")
+
+
+def register(topic: str, description: str):
+    """Register an analytics handler for a survey topic."""
+
+    def decorator(fn):
+        HANDLERS[topic] = {"handler": fn, "description": description}
+        return fn
+
+    return decorator
+
+
+async def topic_stats(engine, topic: str, limit: int = 20) -> list[dict]:
+    """
+    Read precomputed label statistics for one topic.
+    Labels are resolved through the in-memory label dictionary, so the
+    query is an indexed lookup on the aggregate view.
+    """
+    with stage("analytics"):
+        if ANALYTICS_BACKEND == "arrow":
+            return survey_table.topic_stats(topic, limit)
+
+        item_codes = await label_dictionary.item_codes(engine, topic)
+        if not item_codes:
+            return []
+
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                TOPIC_STATS_SQL, {"item_codes": item_codes, "limit": limit}
+            )
+            return [
+                {
+                    "answer": row.item_label,
+                    "responses": int(row.response_count),
+                    "avg_value": (
+                        float(row.avg_value) if row.avg_value is not None else None
+                    ),
+                }
+                for row in result
+            ]
+
+
+@register("profitability", "banks' profitability expectations")
+async def profitability_expectations(engine):
     """
     Query survey metrics related to profitability expectations.
     Returns list of dicts with answer and response count.
     """
     try:
-        sql = text("""
-            SELECT
-                item_label,
-                COUNT(*) as response_count
-            FROM finance.survey_metrics
-            WHERE item_label ILIKE '%profitability%'
-            GROUP BY item_label
-            ORDER BY response_count DESC
-            LIMIT 20
-        """)
-
-        with engine.connect() as conn:
-            result = conn.execute(sql)
-            rows = result.fetchall()
-
-            return [{"answer": row[0], "responses": int(row[1])} for row in rows]
+        return await topic_stats(engine, "profitability")
     except Exception as e:
         logger.error(f"Error in profitability_expectations: {e}")
         return []
+
+
+@register("capital", "banks' capital plans and expectations")
+async def capital_expectations(engine):
+    """Survey metrics on capital levels, MREL and distributions."""
+    try:
+        return await topic_stats(engine, "capital")
+    except Exception as e:
+        logger.error(f"Error in capital_expectations: {e}")
+        return []
+
+
+@register("liquidity", "banks' liquidity expectations")
+async def liquidity_expectations(engine):
+    """Survey metrics on liquidity positions and central bank funding."""
+    try:
+        return await topic_stats(engine, "liquidity")
+    except Exception as e:
+        logger.error(f"Error in liquidity_expectations: {e}")
+        return []
+
+
+@register("asset_quality", "banks' asset quality expectations")
+async def asset_quality_expectations(engine):
+    """Survey metrics on asset quality, NPLs and cost of risk."""
+    try:
+        return await topic_stats(engine, "asset_quality")
+    except Exception as e:
+        logger.error(f"Error in asset_quality_expectations: {e}")
+        return []
+
+
+@register("funding", "banks' funding plans")
+async def funding_expectations(engine):
+    """Survey metrics on funding instruments and deposits."""
+    try:
+        return await topic_stats(engine, "funding")
+    except Exception as e:
+        logger.error(f"Error in funding_expectations: {e}")
+        return []
@@ -0,0 +1,76 @@
+from sqlalchemy import text
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+LABEL_DICTIONARY_TTL = float(os.getenv("LABEL_DICTIONARY_TTL", "300"))
+
+# Survey topics and the label wording that belongs to them
+TOPIC_PATTERNS = {
+    "profitability": re.compile(
+        r"profitab|\broe\b|return on equity|net interest income|\bfees?\b|earnings",
+        re.IGNORECASE,
+    ),
+    "capital": re.compile(
+        r"capital|\bcet1\b|\bmrel\b|dividend|buy-?back|leverage ratio", re.IGNORECASE
+    ),
+    "liquidity": re.compile(r"liquidity|\blcr\b|\bnsfr\b|central bank", re.IGNORECASE),
+    "asset_quality": re.compile(
+        r"asset quality|non-performing|\bnpls?\b|credit quality|cost of risk"
+        r"|impairment|forbear|\bdefaults?\b",
+        re.IGNORECASE,
+    ),
+    "funding": re.compile(
+        r"funding|deposits?\b|\bbonds?\b|issuance|wholesale", re.IGNORECASE
+    ),
+}
+
+LABELS_SQL = text("""
+    SELECT item_code, item_label
+    FROM finance.survey_label_stats
+""")
+
+
+def match_topics(labels: dict[str, str]) -> dict[str, list[str]]:
+    """Map each topic to the item codes whose label mentions it."""
+    return {
+        topic: [code for code, label in labels.items() if pattern.search(label)]
+        for topic, pattern in TOPIC_PATTERNS.items()
+    }
+
+
+class LabelDictionary:
+    """
+    In-memory item label dictionary built from the aggregate table.
+    Topic matching happens once per load instead of an ILIKE scan per
+    request. Reloaded every LABEL_DICTIONARY_TTL seconds or on invalidate().
+    """
+
+    def __init__(self, ttl: float = LABEL_DICTIONARY_TTL):
+        self.ttl = ttl
+        self._loaded_at = 0.0
+        self._topics: dict[str, list[str]] | None = None
+
+    async def _load(self, engine) -> dict[str, list[str]]:
+        async with engine.connect() as conn:
+            result = await conn.execute(LABELS_SQL)
+            labels = {row.item_code: row.item_label for row in result}
+
+        logger.info(f"Loaded {len(labels)} survey labels")
+        return match_topics(labels)
+
+    async def item_codes(self, engine, topic: str) -> list[str]:
+        if self._topics is None or time.monotonic() - self._loaded_at > self.ttl:
+            self._topics = await self._load(engine)
+            self._loaded_at = time.monotonic()
+
+        return self._topics.get(topic, [])
+
+    def invalidate(self):
+        self._topics = None
+
+
+label_dictionary = LabelDictionary()
@@ -1,46 +1,57 @@
-from app.analytics.handlers import profitability_expectations
-from app.core.db import engine
+from app.analytics.handlers import HANDLERS
+from app.analytics.labels import TOPIC_PATTERNS
+from app.core.db import async_engine
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def handle_analytics_query(query: str) -> dict:
+def detect_topic(query: str) -> str | None:
+    """Return the first registered survey topic the query mentions."""
+    for topic in HANDLERS:
+        if TOPIC_PATTERNS[topic].search(query):
+            return topic
+    return None
+
+
+async def handle_analytics_query(query: str) -> dict:
     """
-    MVP analytics router.
-    Decides which analytics handler to run based on query intent.
+    Analytics router.
+    Dispatches to the registered handler for the survey topic in the query.
     Returns structured dict with summary, data, and source.
     """
     try:
-        query_lower = query.lower()
-
-        if "profitability" in query_lower:
-            rows = profitability_expectations(engine)
-
-            if not rows:
-                return {
-                    "summary": "No profitability data found in the survey metrics.",
-                    "data": [],
-                    "source": "EBA RAQ Survey 2025",
-                }
-
-            summary_lines = [
-                f"- {row['answer']}: {row['responses']} responses" for row in rows[:10]
-            ]
-
-            summary = (
-                "Based on the EBA RAQ survey, banks' profitability expectations "
-                "are primarily driven by the following factors:\n"
-                + "\n".join(summary_lines)
-            )
-
-            return {"summary": summary, "data": rows, "source": "EBA RAQ Survey 2025"}
-
-        return {
-            "summary": "No matching analytics logic found for this query. Try asking about profitability expectations.",
-            "data": [],
-            "source": "EBA RAQ Survey 2025",
-        }
+        topic = detect_topic(query)
+
+        if topic is None:
+            topics = ", ".join(t.replace("_", " ") for t in HANDLERS)
+            return {
+                "summary": f"No matching analytics logic found for this query. Try asking about {topics}.",
+                "data": [],
+                "source": "EBA RAQ Survey 2025",
+            }
+
+        entry = HANDLERS[topic]
+        rows = await entry["handler"](async_engine)
+
+        if not rows:
+            return {
+                "summary": f"No {topic.replace('_', ' ')} data found in the survey metrics.",
+                "data": [],
+                "source": "EBA RAQ Survey 2025",
+            }
+
+        summary_lines = [
+            f"- {row['answer']}: {row['responses']} responses" for row in rows[:10]
+        ]
+
+        summary = (
+            f"Based on the EBA RAQ survey, {entry['description']} "
+            "are primarily driven by the following factors:\n"
+            + "\n".join(summary_lines)
+        )
+
+        return {"summary": summary, "data": rows, "source": "EBA RAQ Survey 2025"}
 
     except Exception as e:
         logger.error(f"Error in handle_analytics_query: {e}")
@@ -1,24 +1,95 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 from pydantic import BaseModel
+from datetime import date
+import asyncio
+import json
 import logging
+import time
 
-from app.classification.query_classifier import classify_query
+from app.classification.query_classifier import aclassify_query
+from app.api.warmup import STARTUP_WARMUP, check_ready, mark_ready, readiness, warm_up
+from app.core.db import async_engine, engine
+from app.core.embedding_cache import embedding_cache
+from app.core.metrics import (
+    REQUEST_SECONDS,
+    StatsCollector,
+    server_timing,
+    set_query_type,
+    stage,
+    start_request,
+)
+from app.rag.answer_cache import answer_cache
 from app.analytics.router import handle_analytics_query
-from app.rag.answer_generator import generate_rag_answer
-from app.hybrid.hybrid_answer_generator import generate_hybrid_answer
+from app.rag.answer_generator import generate_rag_answer, stream_rag_answer
+from app.batch.batch_runner import run_query_batch
+from app.hybrid.hybrid_answer_generator import (
+    generate_hybrid_answer,
+    stream_hybrid_answer,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the process accepts connections at
+    # once; /ready turns 200 when it can serve queries
+    warmup_task = asyncio.create_task(warm_up()) if STARTUP_WARMUP else None
+    if warmup_task is None:
+        mark_ready()
+
+    yield
+
+    if warmup_task is not None:
+        warmup_task.cancel()
+    if async_engine.created:
+        await async_engine.dispose()
+
+
 app = FastAPI(
     title="Regulatory Analytics Assistant",
     description="Hybrid AI assistant for regulatory documents and financial analytics",
     version="0.1.0",
+    lifespan=lifespan,
+)
+
+REGISTRY.register(
+    StatsCollector(
+        caches={"embedding": embedding_cache, "answer": answer_cache},
+        engines={"sync": engine, "async": async_engine},
+    )
 )
 
+# Endpoints whose latency is recorded per query type
+TIMED_PATHS = {"/query", "/query/stream", "/query/batch"}
+
+
+class SearchFilters(BaseModel):
+    """Scope document retrieval; unset fields do not filter."""
+
+    file_names: list[str] | None = None
+    document_ids: list[int] | None = None
+    page_from: int | None = None
+    page_to: int | None = None
+    published_from: date | None = None
+    published_to: date | None = None
+
 
 class QueryRequest(BaseModel):
     query: str
+    filters: SearchFilters | None = None
+
+    def filter_dict(self) -> dict | None:
+        return self.filters.model_dump() if self.filters else None
+
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str]
+    top_k: int = 5
 
 
 class Source(BaseModel):
@@ -33,14 +104,65 @@ class QueryResponse(BaseModel):
     sources: list[Source]
 
 
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    """
+    Collect per-stage timings for the request and return them in a
+    Server-Timing header. Streaming responses only include the stages
+    finished before the first byte. Request latency is recorded once the
+    body is complete, when streaming endpoints know their query type.
+    """
+    state = start_request()
+    started = time.perf_counter()
+
+    response = await call_next(request)
+
+    stages = {**state["stages"], "total": time.perf_counter() - started}
+    response.headers["Server-Timing"] = server_timing(stages)
+
+    if request.url.path in TIMED_PATHS:
+        body = response.body_iterator
+
+        async def observed_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                REQUEST_SECONDS.labels(request.url.path, state["query_type"]).observe(
+                    time.perf_counter() - started
+                )
+
+        response.body_iterator = observed_body()
+
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
-def health():
+async def health():
     """Healthcheck endpoint"""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness endpoint: 503 until warm-up has reached the database"""
+    if await check_ready():
+        return {"status": "ready", "steps": readiness["steps"]}
+
+    status = "unavailable" if readiness["finished"] else "warming_up"
+    return JSONResponse(
+        status_code=503, content={"status": status, "steps": readiness["steps"]}
+    )
+
+
 @app.post("/query", response_model=QueryResponse)
-def query_assistant(request: QueryRequest):
+async def query_assistant(request: QueryRequest):
     """
     Main query endpoint.
     Classifies query and returns appropriate response.
@@ -52,19 +174,25 @@ def query_assistant(request: QueryRequest):
             raise HTTPException(status_code=400, detail="Query must not be empty")
 
         logger.info(f"Processing query: {query[:100]}")
+        filters = request.filter_dict()
 
-        query_type = classify_query(query)
+        # The embedding computed for classification is reused for retrieval
+        with stage("classify"):
+            query_type, query_embedding = await aclassify_query(query)
+        set_query_type(query_type)
         logger.info(f"Query classified as: {query_type}")
 
         if query_type == "analytics":
-            analytics_result = handle_analytics_query(query)
+            analytics_result = await handle_analytics_query(query)
 
             return QueryResponse(
                 query_type="analytics", answer=analytics_result["summary"], sources=[]
             )
 
         elif query_type == "document":
-            rag_result = generate_rag_answer(query)
+            rag_result = await generate_rag_answer(
+                query, query_embedding=query_embedding, filters=filters
+            )
 
             return QueryResponse(
                 query_type="document",
@@ -80,7 +208,12 @@ def query_assistant(request: QueryRequest):
             )
 
         else:  # hybrid
-            hybrid_result = generate_hybrid_answer(query)
+            hybrid_result = await generate_hybrid_answer(
+                query,
+                query_type=query_type,
+                query_embedding=query_embedding,
+                filters=filters,
+            )
 
             return QueryResponse(
                 query_type="hybrid",
@@ -103,3 +236,106 @@ def query_assistant(request: QueryRequest):
         raise HTTPException(
             status_code=500, detail="Internal server error while processing query"
         )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_events(query: str, filters: dict | None = None):
+    """
+    Server-sent events for /query/stream.
+    Emits `meta` (query type and sources) once retrieval is done,
+    then `token` events with answer text, then `done`.
+    """
+    try:
+        with stage("classify"):
+            query_type, query_embedding = await aclassify_query(query)
+        set_query_type(query_type)
+        logger.info(f"Query classified as: {query_type}")
+
+        if query_type == "analytics":
+            analytics_result = await handle_analytics_query(query)
+            yield _sse("meta", {"query_type": query_type, "sources": []})
+            yield _sse("token", {"text": analytics_result["summary"]})
+            yield _sse("done", {})
+            return
+
+        events = (
+            stream_rag_answer(query, query_embedding=query_embedding, filters=filters)
+            if query_type == "document"
+            else stream_hybrid_answer(
+                query, query_embedding=query_embedding, filters=filters
+            )
+        )
+
+        async for event in events:
+            if event["event"] == "sources":
+                sources = [
+                    Source(
+                        file=src.get("file", ""),
+                        page=src.get("page"),
+                        score=src.get("score"),
+                    ).model_dump()
+                    for src in event["sources"]
+                ]
+                yield _sse("meta", {"query_type": query_type, "sources": sources})
+            else:
+                yield _sse("token", {"text": event["text"]})
+
+        yield _sse("done", {})
+
+    except Exception:
+        logger.exception("Unexpected error streaming query")
+        yield _sse("error", {"detail": "Internal server error while processing query"})
+
+
+@app.post("/query/stream")
+async def query_assistant_stream(request: QueryRequest):
+    """
+    Streaming variant of /query.
+    Sources are sent as soon as retrieval finishes and answer tokens are
+    forwarded as they arrive from the model.
+    """
+    query = request.query.strip()
+
+    if not query:
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+
+    logger.info(f"Streaming query: {query[:100]}")
+
+    return StreamingResponse(
+        _stream_events(query, request.filter_dict()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream_batch(queries: list[str], top_k: int):
+    # A batch mixes query types, so its latency is recorded as one type
+    set_query_type("batch")
+    try:
+        async for item in run_query_batch(queries, top_k=top_k):
+            yield json.dumps(item) + "\n"
+    except Exception:
+        logger.exception("Unexpected error processing query batch")
+        yield json.dumps({"error": "Internal server error while processing batch"})
+        yield "\n"
+
+
+@app.post("/query/batch")
+async def query_assistant_batch(request: BatchQueryRequest):
+    """
+    Bulk query endpoint.
+    Answers a list of queries with shared classification, embedding and
+    retrieval work and streams one NDJSON line per query in input order.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="Queries must not be empty")
+
+    logger.info(f"Processing batch of {len(request.queries)} queries")
+
+    return StreamingResponse(
+        _stream_batch(request.queries, request.top_k),
+        media_type="application/x-ndjson",
+    )
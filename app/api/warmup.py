@@ -0,0 +1,144 @@
+from sqlalchemy import text
+from app.analytics.arrow_backend import survey_table
+from app.analytics.handlers import ANALYTICS_BACKEND
+from app.classification.query_classifier import CLASSIFIER_MODE, intent_centroids
+from app.core.db import DB_POOL_WARMUP, async_engine, warm_pool
+from app.rag.answer_cache import corpus_version
+from app.rag.index_manager import current_search_params
+from app.rag.partitions import partition_groups
+from app.rag.retriever import RETRIEVER_BACKEND, warmup_statements
+from app.rag.vector_index import vector_index
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Warm the process up in the background at startup; /ready reports progress
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+# Relations loaded into shared buffers with pg_prewarm, partitions included
+PREWARM_RELATIONS = [
+    name.strip()
+    for name in os.getenv(
+        "PREWARM_RELATIONS",
+        "rag.idx_document_embeddings_vector,rag.document_embeddings,"
+        "finance.survey_metrics,finance.survey_label_stats",
+    ).split(",")
+    if name.strip()
+]
+
+PREWARM_SQL = text("""
+    WITH targets AS (
+        SELECT to_regclass(name) AS rel
+        FROM unnest(CAST(:relations AS text[])) AS name
+    ),
+    parts AS (
+        SELECT rel AS relid FROM targets
+        UNION
+        SELECT i.inhrelid FROM targets JOIN pg_inherits i ON i.inhparent = targets.rel
+    )
+    SELECT COALESCE(SUM(pg_prewarm(parts.relid)), 0)
+    FROM parts
+    JOIN pg_class c ON c.oid = parts.relid
+    WHERE c.relkind IN ('r', 'i', 'm')
+""")
+
+# Warm-up progress of this process: step results and whether it can serve
+readiness = {"ready": False, "finished": False, "steps": {}}
+
+
+async def _check_database():
+    async with async_engine.connect() as conn:
+        return (await conn.execute(text("SELECT 1"))).scalar_one()
+
+
+async def _prepare_statements():
+    # Fails on databases missing an upgrade that a statement relies on,
+    # which only costs the first requests a prepare
+    return await warm_pool(max(DB_POOL_WARMUP, 1), warmup_statements())
+
+
+async def _prewarm_relations():
+    async with async_engine.connect() as conn:
+        result = await conn.execute(PREWARM_SQL, {"relations": PREWARM_RELATIONS})
+        return result.scalar_one()
+
+
+async def _search_settings():
+    await current_search_params()
+    await partition_groups()
+
+
+async def _intent_centroids():
+    # Also opens the connection to the OpenAI API
+    intents, _ = await intent_centroids()
+    return len(intents)
+
+
+def warmup_steps() -> list[tuple]:
+    """(name, coroutine function) pairs run once the database answers."""
+    steps = [
+        ("statements", _prepare_statements),
+        ("prewarm", _prewarm_relations),
+        ("search_settings", _search_settings),
+        ("corpus_version", corpus_version),
+    ]
+    if RETRIEVER_BACKEND == "numpy":
+        steps.append(("vector_index", lambda: asyncio.to_thread(vector_index.refresh)))
+    if ANALYTICS_BACKEND == "arrow":
+        steps.append(("survey_table", lambda: asyncio.to_thread(survey_table.refresh)))
+    if CLASSIFIER_MODE == "embedding":
+        steps.append(("intent_centroids", _intent_centroids))
+    return steps
+
+
+async def _run_step(name: str, func) -> bool:
+    started = time.perf_counter()
+    try:
+        result = await func()
+        step = {"ok": True}
+        if isinstance(result, (int, float)):
+            step["result"] = result
+    except Exception as e:
+        logger.warning(f"Warm-up step {name} failed: {e}")
+        step = {"ok": False, "error": str(e)}
+
+    step["seconds"] = round(time.perf_counter() - started, 3)
+    readiness["steps"][name] = step
+    return step["ok"]
+
+
+async def warm_up() -> dict:
+    """
+    Open pooled connections, load the vector index and survey tables into
+    Postgres' buffer cache and prime the in-process caches, so the first
+    requests do not pay for cold connections and page faults.
+    The process is ready once the database answers a query; the other
+    steps are best effort.
+    """
+    started = time.perf_counter()
+
+    # Ready as soon as the database answers; the rest only speeds up the
+    # first requests and keeps running in the background
+    readiness["ready"] = await _run_step("database", _check_database)
+    await asyncio.gather(*(_run_step(name, func) for name, func in warmup_steps()))
+
+    readiness["finished"] = True
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.1f}s")
+    return readiness
+
+
+async def check_ready() -> bool:
+    """
+    Readiness for /ready. After a finished warm-up that could not reach the
+    database, the database is re-checked on each call.
+    """
+    if readiness["finished"] and not readiness["ready"]:
+        readiness["ready"] = await _run_step("database", _check_database)
+    return readiness["ready"]
+
+
+def mark_ready():
+    readiness.update(ready=True, finished=True)
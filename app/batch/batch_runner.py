@@ -0,0 +1,137 @@
+from collections.abc import AsyncIterator
+from app.classification.query_classifier import (
+    CLASSIFIER_MODE,
+    answerable_intent,
+    classify_embedding,
+    keyword_intent,
+)
+from app.analytics.router import handle_analytics_query
+from app.core.embedding_cache import aget_cached_embeddings
+from app.rag.answer_generator import answer_from_chunks
+from app.rag.context_packer import CONTEXT_CANDIDATES_PER_K, pack_context
+from app.rag.retriever import retrieve_chunks_batch
+from app.hybrid.hybrid_answer_generator import combine_hybrid_answer
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BATCH_DB_CONNECTIONS = int(os.getenv("BATCH_DB_CONNECTIONS", "4"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "16"))
+
+
+async def _answer(
+    query: str,
+    query_type: str,
+    embedding: list[float] | None,
+    chunks: list[dict] | None,
+    top_k: int,
+    semaphore: asyncio.Semaphore,
+) -> dict:
+    try:
+        async with semaphore:
+            # Packing reads stored embeddings, so it shares the bound too
+            if chunks:
+                chunks = await pack_context(embedding, chunks, max_chunks=top_k)
+
+            if query_type == "analytics":
+                analytics_result = await handle_analytics_query(query)
+                return {"answer": analytics_result["summary"], "sources": []}
+
+            if query_type == "document":
+                rag_result = await answer_from_chunks(query, embedding, chunks)
+                return {
+                    "answer": rag_result["answer"],
+                    "sources": rag_result["sources"],
+                }
+
+            analytics_result, rag_result = await asyncio.gather(
+                handle_analytics_query(query),
+                answer_from_chunks(query, embedding, chunks),
+            )
+            return combine_hybrid_answer(analytics_result, rag_result)
+
+    except Exception as e:
+        logger.error(f"Error answering batch query: {e}")
+        return {
+            "answer": "Error processing your query. Please try again.",
+            "sources": [],
+        }
+
+
+async def run_query_batch(
+    queries: list[str],
+    top_k: int = 5,
+    connections: int = BATCH_DB_CONNECTIONS,
+    llm_concurrency: int = BATCH_LLM_CONCURRENCY,
+) -> AsyncIterator[dict]:
+    """
+    Answer a list of queries with shared work.
+    Duplicates are answered once, RAG queries are embedded in one batch and
+    searched over a few pooled connections, and LLM and analytics calls are
+    bounded by `llm_concurrency`. Results are yielded in input order.
+    """
+    normalized = [q.strip() for q in queries]
+    unique = [q for q in dict.fromkeys(normalized) if q]
+    query_types = {q: keyword_intent(q) for q in unique}
+    if CLASSIFIER_MODE != "embedding":
+        query_types = {q: t or "document" for q, t in query_types.items()}
+
+    # Queries the keyword rules cannot place are embedded together with the
+    # RAG queries, classified by intent centroid, and retrieved with the same
+    # vectors
+    embedded = [q for q in unique if query_types[q] != "analytics"]
+    vectors = await aget_cached_embeddings(embedded)
+    for q, vector in zip(embedded, vectors):
+        if query_types[q] is None:
+            query_types[q] = answerable_intent(q, await classify_embedding(vector))
+
+    rag_queries = [q for q in embedded if query_types[q] != "analytics"]
+    embeddings = [v for q, v in zip(embedded, vectors) if query_types[q] != "analytics"]
+    chunk_lists = await retrieve_chunks_batch(
+        embeddings,
+        top_k=top_k * CONTEXT_CANDIDATES_PER_K,
+        connections=connections,
+        queries=rag_queries,
+    )
+    retrieved = {
+        q: (emb, chunks) for q, emb, chunks in zip(rag_queries, embeddings, chunk_lists)
+    }
+
+    logger.info(
+        f"Batch of {len(queries)} queries: {len(unique)} unique, "
+        f"{len(rag_queries)} need retrieval"
+    )
+
+    semaphore = asyncio.Semaphore(llm_concurrency)
+    tasks = {
+        q: asyncio.create_task(
+            _answer(
+                q, query_types[q], *retrieved.get(q, (None, None)), top_k, semaphore
+            )
+        )
+        for q in unique
+    }
+
+    try:
+        for index, query in enumerate(normalized):
+            if not query:
+                yield {
+                    "index": index,
+                    "query": query,
+                    "error": "Query must not be empty",
+                }
+                continue
+
+            result = await tasks[query]
+            yield {
+                "index": index,
+                "query": query,
+                "query_type": query_types[query],
+                "answer": result["answer"],
+                "sources": result["sources"],
+            }
+    finally:
+        for task in tasks.values():
+            task.cancel()
@@ -1,31 +1,94 @@
-def classify_query(query: str) -> str:
-    q = query.lower()
+from app.analytics.router import detect_topic
+from app.core.embedding_cache import aget_cached_embedding, aget_cached_embeddings
+import numpy as np
+import asyncio
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# "keyword" uses the keyword rules only, "embedding" falls back to intent
+# centroids when the keyword rules are not conclusive
+CLASSIFIER_MODE = os.getenv("CLASSIFIER_MODE", "embedding")
+
+ANALYTICS_KEYWORDS = [
+    "profitability",
+    "capital",
+    "liquidity",
+    "asset quality",
+    "funding",
+    "ratio",
+    "metrics",
+    "survey",
+    "expectations",
+]
+
+DOCUMENT_KEYWORDS = [
+    "eba",
+    "regulation",
+    "regulatory",
+    "guideline",
+    "report",
+    "article",
+    "paragraph",
+    "directive",
+    "compliance",
+    "mentioned",
+]
+
+# Whole words only, so "capital" does not match inside "capitalised"
+ANALYTICS_PATTERN = re.compile(
+    r"\b(?:" + "|".join(map(re.escape, ANALYTICS_KEYWORDS)) + r")s?\b"
+)
+DOCUMENT_PATTERN = re.compile(
+    r"\b(?:" + "|".join(map(re.escape, DOCUMENT_KEYWORDS)) + r")s?\b"
+)
+
+# Seed queries whose embeddings are averaged into one centroid per intent
+INTENT_EXAMPLES = {
+    "analytics": [
+        "What share of banks expect their ROE to increase?",
+        "How many banks plan to issue more covered bonds?",
+        "Which funding instruments do banks intend to focus on?",
+        "What do banks expect for asset quality in SME portfolios?",
+        "How did answers on net interest income change since last year?",
+        "Percentage of respondents expecting loan demand to rise",
+        "Survey results on cost of equity estimates",
+        "How do banks rank their profitability priorities?",
+    ],
+    "document": [
+        "What are the key risks identified in the risk assessment report?",
+        "What does the EBA say about operational resilience?",
+        "Summarise the section on cyber risk",
+        "What regulatory requirements apply to own funds?",
+        "How does the report describe geopolitical risk?",
+        "What are the supervisory priorities for next year?",
+        "Explain the EBA's view on climate-related risks",
+        "Which article covers the leverage ratio requirement?",
+    ],
+    "hybrid": [
+        "How do banks' profitability expectations compare with the risks the EBA highlights?",
+        "Do survey answers on funding match the report's view on liquidity?",
+        "What do banks expect for asset quality and what does the EBA warn about?",
+        "Combine survey results on capital with the regulatory context",
+        "Are banks' ROE expectations consistent with the EBA risk assessment?",
+        "Compare survey data on deposits with the report's funding analysis",
+    ],
+}
+
+_centroids: tuple[list[str], np.ndarray] | None = None
+_centroids_lock = asyncio.Lock()
 
-    analytics_keywords = [
-        "profitability",
-        "capital",
-        "liquidity",
-        "ratio",
-        "metrics",
-        "survey",
-        "expectations",
-    ]
-
-    document_keywords = [
-        "eba",
-        "regulation",
-        "regulatory",
-        "guideline",
-        "report",
-        "article",
-        "paragraph",
-        "directive",
-        "compliance",
-        "mentioned",
-    ]
-
-    has_analytics = any(k in q for k in analytics_keywords)
-    has_document = any(k in q for k in document_keywords)
+
+def keyword_intent(query: str) -> str | None:
+    """
+    Fast path over the keyword rules.
+    Returns None when the query contains none of the keywords.
+    """
+    q = query.lower()
+    has_analytics = ANALYTICS_PATTERN.search(q) is not None
+    has_document = DOCUMENT_PATTERN.search(q) is not None
 
     # Priority rule: explicit document intent wins
     if has_document and not has_analytics:
@@ -37,4 +100,94 @@ def classify_query(query: str) -> str:
     if has_analytics:
         return "analytics"
 
-    return "document"
+    return None
+
+
+def classify_query(query: str) -> str:
+    """Keyword-only classification. Unmatched queries go to RAG."""
+    return keyword_intent(query) or "document"
+
+
+async def intent_centroids() -> tuple[list[str], np.ndarray]:
+    """
+    Normalised mean embedding per intent, computed once per process.
+    Seed embeddings go through the embedding cache, so restarts are cheap.
+    """
+    global _centroids
+
+    if _centroids is None:
+        async with _centroids_lock:
+            if _centroids is None:
+                intents = list(INTENT_EXAMPLES)
+                examples = [q for intent in intents for q in INTENT_EXAMPLES[intent]]
+                vectors = np.asarray(
+                    await aget_cached_embeddings(examples), dtype=np.float32
+                )
+
+                rows = []
+                start = 0
+                for intent in intents:
+                    end = start + len(INTENT_EXAMPLES[intent])
+                    rows.append(vectors[start:end].mean(axis=0))
+                    start = end
+
+                matrix = np.stack(rows)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                _centroids = (intents, matrix / np.where(norms > 0, norms, 1.0))
+
+    return _centroids
+
+
+def nearest_intent(
+    query_embedding, intents: list[str], centroids: np.ndarray
+) -> str | None:
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return None
+
+    scores = centroids @ (query / norm)
+    return intents[int(np.argmax(scores))]
+
+
+async def classify_embedding(query_embedding) -> str:
+    """Route by the closest intent centroid, defaulting to RAG."""
+    try:
+        intents, centroids = await intent_centroids()
+        return nearest_intent(query_embedding, intents, centroids) or "document"
+    except Exception as e:
+        logger.warning(f"Embedding classifier unavailable, using RAG: {e}")
+        return "document"
+
+
+def answerable_intent(query: str, query_type: str) -> str:
+    """
+    Keep centroid routing to analytics only when a survey handler can take
+    the query; analytics without a detectable topic is answered with RAG.
+    """
+    if query_type == "analytics" and detect_topic(query) is None:
+        return "document"
+    return query_type
+
+
+async def aclassify_query(
+    query: str, query_embedding: list[float] | None = None
+) -> tuple[str, list[float] | None]:
+    """
+    Classify a query, returning the query type and the query embedding.
+    Keyword rules answer first; otherwise the query is embedded once and
+    matched against the intent centroids. The returned embedding should be
+    reused for retrieval. It is None when no embedding was needed.
+    """
+    query_type = keyword_intent(query)
+    if query_type is not None:
+        return query_type, query_embedding
+
+    if CLASSIFIER_MODE != "embedding":
+        return "document", query_embedding
+
+    if query_embedding is None:
+        query_embedding = await aget_cached_embedding(query)
+
+    query_type = await classify_embedding(query_embedding)
+    return answerable_intent(query, query_type), query_embedding
@@ -1,5 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from pgvector.asyncpg import register_vector as register_vector_asyncpg
+from pgvector.psycopg2 import register_vector as register_vector_psycopg2
+import numpy as np
+import asyncio
+import io
+import logging
 import os
+import struct
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
 
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
@@ -10,5 +22,221 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
 DATABASE_URL = (
     f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
+ASYNC_DATABASE_URL = (
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+# Connection pool sizing, per engine and process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Pre-ping costs a round trip per checkout; pool_recycle already drops old connections
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Connections opened (and hot statements prepared) at API startup
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "0"))
+# Prepared statements kept per asyncpg connection
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+
+def _register_vector_sync(dbapi_connection, _):
+    # numpy arrays bind as vector values and vector columns load as Vector.
+    # psycopg2's adapter sends vectors as text; bulk loads use copy_vectors
+    register_vector_psycopg2(dbapi_connection)
+
+
+def _register_vector_async(dbapi_connection, _):
+    # vector parameters and results use pgvector's binary format
+    dbapi_connection.run_async(register_vector_asyncpg)
+
+
+def _create_engine():
+    db_engine = create_engine(DATABASE_URL, **POOL_OPTIONS)
+    event.listen(db_engine, "connect", _register_vector_sync)
+    return db_engine
+
+
+def _create_async_engine():
+    # asyncpg prepares each statement once per connection and reuses it
+    # from this cache
+    db_engine = create_async_engine(
+        f"{ASYNC_DATABASE_URL}?prepared_statement_cache_size={DB_STATEMENT_CACHE_SIZE}",
+        **POOL_OPTIONS,
+    )
+    event.listen(db_engine.sync_engine, "connect", _register_vector_async)
+    return db_engine
+
+
+class LazyEngine:
+    """
+    Stand-in for an engine that is created on first attribute access, so
+    importing a module that uses the database does not build its pool.
+    Attribute access is forwarded to the real engine.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self) -> bool:
+        return self._engine is not None
+
+    def get(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._factory()
+        return self._engine
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+# Sync engine for ingestion and batch jobs
+engine = LazyEngine(_create_engine)
+
+# Async engine for the API request path
+async_engine = LazyEngine(_create_async_engine)
+
+
+def free_connections(db_engine) -> int:
+    """Connections `db_engine`'s pool can hand out now without waiting."""
+    if DB_MAX_OVERFLOW < 0:
+        return sys.maxsize
+    return max(DB_POOL_SIZE + DB_MAX_OVERFLOW - db_engine.pool.checkedout(), 0)
+
+
+async def warm_pool(connections: int = DB_POOL_WARMUP, statements=()) -> int:
+    """
+    Open `connections` async connections at once so the pool starts full,
+    and run each (statement, params) pair on every one of them so the
+    statements are already prepared when requests arrive.
+    Returns the number of connections warmed.
+    """
+
+    async def warm():
+        async with async_engine.connect() as conn:
+            for statement, params in statements:
+                await conn.execute(statement, params)
+
+    await asyncio.gather(*(warm() for _ in range(connections)))
+    return connections
+
+
+def as_vector(embedding) -> np.ndarray:
+    """Embedding as a float32 array, bound by the pgvector adapters."""
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def _csv_field(value) -> str:
+    # COPY (FORMAT csv) reads an unquoted empty field as NULL and a quoted
+    # one as an empty string, so only strings are quoted
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        # Postgres text cannot hold NUL characters
+        return '"' + value.replace("\x00", "").replace('"', '""') + '"'
+    return str(value)
+
+
+class CsvRowStream(io.TextIOBase):
+    """
+    Read-only file object that renders rows as CSV on demand.
+    Lets COPY consume a generator without materialising the whole load.
+    None is written as an unquoted empty field, which COPY loads as NULL.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._pending = ""
+        self.row_count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        lines = [self._pending]
+        buffered = len(self._pending)
+        while size < 0 or buffered < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = ",".join(_csv_field(v) for v in row) + "\n"
+            lines.append(line)
+            buffered += len(line)
+            self.row_count += 1
+
+        self._pending = "".join(lines)
+        if size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+def copy_rows(conn, table: str, columns: list[str], rows) -> int:
+    """
+    Stream an iterable of tuples into `table` with COPY on a sync connection.
+    Returns the number of rows written.
+    """
+    stream = CsvRowStream(rows)
+    cursor = conn.connection.cursor()
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", stream
+    )
+    return stream.row_count
+
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+
+def vector_copy_payload(ids, vectors) -> bytes:
+    """
+    Rows of (integer id, vector) in COPY ... (FORMAT binary) layout.
+    Built with one structured numpy array, so no value is formatted as text.
+    """
+    vectors = np.asarray(vectors, dtype=">f4")
+    count, dim = vectors.shape
+    row = np.dtype(
+        [
+            ("fields", ">i2"),
+            ("id_size", ">i4"),
+            ("id", ">i4"),
+            ("vector_size", ">i4"),
+            ("dim", ">u2"),
+            ("unused", ">u2"),
+            ("values", ">f4", (dim,)),
+        ]
+    )
+    rows = np.zeros(count, dtype=row)
+    rows["fields"] = 2
+    rows["id_size"] = 4
+    rows["id"] = ids
+    rows["vector_size"] = 4 + 4 * dim
+    rows["dim"] = dim
+    rows["values"] = vectors
+    return PGCOPY_HEADER + rows.tobytes() + PGCOPY_TRAILER
+
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+def copy_vectors(conn, table: str, columns: list[str], ids, vectors) -> int:
+    """
+    Binary COPY of (integer, vector) rows on a sync connection.
+    Returns the number of rows written.
+    """
+    payload = vector_copy_payload(ids, vectors)
+    cursor = conn.connection.cursor()
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)",
+        io.BytesIO(payload),
+    )
+    return len(ids)
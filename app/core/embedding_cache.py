@@ -0,0 +1,272 @@
+from collections import OrderedDict
+from pathlib import Path
+from app.core import openai_client
+import numpy as np
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+MAX_EMBEDDING_INPUTS = 2048
+CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL", "604800"))
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/cache/query_embeddings.sqlite")
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold and collapse whitespace so trivial variants share a key."""
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+    Tier 1 is an in-process LRU bounded by size and TTL.
+    Tier 2 is an optional SQLite file shared across processes and restarts.
+    Vectors are stored as float32.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        path: str | Path | None = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        self._memory: OrderedDict[tuple[str, str], tuple[float, np.ndarray]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        # Guards the SQLite connection, which is used from worker threads
+        self._disk_lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def _disk(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    model TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (model, query)
+                )
+            """)
+            self._db.commit()
+
+        return self._db
+
+    def _remember(self, key: tuple[str, str], created_at: float, vector: np.ndarray):
+        self._memory[key] = (created_at, vector)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, key: tuple[str, str], now: float) -> np.ndarray | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+
+            created_at, vector = entry
+            if now - created_at <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return vector
+            del self._memory[key]
+            return None
+
+    def _from_disk(
+        self, keys: list[tuple[str, str]], now: float
+    ) -> list[np.ndarray | None]:
+        """Tier 2 lookup of memory misses. Blocking, so async callers run it in a thread."""
+        rows = [None] * len(keys)
+        try:
+            with self._disk_lock:
+                db = self._disk()
+                if db is not None:
+                    rows = [
+                        db.execute(
+                            "SELECT vector, created_at FROM query_embeddings "
+                            "WHERE model = ? AND query = ?",
+                            key,
+                        ).fetchone()
+                        for key in keys
+                    ]
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+
+        vectors = []
+        with self._lock:
+            for key, row in zip(keys, rows):
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, row[1], vector)
+                    self.hits_disk += 1
+                    vectors.append(vector)
+                else:
+                    self.misses += 1
+                    vectors.append(None)
+        return vectors
+
+    def _to_disk(self, rows: list[tuple]):
+        """Write (model, query, vector bytes, created_at) rows in one transaction."""
+        try:
+            with self._disk_lock:
+                db = self._disk()
+                if db is not None:
+                    db.executemany(
+                        "INSERT OR REPLACE INTO query_embeddings "
+                        "(model, query, vector, created_at) VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+                    db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def _lookup(self, model: str, queries: list[str]):
+        now = time.time()
+        keys = [(model, normalize_query(q)) for q in queries]
+        vectors = [self._from_memory(key, now) for key in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        return now, keys, vectors, missing
+
+    def _store(self, model: str, queries: list[str], embeddings) -> tuple:
+        now = time.time()
+        vectors = [np.asarray(e, dtype=np.float32) for e in embeddings]
+        rows = []
+        with self._lock:
+            for query, vector in zip(queries, vectors):
+                key = (model, normalize_query(query))
+                self._remember(key, now, vector)
+                rows.append((*key, vector.tobytes(), now))
+        return vectors, rows
+
+    def get(self, model: str, query: str) -> np.ndarray | None:
+        return self.get_many(model, [query])[0]
+
+    def get_many(self, model: str, queries: list[str]) -> list[np.ndarray | None]:
+        now, keys, vectors, missing = self._lookup(model, queries)
+        if missing:
+            found = self._from_disk([keys[i] for i in missing], now)
+            for i, vector in zip(missing, found):
+                vectors[i] = vector
+        return vectors
+
+    async def aget_many(
+        self, model: str, queries: list[str]
+    ) -> list[np.ndarray | None]:
+        """get_many that keeps SQLite reads off the event loop."""
+        now, keys, vectors, missing = self._lookup(model, queries)
+        if missing:
+            missing_keys = [keys[i] for i in missing]
+            if self.path is None:
+                # Memory-only cache: this just counts the misses
+                found = self._from_disk(missing_keys, now)
+            else:
+                found = await asyncio.to_thread(self._from_disk, missing_keys, now)
+            for i, vector in zip(missing, found):
+                vectors[i] = vector
+        return vectors
+
+    def put(self, model: str, query: str, vector) -> np.ndarray:
+        return self.put_many(model, [query], [vector])[0]
+
+    def put_many(self, model: str, queries: list[str], embeddings) -> list[np.ndarray]:
+        vectors, rows = self._store(model, queries, embeddings)
+        if self.path is not None:
+            self._to_disk(rows)
+        return vectors
+
+    async def aput_many(
+        self, model: str, queries: list[str], embeddings
+    ) -> list[np.ndarray]:
+        """put_many that writes the SQLite tier in a thread, in one commit."""
+        vectors, rows = self._store(model, queries, embeddings)
+        if self.path is not None:
+            await asyncio.to_thread(self._to_disk, rows)
+        return vectors
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "size": len(self._memory),
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": (
+                (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0
+            ),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+
+embedding_cache = EmbeddingCache(path=CACHE_PATH or None)
+
+
+def get_cached_embedding(query: str, model: str = EMBEDDING_MODEL) -> list[float]:
+    """
+    Cached replacement for get_embedding on the query path.
+    Only calls the embeddings API on a miss in both tiers. The query is
+    normalized for the cache key only; the API embeds the original text.
+    """
+    vector = embedding_cache.get(model, query)
+
+    if vector is None:
+        embedding = openai_client.get_embedding(query, model=model)
+        vector = embedding_cache.put(model, query, embedding)
+
+    return vector.tolist()
+
+
+async def aget_cached_embedding(
+    query: str, model: str = EMBEDDING_MODEL
+) -> list[float]:
+    """Async variant of get_cached_embedding for the API request path."""
+    [vector] = await embedding_cache.aget_many(model, [query])
+
+    if vector is None:
+        embedding = await openai_client.aget_embedding(query, model=model)
+        [vector] = await embedding_cache.aput_many(model, [query], [embedding])
+
+    return vector.tolist()
+
+
+async def aget_cached_embeddings(
+    queries: list[str], model: str = EMBEDDING_MODEL
+) -> list[list[float]]:
+    """
+    Batch variant of aget_cached_embedding.
+    All cache misses are embedded together in as few requests as possible.
+    """
+    vectors = await embedding_cache.aget_many(model, queries)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+
+    for start in range(0, len(missing), MAX_EMBEDDING_INPUTS):
+        batch = missing[start : start + MAX_EMBEDDING_INPUTS]
+        batch_queries = [queries[i] for i in batch]
+        embeddings = await openai_client.aget_embeddings(batch_queries, model=model)
+        stored = await embedding_cache.aput_many(model, batch_queries, embeddings)
+        for i, vector in zip(batch, stored):
+            vectors[i] = vector
+
+    return [v.tolist() for v in vectors]
@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "assistant_stage_duration_seconds",
+    "Time spent in one stage of answering a query",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "assistant_request_duration_seconds",
+    "Time until the response body is complete, by endpoint and query type",
+    ["path", "query_type"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "assistant_llm_tokens",
+    "Tokens reported by the OpenAI API",
+    ["model", "kind"],
+)
+
+# Per-request state: stage durations in seconds and the query type
+_request: ContextVar[dict | None] = ContextVar("request_timings", default=None)
+
+
+def start_request() -> dict:
+    """
+    Begin collecting stage timings for the current request.
+    Tasks spawned by the request share the returned dict.
+    """
+    state = {"stages": {}, "query_type": ""}
+    _request.set(state)
+    return state
+
+
+def set_query_type(query_type: str):
+    state = _request.get()
+    if state is not None:
+        state["query_type"] = query_type
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block into the stage histogram and the current request.
+    Repeated or concurrent stages of the same name add up.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        state = _request.get()
+        if state is not None:
+            state["stages"][name] = state["stages"].get(name, 0.0) + elapsed
+
+
+def record_tokens(model: str, usage):
+    """Count prompt and completion tokens from an OpenAI `usage` object."""
+    if usage is None:
+        return
+
+    LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+    completion = getattr(usage, "completion_tokens", None)
+    if completion:
+        LLM_TOKENS.labels(model, "completion").inc(completion)
+
+
+def server_timing(stages: dict[str, float]) -> str:
+    """Render stage durations as a Server-Timing header value (milliseconds)."""
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()
+    )
+
+
+class StatsCollector:
+    """
+    Exposes cache hit counters and DB connection pool usage at scrape time,
+    reading the objects' own counters instead of instrumenting hot paths.
+    `caches` map a name to an object with stats(); `engines` map a name to
+    a SQLAlchemy engine or LazyEngine.
+    """
+
+    def __init__(self, caches: dict, engines: dict):
+        self.caches = caches
+        self.engines = engines
+
+    def collect(self):
+        lookups = CounterMetricFamily(
+            "assistant_cache_lookups",
+            "Cache lookups by cache and result",
+            labels=["cache", "result"],
+        )
+        for name, cache in self.caches.items():
+            for result, count in cache.stats().items():
+                if result.startswith("hits") or result == "misses":
+                    lookups.add_metric([name, result], count)
+        yield lookups
+
+        pool_size = GaugeMetricFamily(
+            "assistant_db_pool_connections",
+            "Database pool connections by state",
+            labels=["engine", "state"],
+        )
+        for name, db_engine in self.engines.items():
+            # Lazily created engines report an empty pool until first use
+            if getattr(db_engine, "created", True):
+                pool = db_engine.pool
+                counts = (
+                    pool.size(),
+                    pool.checkedout(),
+                    pool.checkedin(),
+                    pool.overflow(),
+                )
+            else:
+                counts = (0, 0, 0, 0)
+            for state, count in zip(
+                ("size", "checked_out", "idle", "overflow"), counts
+            ):
+                pool_size.add_metric([name, state], count)
+        yield pool_size
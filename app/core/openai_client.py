@@ -1,20 +1,97 @@
-from openai import OpenAI
+from collections.abc import AsyncIterator
+from app.core.metrics import record_tokens, stage
+import functools
 import os
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Clients are created on first use, so importing the app needs neither the
+# API key nor the (slow to import) SDK
+@functools.cache
+def get_client():
+    from openai import OpenAI
+
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@functools.cache
+def get_async_client():
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
 def get_embedding(text: str, model: str = "text-embedding-3-small") -> list[float]:
-    resp = client.embeddings.create(model=model, input=text)
+    resp = get_client().embeddings.create(model=model, input=text)
     return resp.data[0].embedding
 
 
+def get_embeddings(
+    texts: list[str], model: str = "text-embedding-3-small"
+) -> list[list[float]]:
+    """
+    Embed many texts in a single request.
+    Results are returned in the same order as the inputs.
+    """
+    resp = get_client().embeddings.create(model=model, input=texts)
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
 def chat(
     messages: list[dict], model: str = "gpt-4.1-mini", temperature: float = 0.0
 ) -> str:
-    resp = client.chat.completions.create(
+    resp = get_client().chat.completions.create(
         model=model,
         messages=messages,
         temperature=temperature,
     )
     return resp.choices[0].message.content
+
+
+async def aget_embedding(
+    text: str, model: str = "text-embedding-3-small"
+) -> list[float]:
+    with stage("embedding"):
+        resp = await get_async_client().embeddings.create(model=model, input=text)
+    record_tokens(model, resp.usage)
+    return resp.data[0].embedding
+
+
+async def aget_embeddings(
+    texts: list[str], model: str = "text-embedding-3-small"
+) -> list[list[float]]:
+    with stage("embedding"):
+        resp = await get_async_client().embeddings.create(model=model, input=texts)
+    record_tokens(model, resp.usage)
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+async def achat(
+    messages: list[dict], model: str = "gpt-4.1-mini", temperature: float = 0.0
+) -> str:
+    with stage("chat"):
+        resp = await get_async_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+    record_tokens(model, resp.usage)
+    return resp.choices[0].message.content
+
+
+async def achat_stream(
+    messages: list[dict], model: str = "gpt-4.1-mini", temperature: float = 0.0
+) -> AsyncIterator[str]:
+    """Yield answer text deltas as the model produces them."""
+    with stage("chat"):
+        stream = await get_async_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            # The final chunk carries usage and no choices
+            record_tokens(model, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -0,0 +1,593 @@
+from pathlib import Path
+from sqlalchemy import text
+from app.core.db import as_vector, async_engine, copy_rows, copy_vectors, engine
+from app.rag.index_manager import RECALL_TIERS, _latest_build, search_params
+from app.rag.partitions import create_partition, detach_document
+from app.rag.retriever import SEARCH_SQL, filter_params, retrieve_chunks
+from app.rag import vector_index as vi
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Synthetic chunks are stored under this file name; page_number is the
+# chunk ordinal, which is what results are matched on
+BENCHMARK_FILE = "synthetic-benchmark.pdf"
+GENERATION_BATCH = 10_000
+LOAD_BATCH = 5_000
+
+SYLLABLES = ["ba", "ko", "li", "me", "nu", "pa", "ri", "so", "ta", "ve", "zi", "do"]
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic offline stand-in for the embeddings API.
+    Each token is hashed to one signed dimension (feature hashing), so
+    texts sharing words get similar vectors. Vectors are L2-normalised.
+    """
+
+    def __init__(self, dim: int = vi.EMBEDDING_DIM):
+        self.dim = dim
+
+    def token_slots(self, tokens: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        index = np.empty(len(tokens), dtype=np.int64)
+        sign = np.empty(len(tokens), dtype=np.float32)
+        for i, token in enumerate(tokens):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest())
+            index[i] = h % self.dim
+            sign[i] = 1.0 if (h >> 40) & 1 else -1.0
+        return index, sign
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, value in enumerate(texts):
+            index, sign = self.token_slots(TOKEN_PATTERN.findall(value.lower()))
+            np.add.at(out[row], index, sign)
+        return _normalise(out)
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def make_vocabulary(size: int) -> list[str]:
+    """Pronounceable, unique pseudo-words: n written in base len(SYLLABLES)."""
+    base = len(SYLLABLES)
+    words = []
+    for n in range(size):
+        parts = []
+        for _ in range(4):
+            n, digit = divmod(n, base)
+            parts.append(SYLLABLES[digit])
+        words.append("".join(parts))
+    return words
+
+
+class SyntheticCorpus:
+    """
+    Topic-clustered synthetic chunks, generated lazily in fixed batches so
+    corpora of millions of chunks never have to fit in memory.
+    Each chunk mixes words from its topic with words from the whole
+    vocabulary. The same seed always yields the same corpus and queries.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        topics: int = 200,
+        vocabulary: int = 20_000,
+        words_per_chunk: int = 80,
+        topic_words: int = 60,
+        topic_share: float = 0.6,
+        seed: int = 7,
+    ):
+        self.size = size
+        self.words_per_chunk = words_per_chunk
+        self.topic_share = topic_share
+        self.seed = seed
+        self.vocabulary = make_vocabulary(vocabulary)
+
+        rng = np.random.default_rng(seed)
+        self.topic_vocab = rng.integers(0, vocabulary, size=(topics, topic_words))
+
+    def _generate(self, batch: int) -> np.ndarray:
+        start = batch * GENERATION_BATCH
+        count = min(GENERATION_BATCH, self.size - start)
+        rng = np.random.default_rng([self.seed, 1, batch])
+
+        topics = rng.integers(0, len(self.topic_vocab), size=count)
+        picks = rng.integers(
+            0, self.topic_vocab.shape[1], size=(count, self.words_per_chunk)
+        )
+        words = self.topic_vocab[topics[:, None], picks]
+        background = rng.integers(0, len(self.vocabulary), size=words.shape)
+        use_topic = rng.random(words.shape) < self.topic_share
+        return np.where(use_topic, words, background)
+
+    def batches(self):
+        """Yield (first ordinal, word id matrix) per generation batch."""
+        for batch in range(-(-self.size // GENERATION_BATCH)):
+            yield batch * GENERATION_BATCH, self._generate(batch)
+
+    def text(self, word_ids) -> str:
+        return " ".join(self.vocabulary[i] for i in word_ids)
+
+    def queries(self, count: int, words: int = 8, noise: int = 2) -> list[dict]:
+        """
+        Queries built from a random chunk's words plus noise words.
+        The source chunk's ordinal is the relevant answer.
+        """
+        rng = np.random.default_rng([self.seed, 2])
+        ordinals = np.sort(
+            rng.choice(self.size, size=min(count, self.size), replace=False)
+        )
+
+        queries = []
+        cached_batch, matrix = None, None
+        for ordinal in ordinals:
+            batch = int(ordinal) // GENERATION_BATCH
+            if batch != cached_batch:
+                cached_batch, matrix = batch, self._generate(batch)
+
+            chunk = matrix[int(ordinal) % GENERATION_BATCH]
+            picked = rng.choice(chunk, size=min(words, len(chunk)), replace=False)
+            extra = rng.integers(0, len(self.vocabulary), size=noise)
+            queries.append(
+                {
+                    "query": self.text(np.concatenate([picked, extra])),
+                    "relevant": int(ordinal) + 1,
+                }
+            )
+
+        order = rng.permutation(len(queries))
+        return [queries[i] for i in order]
+
+
+def embed_word_ids(embedder: HashingEmbedder, corpus: SyntheticCorpus):
+    """Vectorised HashingEmbedder.embed for generated word id matrices."""
+    index, sign = embedder.token_slots(corpus.vocabulary)
+
+    def embed(word_ids: np.ndarray) -> np.ndarray:
+        out = np.zeros((len(word_ids), embedder.dim), dtype=np.float32)
+        rows = np.repeat(np.arange(len(word_ids)), word_ids.shape[1])
+        np.add.at(out, (rows, index[word_ids].ravel()), sign[word_ids].ravel())
+        return _normalise(out)
+
+    return embed
+
+
+def build_snapshot(
+    corpus: SyntheticCorpus, embedder: HashingEmbedder, index_dir: Path
+) -> str:
+    """Write the corpus as a numpy vector index snapshot under `index_dir`."""
+    version = "synthetic"
+    snapshot_dir = Path(index_dir) / version
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    embed = embed_word_ids(embedder, corpus)
+
+    matrix = np.lib.format.open_memmap(
+        snapshot_dir / vi.MATRIX_FILE,
+        mode="w+",
+        dtype=np.float32,
+        shape=(corpus.size, embedder.dim),
+    )
+    schema = pa.schema(
+        [
+            ("chunk_id", pa.int64()),
+            ("file_name", pa.string()),
+            ("page_number", pa.int64()),
+            ("content", pa.string()),
+        ]
+    )
+
+    with pq.ParquetWriter(snapshot_dir / vi.METADATA_FILE, schema) as writer:
+        for start, word_ids in corpus.batches():
+            matrix[start : start + len(word_ids)] = embed(word_ids)
+            ordinals = list(range(start + 1, start + len(word_ids) + 1))
+            writer.write_table(
+                pa.table(
+                    {
+                        "chunk_id": ordinals,
+                        "file_name": [BENCHMARK_FILE] * len(ordinals),
+                        "page_number": ordinals,
+                        "content": [corpus.text(ids) for ids in word_ids],
+                    },
+                    schema=schema,
+                )
+            )
+
+    matrix.flush()
+    del matrix
+
+    (snapshot_dir / vi.MANIFEST_FILE).write_text(
+        json.dumps({"version": version, "count": corpus.size, "dim": embedder.dim})
+    )
+    (Path(index_dir) / vi.CURRENT_FILE).write_text(version)
+    return version
+
+
+def load_corpus(corpus: SyntheticCorpus, embedder: HashingEmbedder) -> int:
+    """
+    COPY the corpus into rag.document_chunks_raw and rag.document_embeddings
+    under BENCHMARK_FILE. Use a scratch database: the live ANN index and
+    search functions are what is being measured.
+    """
+    embed = embed_word_ids(embedder, corpus)
+    delete_corpus()
+    create_partition(BENCHMARK_FILE)
+
+    loaded = 0
+    for start, word_ids in corpus.batches():
+        vectors = embed(word_ids)
+        for offset in range(0, len(word_ids), LOAD_BATCH):
+            rows = range(offset, min(offset + LOAD_BATCH, len(word_ids)))
+            with engine.begin() as conn:
+                copy_rows(
+                    conn,
+                    "rag.document_chunks_raw",
+                    ["file_name", "page_number", "page_end", "chunk_index", "content"],
+                    (
+                        (
+                            BENCHMARK_FILE,
+                            start + i + 1,
+                            start + i + 1,
+                            0,
+                            corpus.text(word_ids[i]),
+                        )
+                        for i in rows
+                    ),
+                )
+                conn.execute(text("""
+                        CREATE TEMP TABLE benchmark_stage (
+                            page_number INTEGER,
+                            embedding vector
+                        ) ON COMMIT DROP
+                    """))
+                copy_vectors(
+                    conn,
+                    "benchmark_stage",
+                    ["page_number", "embedding"],
+                    [start + i + 1 for i in rows],
+                    vectors[rows.start : rows.stop],
+                )
+                conn.execute(
+                    text("""
+                        INSERT INTO rag.document_embeddings
+                            (chunk_id, file_name, embedding)
+                        SELECT dcr.chunk_id, dcr.file_name, s.embedding
+                        FROM benchmark_stage s
+                        JOIN rag.document_chunks_raw dcr
+                          ON dcr.file_name = :file_name
+                         AND dcr.page_number = s.page_number
+                    """),
+                    {"file_name": BENCHMARK_FILE},
+                )
+            loaded += len(rows)
+
+        logger.info(f"Loaded {loaded}/{corpus.size} synthetic chunks")
+
+    return loaded
+
+
+def delete_corpus():
+    with engine.begin() as conn:
+        conn.execute(
+            text("DELETE FROM rag.document_chunks_raw WHERE file_name = :file_name"),
+            {"file_name": BENCHMARK_FILE},
+        )
+    detach_document(BENCHMARK_FILE, drop=True)
+
+
+def latency_summary(latencies_ms: list[float]) -> dict:
+    if not latencies_ms:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "mean": float(np.mean(latencies_ms)),
+    }
+
+
+async def measure(
+    search, queries: list[dict], embeddings, top_k: int, concurrency: int = 1
+) -> dict:
+    """
+    Run `search(query, embedding, top_k)` for every query and score it.
+    recall@k counts queries whose source chunk is in the top k; MRR is the
+    mean reciprocal rank of the source chunk (0 when it is missing).
+    Returns metrics plus the ranked ordinals per query under "_ranked".
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = [0.0] * len(queries)
+    ranked = [[] for _ in queries]
+
+    async def run(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            results = await search(queries[i]["query"], embeddings[i], top_k)
+            latencies[i] = (time.perf_counter() - started) * 1000
+        ranked[i] = [
+            r["page_number"] for r in results if r.get("file_name") == BENCHMARK_FILE
+        ]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(i) for i in range(len(queries))))
+    elapsed = time.perf_counter() - started
+
+    hits = 0
+    reciprocal_ranks = 0.0
+    for item, pages in zip(queries, ranked):
+        if item["relevant"] in pages:
+            hits += 1
+            reciprocal_ranks += 1.0 / (pages.index(item["relevant"]) + 1)
+
+    n = max(len(queries), 1)
+    return {
+        "queries": len(queries),
+        "top_k": top_k,
+        "concurrency": concurrency,
+        "recall_at_k": hits / n,
+        "mrr": reciprocal_ranks / n,
+        "latency_ms": latency_summary(latencies),
+        "throughput_qps": len(queries) / elapsed if elapsed > 0 else None,
+        "_ranked": ranked,
+    }
+
+
+def exact_overlap(ranked: list[list[int]], exact: list[list[int]]) -> float:
+    """Mean share of the exact top k that a backend also returned."""
+    shares = [len(set(r) & set(e)) / len(e) for r, e in zip(ranked, exact) if e]
+    return sum(shares) / len(shares) if shares else None
+
+
+def _numpy_search(index: vi.VectorIndex):
+    async def search(query, embedding, top_k):
+        return index.search(embedding, top_k=top_k)
+
+    return search
+
+
+def _pgvector_search(params: dict):
+    async def search(query, embedding, top_k):
+        async with async_engine.connect() as conn:
+            result = await conn.execute(
+                SEARCH_SQL,
+                {
+                    "embedding": as_vector(embedding),
+                    "top_k": top_k,
+                    **params,
+                    **filter_params(None),
+                },
+            )
+            return [dict(r) for r in result.mappings().all()]
+
+    return search
+
+
+async def _retriever_search(query, embedding, top_k):
+    return await retrieve_chunks(query, top_k=top_k, query_embedding=embedding)
+
+
+async def run_benchmark(
+    size: int = 100_000,
+    queries: int = 500,
+    top_k: int = 10,
+    backends: tuple[str, ...] = ("numpy",),
+    recall_targets: tuple[float, ...] = tuple(t[0] for t in RECALL_TIERS),
+    concurrency: int = 8,
+    dim: int = vi.EMBEDDING_DIM,
+    seed: int = 7,
+    index_dir: Path | None = None,
+    keep: bool = False,
+) -> dict:
+    """
+    Benchmark the retrieval backends on a synthetic corpus.
+    "numpy" searches an in-process snapshot (exact search, no services),
+    "pgvector" calls rag.search_chunks once per recall target, and
+    "retriever" calls retrieve_chunks as configured by the environment.
+    The database backends need a scratch database with the schema applied.
+    """
+    database = [b for b in backends if b != "numpy"]
+    if database and dim != vi.EMBEDDING_DIM:
+        raise ValueError(f"Database backends need dim={vi.EMBEDDING_DIM}")
+
+    embedder = HashingEmbedder(dim)
+    corpus = SyntheticCorpus(size, seed=seed)
+    workload = corpus.queries(queries)
+    embeddings = embedder.embed([q["query"] for q in workload])
+
+    report = {
+        "corpus": {"chunks": size, "dim": dim, "seed": seed},
+        "queries": len(workload),
+        "top_k": top_k,
+        "results": [],
+    }
+    exact = None
+
+    if "numpy" in backends:
+        with tempfile.TemporaryDirectory(dir=index_dir) as tmp:
+            started = time.perf_counter()
+            build_snapshot(corpus, embedder, Path(tmp))
+            build_seconds = time.perf_counter() - started
+
+            index = vi.VectorIndex(Path(tmp))
+            metrics = await measure(_numpy_search(index), workload, embeddings, top_k)
+            exact = metrics.pop("_ranked")
+            report["results"].append(
+                {
+                    "backend": "numpy",
+                    "settings": {"build_seconds": build_seconds},
+                    **metrics,
+                }
+            )
+            del index
+
+    if not database:
+        return report
+
+    started = time.perf_counter()
+    load_corpus(corpus, embedder)
+    load_seconds = time.perf_counter() - started
+
+    try:
+        with engine.connect() as conn:
+            build = _latest_build(conn) or {}
+        method = build.get("method", "hnsw")
+        build_params = build.get("params") or {}
+        storage = build.get("storage") or "vector"
+        dimensions = build.get("dimensions")
+        report["index"] = {
+            "method": method,
+            "params": build_params,
+            "storage": storage,
+            "dimensions": dimensions,
+            "load_seconds": load_seconds,
+        }
+
+        runs = []
+        if "pgvector" in backends:
+            for target in recall_targets:
+                params = search_params(
+                    method, build_params, target, top_k, storage, dimensions
+                )
+                runs.append(
+                    (
+                        "pgvector",
+                        {"recall_target": target, **params},
+                        _pgvector_search(params),
+                    )
+                )
+        if "retriever" in backends:
+            runs.append(("retriever", {}, _retriever_search))
+
+        for backend, settings, search in runs:
+            metrics = await measure(search, workload, embeddings, top_k, concurrency)
+            ranked = metrics.pop("_ranked")
+            if exact is not None:
+                metrics["exact_overlap"] = exact_overlap(ranked, exact)
+            report["results"].append(
+                {"backend": backend, "settings": settings, **metrics}
+            )
+    finally:
+        if not keep:
+            delete_corpus()
+
+    return report
+
+
+def compare_reports(
+    current: dict,
+    baseline: dict,
+    recall_tolerance: float = 0.02,
+    latency_tolerance: float = 0.25,
+) -> list[str]:
+    """
+    Regressions of `current` against `baseline`, matched on backend and
+    settings: recall@k or MRR dropping by more than `recall_tolerance`,
+    or p95 latency growing by more than `latency_tolerance` (relative).
+    """
+
+    def key(result):
+        settings = {k: v for k, v in result["settings"].items() if k != "build_seconds"}
+        return result["backend"], json.dumps(settings, sort_keys=True)
+
+    previous = {key(r): r for r in baseline.get("results", [])}
+    regressions = []
+
+    for result in current.get("results", []):
+        old = previous.get(key(result))
+        if old is None:
+            continue
+
+        name = f"{result['backend']} {key(result)[1]}"
+        for metric in ("recall_at_k", "mrr"):
+            if result[metric] < old[metric] - recall_tolerance:
+                regressions.append(
+                    f"{name}: {metric} {old[metric]:.3f} -> {result[metric]:.3f}"
+                )
+
+        old_p95 = old["latency_ms"]["p95"]
+        new_p95 = result["latency_ms"]["p95"]
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95 {old_p95:.1f}ms -> {new_p95:.1f}ms")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline retrieval benchmark on a synthetic corpus"
+    )
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=["numpy", "pgvector", "retriever"],
+        default=["numpy"],
+    )
+    parser.add_argument(
+        "--recall-targets",
+        nargs="+",
+        type=float,
+        default=[t[0] for t in RECALL_TIERS],
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dim", type=int, default=vi.EMBEDDING_DIM)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    parser.add_argument(
+        "--baseline", type=Path, help="fail on regressions vs this report"
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the synthetic rows in the database"
+    )
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_benchmark(
+            size=args.chunks,
+            queries=args.queries,
+            top_k=args.top_k,
+            backends=tuple(args.backends),
+            recall_targets=tuple(args.recall_targets),
+            concurrency=args.concurrency,
+            dim=args.dim,
+            seed=args.seed,
+            keep=args.keep,
+        )
+    )
+
+    if args.baseline:
+        report["regressions"] = compare_reports(
+            report, json.loads(args.baseline.read_text())
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    print(output)
+
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
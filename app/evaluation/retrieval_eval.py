@@ -1,5 +1,8 @@
 from app.rag.retriever import retrieve_chunks
+import asyncio
 
+# Live-corpus sanity check. For an offline benchmark across backends and
+# index settings see app.evaluation.benchmark.
 EVAL_QUERIES = [
     {
         "query": "What are the main risks for EU banks according to EBA?",
@@ -12,19 +15,32 @@ EVAL_QUERIES = [
 ]
 
 
-def recall_at_k(top_k: int = 5) -> float:
+async def evaluate(top_k: int = 5) -> dict:
+    """Recall@k and MRR of the first relevant page over EVAL_QUERIES."""
     hits = 0
+    reciprocal_ranks = 0.0
 
     for item in EVAL_QUERIES:
-        results = retrieve_chunks(item["query"], top_k=top_k)
-        retrieved_pages = {r["page_number"] for r in results}
+        results = await retrieve_chunks(item["query"], top_k=top_k)
+        pages = [r["page_number"] for r in results]
+        ranks = [
+            i for i, page in enumerate(pages, start=1) if page in item["relevant_pages"]
+        ]
 
-        if retrieved_pages.intersection(item["relevant_pages"]):
+        if ranks:
             hits += 1
+            reciprocal_ranks += 1.0 / ranks[0]
 
-    return hits / len(EVAL_QUERIES)
+    return {
+        "recall_at_k": hits / len(EVAL_QUERIES),
+        "mrr": reciprocal_ranks / len(EVAL_QUERIES),
+    }
+
+
+async def recall_at_k(top_k: int = 5) -> float:
+    return (await evaluate(top_k))["recall_at_k"]
 
 
 if __name__ == "__main__":
-    score = recall_at_k(top_k=5)
-    print(f"Recall@5: {score:.2f}")
+    scores = asyncio.run(evaluate(top_k=5))
+    print(f"Recall@5: {scores['recall_at_k']:.2f}  MRR@5: {scores['mrr']:.2f}")
@@ -1,41 +1,62 @@
-from app.classification.query_classifier import classify_query
+from app.classification.query_classifier import aclassify_query
 from app.analytics.router import handle_analytics_query
-from app.rag.answer_generator import generate_rag_answer
+from app.rag.answer_generator import generate_rag_answer, stream_rag_answer
+from collections.abc import AsyncIterator
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def generate_hybrid_answer(query: str) -> dict:
+def combine_hybrid_answer(analytics_result: dict, rag_result: dict) -> dict:
+    """Merge analytics and RAG results into one hybrid answer."""
+    final_answer = f"""ANALYTICAL INSIGHTS (Survey-based):
+{analytics_result["summary"]}
+
+REGULATORY CONTEXT (EBA Documents):
+{rag_result["answer"]}""".strip()
+
+    return {"answer": final_answer, "sources": rag_result.get("sources", [])}
+
+
+async def generate_hybrid_answer(
+    query: str,
+    query_type: str | None = None,
+    query_embedding: list[float] | None = None,
+    filters: dict | None = None,
+) -> dict:
     """
     Generate hybrid answer combining analytics and RAG.
     Returns structured dict with answer and sources.
+    Callers that already classified the query pass its type and embedding.
+    `filters` scope document retrieval.
     """
     try:
-        query_type = classify_query(query)
+        if query_type is None:
+            query_type, query_embedding = await aclassify_query(query, query_embedding)
 
         if query_type == "analytics":
-            analytics_result = handle_analytics_query(query)
+            analytics_result = await handle_analytics_query(query)
             return {"answer": analytics_result["summary"], "sources": []}
 
         if query_type == "document":
-            rag_result = generate_rag_answer(query)
+            rag_result = await generate_rag_answer(
+                query, query_embedding=query_embedding, filters=filters
+            )
             return {
                 "answer": rag_result["answer"],
                 "sources": rag_result.get("sources", []),
             }
 
-        # Hybrid: combine both
-        analytics_result = handle_analytics_query(query)
-        rag_result = generate_rag_answer(query)
-
-        final_answer = f"""ANALYTICAL INSIGHTS (Survey-based):
-{analytics_result["summary"]}
+        # Hybrid: both branches are independent, run them concurrently
+        analytics_result, rag_result = await asyncio.gather(
+            handle_analytics_query(query),
+            generate_rag_answer(
+                query, query_embedding=query_embedding, filters=filters
+            ),
+        )
 
-REGULATORY CONTEXT (EBA Documents):
-{rag_result["answer"]}""".strip()
-
-        return {"answer": final_answer, "sources": rag_result.get("sources", [])}
+        return combine_hybrid_answer(analytics_result, rag_result)
 
     except Exception as e:
         logger.error(f"Error in generate_hybrid_answer: {e}")
@@ -43,3 +64,37 @@ REGULATORY CONTEXT (EBA Documents):
             "answer": "Error processing your query. Please try again.",
             "sources": [],
         }
+
+
+async def stream_hybrid_answer(
+    query: str,
+    query_embedding: list[float] | None = None,
+    filters: dict | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Streaming variant of the hybrid branch.
+    Analytics runs while retrieval and generation proceed; its summary is
+    emitted ahead of the streamed regulatory context.
+    """
+    analytics_task = asyncio.create_task(handle_analytics_query(query))
+    rag_events = stream_rag_answer(
+        query, query_embedding=query_embedding, filters=filters
+    )
+
+    try:
+        # First RAG event is always the sources
+        yield await anext(rag_events)
+
+        analytics_result = await analytics_task
+        yield {
+            "event": "token",
+            "text": "ANALYTICAL INSIGHTS (Survey-based):\n"
+            f"{analytics_result['summary']}\n\n"
+            "REGULATORY CONTEXT (EBA Documents):\n",
+        }
+
+        async for event in rag_events:
+            yield event
+    finally:
+        analytics_task.cancel()
+        await rag_events.aclose()
@@ -1,19 +1,198 @@
-def chunk_text(
-    text: str,
-    max_chars: int = 800,
-    overlap: int = 100,
-) -> list[str]:
+from functools import lru_cache
+import logging
+import os
+import re
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+# Matches text-embedding-3-small
+CHUNK_ENCODING = "cl100k_base"
+# Used only when the tokenizer files are unavailable (offline builds)
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+# Numbered titles ("3.2 Liquidity risk"), legal units ("Article 92") and
+# all-caps lines
+HEADING = re.compile(
+    r"^(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+[A-Z][^.;:]*$"
+    r"|(?:Article|Section|Chapter|Title|Part|Annex)\s+[\dIVX]+\b"
+    r"|[A-Z][A-Z0-9 ,&()\-/]{3,}$)"
+)
+MAX_HEADING_CHARS = 120
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.get_encoding(CHUNK_ENCODING)
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _split_long(text: str, max_tokens: int) -> list[str]:
+    """Hard-split a single sentence that exceeds the token budget."""
+    encoding = _encoding()
+    if encoding is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        return [text[i : i + step] for i in range(0, len(text), step)]
+
+    ids = encoding.encode(text, disallowed_special=())
+    return [
+        encoding.decode(ids[i : i + max_tokens]) for i in range(0, len(ids), max_tokens)
+    ]
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most `max_tokens` tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return _split_long(text, max_tokens)[0]
+
+
+def _blocks(text: str):
+    """
+    Yield (is_heading, paragraph) blocks of one page.
+    PDF text wraps lines with single newlines, so these are joined back up.
     """
-    Simple character-based chunking with overlapping
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        lines = []
+        for line in paragraph.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if len(line) <= MAX_HEADING_CHARS and HEADING.match(line):
+                if lines:
+                    yield False, " ".join(lines)
+                    lines = []
+                yield True, line
+            else:
+                lines.append(line)
+        if lines:
+            yield False, " ".join(lines)
+
+
+def _units(pages: list[dict], max_tokens: int):
+    """
+    Yield (page_number, separator, text, tokens, is_heading) units: sentences
+    of body text, and headings as a unit of their own.
+    """
+    for page in pages:
+        for is_heading, block in _blocks(page["text"]):
+            sentences = [block] if is_heading else SENTENCE_BREAK.split(block)
+            for i, sentence in enumerate(sentences):
+                separator = " " if i else "\n\n"
+                tokens = count_tokens(sentence)
+                if tokens <= max_tokens:
+                    yield page["page_number"], separator, sentence, tokens, is_heading
+                    continue
+                for j, part in enumerate(_split_long(sentence, max_tokens)):
+                    yield (
+                        page["page_number"],
+                        separator if j == 0 else " ",
+                        part,
+                        count_tokens(part),
+                        False,
+                    )
+
+
+def chunk_pages(
+    pages: list[dict],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> list[dict]:
+    """
+    Pack sentences of consecutive pages into chunks of up to `max_tokens`.
+    Chunks break early at headings, may span pages, and carry the trailing
+    sentences of the previous chunk (up to `overlap_tokens`) as overlap.
+    Each chunk records `page_number` (first page), `page_end` and
+    `chunk_index` (position among chunks starting on the same page).
+    Runs in a single pass over the text.
     """
     chunks = []
-    start = 0
-    text_length = len(text)
+    current: list[tuple] = []
+    current_tokens = 0
+    # Body units added since the last flush, and overlap units carried over
+    has_body = False
+    carried = 0
+    index_per_page: dict[int, int] = {}
+
+    def flush():
+        page_number = current[0][0]
+        index = index_per_page.get(page_number, 0)
+        index_per_page[page_number] = index + 1
+        content = "".join(
+            (sep if i else "") + text for i, (_, sep, text, _, _) in enumerate(current)
+        )
+        chunks.append(
+            {
+                "page_number": page_number,
+                "page_end": current[-1][0],
+                "chunk_index": index,
+                "content": content.strip(),
+            }
+        )
+
+    for unit in _units(pages, max_tokens):
+        _, _, _, tokens, is_heading = unit
+        # A new section does not need the previous section's tail as overlap
+        # and overlap is dropped rather than flushed on its own
+        overflow = current_tokens + tokens > max_tokens
+        if carried and not has_body and (is_heading or overflow):
+            current = current[carried:]
+            current_tokens = sum(u[3] for u in current)
+            carried = 0
+            overflow = current_tokens + tokens > max_tokens
 
-    while start < text_length:
-        end = start + max_chars
-        chunk = text[start:end]
-        chunks.append(chunk.strip())
-        start = end - overlap
+        # Start a new chunk at a heading once the current one has real content,
+        # or when the next unit would not fit
+        boundary = is_heading and has_body and current_tokens >= max_tokens // 4
+        if len(current) > carried and (boundary or overflow):
+            flush()
+            overlap: list[tuple] = []
+            overlap_size = 0
+            if not boundary:
+                # The overlap has to leave room for the unit that overflowed
+                for prev in reversed(current):
+                    size = overlap_size + prev[3]
+                    if size > overlap_tokens or size + tokens > max_tokens:
+                        break
+                    overlap.append(prev)
+                    overlap_size += prev[3]
+                overlap.reverse()
+            current, current_tokens = overlap, overlap_size
+            has_body = False
+            carried = len(overlap)
+
+        current.append(unit)
+        current_tokens += tokens
+        has_body = has_body or not is_heading
+
+    # Skip a trailing chunk that would only repeat the overlap
+    if len(current) > carried:
+        flush()
 
     return chunks
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> list[str]:
+    """
+    Token-aware chunking of a single piece of text
+    """
+    pages = [{"page_number": 1, "text": text}]
+    return [c["content"] for c in chunk_pages(pages, max_tokens, overlap_tokens)]
@@ -1,55 +1,298 @@
+from datetime import datetime
 from pathlib import Path
-from app.ingestion.pdf_loader import load_pdf
-from app.ingestion.chunker import chunk_text
-from app.core.db import engine
-import pandas as pd
-
+from sqlalchemy import text
+from app.ingestion.pdf_loader import file_checksum, load_pdf
+from app.ingestion.chunker import chunk_pages
+from app.core.db import copy_rows, engine
+from app.rag.partitions import PARTITION_BY_DOCUMENT, create_partition
+import hashlib
+import json
 
 RAW_DOCS_PATH = Path("data/raw/documents")
+CHUNK_COLUMNS = ["file_name", "page_number", "page_end", "chunk_index", "content"]
+
+# Chunks may span pages, so a changed page invalidates every chunk touching it
+DELETE_OVERLAPPING_SQL = text("""
+    DELETE FROM rag.document_chunks_raw
+    WHERE file_name = :file_name
+      AND EXISTS (
+          SELECT 1 FROM unnest(CAST(:pages AS integer[])) AS p(page)
+          WHERE p.page BETWEEN page_number AND COALESCE(page_end, page_number)
+      )
+    RETURNING page_number, COALESCE(page_end, page_number) AS page_end
+""")
+
 
+def page_checksum(page_text: str) -> str:
+    return hashlib.sha256(page_text.encode("utf-8")).hexdigest()
 
-def ingest_pdf(pdf_path: Path):
-    pages = load_pdf(pdf_path)
 
-    records = []
+def diff_pages(old: dict, new: dict) -> tuple[list[int], list[int]]:
+    """
+    Compare page checksum maps (page number -> hash).
+    Returns pages to (re)insert and previously stored pages to delete.
+    """
+    changed = [int(n) for n, h in new.items() if old.get(n) != h]
+    stale = [int(n) for n, h in old.items() if new.get(n) != h]
+    return changed, stale
+
+
+def contiguous_runs(pages: list[dict], selected: set[int]) -> list[list[dict]]:
+    """Group the selected pages into runs that are adjacent in the document."""
+    runs = []
+    run = []
 
     for page in pages:
-        chunks = chunk_text(page["text"])
+        if page["page_number"] in selected:
+            run.append(page)
+        elif run:
+            runs.append(run)
+            run = []
+
+    if run:
+        runs.append(run)
+
+    return runs
+
+
+def iter_chunk_rows(pdf_path: Path, runs: list[list[dict]]):
+    """
+    Yield (file_name, page_number, page_end, chunk_index, content) rows run
+    by run, so chunks are streamed into COPY rather than collected first.
+    """
+    for run in runs:
+        for chunk in chunk_pages(run):
+            yield (
+                pdf_path.name,
+                chunk["page_number"],
+                chunk["page_end"],
+                chunk["chunk_index"],
+                chunk["content"],
+            )
+
+
+def _delete_overlapping(conn, file_name: str, pages: set[int]) -> tuple[int, set]:
+    """
+    Delete chunks touching `pages`, widening to the full page range of each
+    deleted chunk until no chunk straddles the edge of the affected set.
+    Returns the number of deleted rows and the affected pages.
+    """
+    affected = set(pages)
+    frontier = set(pages)
+    deleted = 0
+
+    while frontier:
+        rows = conn.execute(
+            DELETE_OVERLAPPING_SQL,
+            {"file_name": file_name, "pages": sorted(frontier)},
+        ).all()
+        deleted += len(rows)
+        covered = {p for r in rows for p in range(r.page_number, r.page_end + 1)}
+        frontier = covered - affected
+        affected |= covered
+
+    return deleted, affected
+
+
+def _get_source(conn, source_name: str) -> dict | None:
+    row = (
+        conn.execute(
+            text("""
+                SELECT source_id, checksum, metadata
+                FROM meta.data_sources
+                WHERE source_name = :source_name
+            """),
+            {"source_name": source_name},
+        )
+        .mappings()
+        .first()
+    )
+    return dict(row) if row else None
+
+
+def _record_run(
+    conn, source_id, started_at, status, inserted=0, replaced=0, error=None
+):
+    conn.execute(
+        text("""
+            INSERT INTO meta.ingestion_runs (
+                source_id, target_schema, target_table, rows_inserted,
+                rows_updated, status, started_at, completed_at, error_message
+            )
+            VALUES (
+                :source_id, 'rag', 'document_chunks_raw', :inserted,
+                :replaced, :status, :started_at, :completed_at, :error
+            )
+        """),
+        {
+            "source_id": source_id,
+            "inserted": inserted,
+            "replaced": replaced,
+            "status": status,
+            "started_at": started_at,
+            "completed_at": datetime.now(),
+            "error": error,
+        },
+    )
 
-        for idx, chunk in enumerate(chunks):
-            records.append(
+
+def _upsert_document(conn, source_id, pdf_path: Path, checksum: str, page_count: int):
+    params = {
+        "source_id": source_id,
+        "title": pdf_path.stem,
+        "file_path": str(pdf_path),
+        "file_name": pdf_path.name,
+        "page_count": page_count,
+        "checksum": checksum,
+    }
+
+    updated = conn.execute(
+        text("""
+            UPDATE rag.documents
+            SET source_id = :source_id, file_path = :file_path,
+                page_count = :page_count, checksum = :checksum,
+                ingested_at = CURRENT_TIMESTAMP
+            WHERE file_name = :file_name
+        """),
+        params,
+    ).rowcount
+
+    if not updated:
+        conn.execute(
+            text("""
+                INSERT INTO rag.documents (
+                    source_id, title, document_type, file_path, file_name,
+                    page_count, checksum
+                )
+                VALUES (
+                    :source_id, :title, 'pdf', :file_path, :file_name,
+                    :page_count, :checksum
+                )
+            """),
+            params,
+        )
+
+
+def sync_pdf(pdf_path: Path) -> dict | None:
+    """
+    Incrementally ingest one PDF.
+    Unchanged files (same SHA-256) are skipped. For changed files only the
+    chunks touching pages whose text hash differs are re-chunked and
+    replaced, in a single transaction together with the data source and
+    run bookkeeping.
+    Returns run stats, or None when the file was unchanged.
+    """
+    started_at = datetime.now()
+    checksum = file_checksum(pdf_path)
+
+    with engine.connect() as conn:
+        source = _get_source(conn, pdf_path.name)
+
+    if source and source["checksum"] == checksum:
+        return None
+
+    old_metadata = (source or {}).get("metadata") or {}
+    old_pages = old_metadata.get("page_checksums", {})
+
+    try:
+        pages = load_pdf(pdf_path, checksum=checksum)
+        new_pages = {str(p["page_number"]): page_checksum(p["text"]) for p in pages}
+
+        changed_numbers, stale = diff_pages(old_pages, new_pages)
+        changed_numbers = set(changed_numbers)
+        # Without page hashes (first sync) every existing row for the file is replaced
+        full_replace = not old_pages
+
+        # Own short transaction: creating a partition briefly locks the parent
+        if PARTITION_BY_DOCUMENT:
+            create_partition(pdf_path.name)
+
+        with engine.begin() as conn:
+            if full_replace:
+                replaced = conn.execute(
+                    text("""
+                        DELETE FROM rag.document_chunks_raw
+                        WHERE file_name = :file_name
+                    """),
+                    {"file_name": pdf_path.name},
+                ).rowcount
+                affected = {p["page_number"] for p in pages}
+            else:
+                replaced, affected = _delete_overlapping(
+                    conn, pdf_path.name, changed_numbers | set(stale)
+                )
+
+            inserted = copy_rows(
+                conn,
+                "rag.document_chunks_raw",
+                CHUNK_COLUMNS,
+                iter_chunk_rows(pdf_path, contiguous_runs(pages, affected)),
+            )
+
+            source_id = conn.execute(
+                text("""
+                    INSERT INTO meta.data_sources (
+                        source_name, source_type, file_path, checksum, metadata
+                    )
+                    VALUES (:source_name, 'pdf', :file_path, :checksum, :metadata)
+                    ON CONFLICT (source_name) DO UPDATE SET
+                        file_path = EXCLUDED.file_path,
+                        checksum = EXCLUDED.checksum,
+                        metadata = EXCLUDED.metadata,
+                        ingested_at = CURRENT_TIMESTAMP
+                    RETURNING source_id
+                """),
                 {
-                    "file_name": pdf_path.name,
-                    "page_number": page["page_number"],
-                    "chunk_index": idx,
-                    "content": chunk,
-                }
+                    "source_name": pdf_path.name,
+                    "file_path": str(pdf_path),
+                    "checksum": checksum,
+                    "metadata": json.dumps({"page_checksums": new_pages}),
+                },
+            ).scalar_one()
+
+            _upsert_document(conn, source_id, pdf_path, checksum, len(pages))
+
+            _record_run(
+                conn,
+                source_id,
+                started_at,
+                "success",
+                inserted=inserted,
+                replaced=replaced,
+            )
+
+    except Exception as e:
+        with engine.begin() as conn:
+            _record_run(
+                conn,
+                (source or {}).get("source_id"),
+                started_at,
+                "failed",
+                error=str(e),
             )
+        raise
 
-    return pd.DataFrame(records)
+    return {
+        "pages_changed": len(changed_numbers),
+        "pages_removed": len(set(stale) - changed_numbers),
+        "rows_inserted": inserted,
+        "rows_replaced": replaced,
+    }
 
 
 def main():
-    all_chunks = []
-
-    for pdf in RAW_DOCS_PATH.glob("*.pdf"):
-        print(f"Ingesting {pdf.name}")
-        df = ingest_pdf(pdf)
-        all_chunks.append(df)
-
-    df_chunks = pd.concat(all_chunks, ignore_index=True)
-
-    df_chunks.to_sql(
-        name="document_chunks_raw",
-        schema="rag",
-        con=engine,
-        if_exists="append",
-        index=False,
-        method="multi",
-        chunksize=500,
-    )
+    for pdf in sorted(RAW_DOCS_PATH.glob("*.pdf")):
+        stats = sync_pdf(pdf)
+
+        if stats is None:
+            print(f"Skipping {pdf.name} (unchanged)")
+            continue
 
-    print(f"Inserted {len(df_chunks)} chunks")
+        print(
+            f"Ingested {pdf.name}: {stats['pages_changed']} pages changed, "
+            f"{stats['rows_inserted']} chunks inserted, "
+            f"{stats['rows_replaced']} replaced"
+        )
 
 
 if __name__ == "__main__":
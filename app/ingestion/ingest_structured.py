@@ -0,0 +1,313 @@
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import text
+from app.analytics.aggregates import refresh_aggregates
+from app.core.db import copy_rows, engine
+from app.ingestion.pdf_loader import file_checksum
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import argparse
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+RAW_STRUCTURED_PATH = Path("data/raw/structured")
+RAQ_WORKBOOK = RAW_STRUCTURED_PATH / "eba_transparency_2025_raq_statistical_annex.xlsx"
+STRUCTURED_CACHE_DIR = Path("data/processed/structured/cache")
+# Long-format copy of the last loaded workbook, for the Arrow backend
+LOADED_SURVEY_PATH = STRUCTURED_CACHE_DIR / "raq_results_long.parquet"
+
+# Bumped when parsing changes, so cached parses of the same workbook are redone
+RAQ_PARSER_VERSION = 2
+RAQ_EXERCISE = "RAQ_2025_Autumn"
+RAQ_SHEET = "Results"
+# Sheet column holding item labels, and value columns per survey period
+RAQ_LABEL_COLUMN = "Autumn-25"
+RAQ_PERIOD_COLUMNS = {
+    "Unnamed: 2": "TR2025_AUTUMN",
+    "Unnamed: 6": "TR2025_SPRING",
+    "Unnamed: 7": "TR2024_AUTUMN",
+    "Unnamed: 8": "TR2024_SPRING",
+    "Unnamed: 9": "TR2023_AUTUMN",
+    "Unnamed: 10": "TR2023_SPRING",
+    "Unnamed: 11": "TR2022_AUTUMN",
+}
+
+SURVEY_SCHEMA = pa.schema(
+    [
+        ("exercise", pa.string()),
+        ("period", pa.string()),
+        ("item_code", pa.string()),
+        ("item_label", pa.string()),
+        ("value", pa.float64()),
+        ("answer_rank", pa.int32()),
+        ("source", pa.string()),
+    ]
+)
+SURVEY_COLUMNS = SURVEY_SCHEMA.names
+
+
+def make_item_code(label: str) -> str:
+    return hashlib.sha1(label.encode("utf-8")).hexdigest()[:12]
+
+
+def _is_label(cell) -> bool:
+    # Ranking answers are numbers, sometimes stored as text ("1")
+    return isinstance(cell, str) and not cell.strip().isdigit()
+
+
+def parse_raq_workbook(path: Path) -> pa.Table:
+    """
+    Turn the RAQ statistical annex into long format: one row per
+    (period, item, value). Labels are carried down to the value rows
+    below them, numbers in the label column are ranking answers, and rows
+    without a numeric value are dropped. Label rows without a value of
+    their own are kept once, for the current period, with a NULL value so
+    every question reaches the label dictionary.
+    """
+    sheet = pd.read_excel(path, sheet_name=RAQ_SHEET, engine="openpyxl")
+
+    cells = sheet[RAQ_LABEL_COLUMN]
+    is_label = cells.map(_is_label)
+    labels = cells.where(is_label).str.strip().ffill()
+    ranks = pd.to_numeric(cells.where(~is_label), errors="coerce").astype("Int32")
+
+    frames = []
+    for n, (column, period) in enumerate(RAQ_PERIOD_COLUMNS.items()):
+        values = pd.to_numeric(sheet[column], errors="coerce")
+        mask = values.notna() & labels.notna()
+        if n == 0:
+            mask |= is_label & values.isna()
+        frames.append(
+            pd.DataFrame(
+                {
+                    "exercise": RAQ_EXERCISE,
+                    "period": period,
+                    "item_label": labels[mask],
+                    "value": values[mask].astype("float64"),
+                    "answer_rank": ranks[mask],
+                }
+            )
+        )
+
+    df = pd.concat(frames, ignore_index=True)
+    codes = {label: make_item_code(label) for label in df["item_label"].unique()}
+    df["item_code"] = df["item_label"].map(codes)
+    df["source"] = path.name
+
+    return pa.Table.from_pandas(df[SURVEY_COLUMNS], schema=SURVEY_SCHEMA)
+
+
+def convert_workbook(path: Path, checksum: str) -> pa.Table:
+    """
+    Parse the workbook once per checksum; later runs read the typed
+    Parquet cache instead of going through openpyxl.
+    The latest parse is also copied to LOADED_SURVEY_PATH, which the Arrow
+    analytics backend can be pointed at with SURVEY_PARQUET_PATH. The
+    committed raq_results_long.parquet is never written.
+    """
+    cache_path = STRUCTURED_CACHE_DIR / f"{checksum}-v{RAQ_PARSER_VERSION}.parquet"
+
+    if cache_path.exists():
+        table = pq.read_table(cache_path)
+    else:
+        table = parse_raq_workbook(path)
+        STRUCTURED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        pq.write_table(table, tmp_path)
+        tmp_path.replace(cache_path)
+
+    metadata = {b"checksum": checksum.encode()}
+    published = (
+        pq.read_schema(LOADED_SURVEY_PATH).metadata
+        if LOADED_SURVEY_PATH.exists()
+        else None
+    )
+    if (published or {}).get(b"checksum") != metadata[b"checksum"]:
+        tmp_path = LOADED_SURVEY_PATH.with_suffix(".tmp")
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+        tmp_path.replace(LOADED_SURVEY_PATH)
+
+    return table
+
+
+def iter_rows(table: pa.Table):
+    for batch in table.to_batches():
+        yield from zip(*(batch.column(name).to_pylist() for name in SURVEY_COLUMNS))
+
+
+def _record_run(conn, source_id, started_at, status, inserted=0, updated=0, error=None):
+    conn.execute(
+        text("""
+            INSERT INTO meta.ingestion_runs (
+                source_id, target_schema, target_table, rows_inserted,
+                rows_updated, status, started_at, completed_at, error_message
+            )
+            VALUES (
+                :source_id, 'finance', 'survey_metrics', :inserted,
+                :updated, :status, :started_at, :completed_at, :error
+            )
+        """),
+        {
+            "source_id": source_id,
+            "inserted": inserted,
+            "updated": updated,
+            "status": status,
+            "started_at": started_at,
+            "completed_at": datetime.now(),
+            "error": error,
+        },
+    )
+
+
+def load_survey(table: pa.Table, conn) -> tuple[int, int]:
+    """
+    COPY the table into a temporary stage, then upsert it into
+    finance.survey_metrics on (exercise, period, item_code, value).
+    Returns (rows inserted, rows updated).
+    """
+    conn.execute(text("""
+            CREATE TEMP TABLE survey_metrics_stage (
+                exercise TEXT,
+                period TEXT,
+                item_code TEXT,
+                item_label TEXT,
+                value DOUBLE PRECISION,
+                answer_rank INTEGER,
+                source TEXT
+            ) ON COMMIT DROP
+        """))
+    copy_rows(conn, "survey_metrics_stage", SURVEY_COLUMNS, iter_rows(table))
+
+    rows = conn.execute(text("""
+            INSERT INTO finance.survey_metrics (
+                exercise, period, item_code, item_label, value, answer_rank, source
+            )
+            SELECT DISTINCT ON (exercise, period, item_code, value)
+                exercise, period, item_code, item_label, value, answer_rank, source
+            FROM survey_metrics_stage
+            ORDER BY exercise, period, item_code, value, answer_rank
+            ON CONFLICT (exercise, period, item_code, value) DO UPDATE SET
+                item_label = EXCLUDED.item_label,
+                answer_rank = EXCLUDED.answer_rank,
+                source = EXCLUDED.source
+            WHERE (
+                survey_metrics.item_label,
+                survey_metrics.answer_rank,
+                survey_metrics.source
+            ) IS DISTINCT FROM (
+                EXCLUDED.item_label, EXCLUDED.answer_rank, EXCLUDED.source
+            )
+            RETURNING (xmax = 0) AS inserted
+        """)).all()
+
+    inserted = sum(1 for r in rows if r.inserted)
+    return inserted, len(rows) - inserted
+
+
+def sync_workbook(path: Path = RAQ_WORKBOOK, force: bool = False) -> dict | None:
+    """
+    Load the RAQ workbook into finance.survey_metrics.
+    Unchanged workbooks (same SHA-256) are skipped unless `force` is set.
+    The load, data source and run bookkeeping share one transaction, and
+    the analytics aggregates are refreshed afterwards.
+    Returns run stats, or None when the workbook was unchanged.
+    """
+    started_at = datetime.now()
+    checksum = file_checksum(path)
+
+    with engine.connect() as conn:
+        source = (
+            conn.execute(
+                text("""
+                    SELECT source_id, checksum
+                    FROM meta.data_sources
+                    WHERE source_name = :source_name
+                """),
+                {"source_name": path.name},
+            )
+            .mappings()
+            .first()
+        )
+
+    if source and source["checksum"] == checksum and not force:
+        return None
+
+    try:
+        table = convert_workbook(path, checksum)
+
+        with engine.begin() as conn:
+            inserted, updated = load_survey(table, conn)
+
+            source_id = conn.execute(
+                text("""
+                    INSERT INTO meta.data_sources (
+                        source_name, source_type, file_path, checksum, metadata
+                    )
+                    VALUES (:source_name, 'xlsx', :file_path, :checksum, :metadata)
+                    ON CONFLICT (source_name) DO UPDATE SET
+                        file_path = EXCLUDED.file_path,
+                        checksum = EXCLUDED.checksum,
+                        metadata = EXCLUDED.metadata,
+                        ingested_at = CURRENT_TIMESTAMP
+                    RETURNING source_id
+                """),
+                {
+                    "source_name": path.name,
+                    "file_path": str(path),
+                    "checksum": checksum,
+                    "metadata": json.dumps({"rows": table.num_rows}),
+                },
+            ).scalar_one()
+
+            _record_run(
+                conn,
+                source_id,
+                started_at,
+                "success",
+                inserted=inserted,
+                updated=updated,
+            )
+
+    except Exception as e:
+        with engine.begin() as conn:
+            _record_run(
+                conn,
+                (source or {}).get("source_id"),
+                started_at,
+                "failed",
+                error=str(e),
+            )
+        raise
+
+    refresh_aggregates()
+
+    return {"rows": table.num_rows, "rows_inserted": inserted, "rows_updated": updated}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load RAQ survey data")
+    parser.add_argument("--workbook", type=Path, default=RAQ_WORKBOOK)
+    parser.add_argument(
+        "--force", action="store_true", help="reload even if the workbook is unchanged"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stats = sync_workbook(args.workbook, force=args.force)
+
+    if stats is None:
+        print(f"Skipping {args.workbook.name} (unchanged)")
+        return
+
+    print(
+        f"Loaded {args.workbook.name}: {stats['rows']} rows, "
+        f"{stats['rows_inserted']} inserted, {stats['rows_updated']} updated"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,86 @@
+from concurrent.futures import ProcessPoolExecutor
 import fitz
 from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+import hashlib
+import os
 
+PAGE_CACHE_DIR = Path(os.getenv("PAGE_CACHE_DIR", "data/processed/page_text"))
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = 64
 
-def load_pdf(path: Path) -> list[dict]:
+
+def file_checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_pages(path: str, start: int, stop: int) -> list[dict]:
+    """Extract pages [start, stop) of one PDF. Runs in a worker process."""
+    pages = []
+
+    with fitz.open(path) as doc:
+        for page_num in range(start, stop):
+            text = doc[page_num].get_text("text").strip()
+            if not text:
+                continue
+
+            pages.append(
+                {
+                    "page_number": page_num + 1,
+                    "text": text,
+                }
+            )
+
+    return pages
+
+
+def _extract_parallel(path: Path, workers: int) -> list[dict]:
+    with fitz.open(path) as doc:
+        page_count = doc.page_count
+
+    ranges = [
+        (start, min(start + PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PAGES_PER_TASK)
+    ]
+
+    if workers <= 1 or len(ranges) <= 1:
+        return _extract_pages(str(path), 0, page_count)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        parts = pool.map(_extract_pages, [str(path)] * len(ranges), *zip(*ranges))
+        return [page for part in parts for page in part]
+
+
+def load_pdf(
+    path: Path, checksum: str | None = None, workers: int = EXTRACT_WORKERS
+) -> list[dict]:
     """
     Returns list of pages with text + some metadata
+    Page text is cached in a Parquet sidecar keyed by the file checksum,
+    so re-chunking never re-parses an unchanged PDF.
     """
-    doc = fitz.open(path)
-    pages = []
+    checksum = checksum or file_checksum(path)
+    cache_path = PAGE_CACHE_DIR / f"{checksum}.parquet"
+
+    if cache_path.exists():
+        return pq.read_table(cache_path).to_pylist()
+
+    pages = _extract_parallel(Path(path), workers)
 
-    for page_num, page in enumerate(doc, start=1):
-        text = page.get_text("text").strip()
-        if not text:
-            continue
-
-        pages.append(
-            {
-                "page_number": page_num,
-                "text": text,
-            }
-        )
+    PAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp")
+    pq.write_table(
+        pa.Table.from_pylist(
+            pages,
+            schema=pa.schema([("page_number", pa.int32()), ("text", pa.string())]),
+        ),
+        tmp_path,
+    )
+    tmp_path.replace(cache_path)
 
     return pages
@@ -0,0 +1,433 @@
+from contextlib import contextmanager
+from pathlib import Path
+from app.evaluation.benchmark import latency_summary
+import httpx
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+QUERY_TYPES = ["analytics", "document", "hybrid"]
+
+# Upper bucket edges in milliseconds; the last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+DEFAULT_QUERIES = {
+    "analytics": [
+        "What are the main profitability expectations of banks?",
+        "What do banks expect for liquidity over the next months?",
+        "How do banks plan their funding?",
+        "What are banks' capital expectations?",
+        "What do banks expect for asset quality?",
+    ],
+    "document": [
+        "What risks does the EBA highlight for EU banks?",
+        "What are the drivers of operational risk?",
+        "How does the report describe cyber risk?",
+        "What are the key risks mentioned by EBA?",
+        "What does the EBA say about geopolitical risks?",
+    ],
+    "hybrid": [
+        "How many banks expect higher profitability and what risks does the EBA mention?",
+        "What do banks expect for liquidity and what does the EBA report say?",
+        "Capital expectations of banks and regulatory requirements",
+        "Funding plans of banks compared with the EBA report",
+    ],
+}
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """Parse "analytics=0.3,document=0.5,hybrid=0.2" into normalised weights."""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in QUERY_TYPES:
+            raise ValueError(f"Unknown query type in mix: {name}")
+        weights[name.strip()] = float(weight)
+
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def generated_workload(mix: dict[str, float], seed: int = 7):
+    """Endless (offset, query) pairs drawn from DEFAULT_QUERIES by `mix`."""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    while True:
+        query_type = rng.choices(names, weights)[0]
+        yield None, rng.choice(DEFAULT_QUERIES[query_type])
+
+
+def read_replay(path: Path) -> list[tuple[float | None, str]]:
+    """
+    Read a captured query log: JSON lines with "query" and an optional
+    "offset" in seconds from the start of the capture, or plain text with
+    one query per line.
+    """
+    items = []
+    for line in Path(path).read_text().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            record = json.loads(line)
+            items.append((record.get("offset"), record["query"]))
+        else:
+            items.append((None, line))
+    return items
+
+
+def histogram(latencies_ms: list[float]) -> dict[str, int]:
+    counts = {f"le_{edge}": 0 for edge in HISTOGRAM_BUCKETS_MS}
+    counts["le_inf"] = 0
+
+    for latency in latencies_ms:
+        edge = next((e for e in HISTOGRAM_BUCKETS_MS if latency <= e), None)
+        counts[f"le_{edge}" if edge is not None else "le_inf"] += 1
+
+    return counts
+
+
+async def send_query(
+    client: httpx.AsyncClient, query: str, stream: bool = False
+) -> dict:
+    """
+    Send one query and time it.
+    In stream mode the time to the first answer token is recorded as well.
+    """
+    started = time.perf_counter()
+    sample = {"query_type": None, "ok": False, "status": None, "first_token_ms": None}
+
+    try:
+        if not stream:
+            response = await client.post("/query", json={"query": query})
+            sample["status"] = response.status_code
+            if response.status_code == 200:
+                sample["query_type"] = response.json()["query_type"]
+                sample["ok"] = True
+        else:
+            async with client.stream(
+                "POST", "/query/stream", json={"query": query}
+            ) as response:
+                sample["status"] = response.status_code
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[len("event: ") :]
+                    elif line.startswith("data: ") and event == "meta":
+                        sample["query_type"] = json.loads(line[len("data: ") :])[
+                            "query_type"
+                        ]
+                    elif event == "token" and sample["first_token_ms"] is None:
+                        sample["first_token_ms"] = (
+                            time.perf_counter() - started
+                        ) * 1000
+                    elif event == "done":
+                        sample["ok"] = response.status_code == 200
+                    elif event == "error":
+                        break
+    except httpx.HTTPError as e:
+        sample["error"] = type(e).__name__
+
+    sample["latency_ms"] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+async def run_step(
+    client: httpx.AsyncClient,
+    workload,
+    rps: float | None,
+    duration: float,
+    stream: bool = False,
+    speed: float = 1.0,
+) -> dict:
+    """
+    Open-loop load: requests are sent on schedule whether or not earlier
+    ones have finished, so queueing in the app shows up as latency.
+    With `rps` set, requests are paced evenly; otherwise each item's
+    recorded offset (divided by `speed`) is used.
+    """
+    started = time.perf_counter()
+    tasks = []
+
+    for i, (offset, query) in enumerate(workload):
+        due = i / rps if rps else (offset or 0.0) / speed
+        if due >= duration:
+            break
+
+        delay = started + due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send_query(client, query, stream)))
+
+    samples = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed, rps)
+
+
+def summarize(samples: list[dict], elapsed: float, target_rps: float | None) -> dict:
+    errors = [s for s in samples if not s["ok"]]
+    by_type = {}
+
+    for query_type in sorted({s["query_type"] or "unknown" for s in samples}):
+        typed = [
+            s
+            for s in samples
+            if (s["query_type"] or "unknown") == query_type and s["ok"]
+        ]
+        latencies = [s["latency_ms"] for s in typed]
+        first_tokens = [s["first_token_ms"] for s in typed if s["first_token_ms"]]
+        by_type[query_type] = {
+            "count": len(typed),
+            "latency_ms": latency_summary(latencies),
+            "histogram": histogram(latencies),
+        }
+        if first_tokens:
+            by_type[query_type]["first_token_ms"] = latency_summary(first_tokens)
+
+    ok = [s["latency_ms"] for s in samples if s["ok"]]
+    return {
+        "target_rps": target_rps,
+        "sent": len(samples),
+        "achieved_rps": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "error_rate": len(errors) / len(samples) if samples else 0.0,
+        "latency_ms": latency_summary(ok),
+        "by_type": by_type,
+    }
+
+
+def saturation_point(
+    steps: list[dict],
+    slo_ms: float,
+    min_throughput_ratio: float = 0.9,
+    max_error_rate: float = 0.01,
+) -> dict:
+    """
+    The first step where the app falls behind the offered load, breaks the
+    p95 latency objective or starts failing requests.
+    """
+    sustained = None
+
+    for step in steps:
+        p95 = step["latency_ms"]["p95"]
+        behind = (
+            step["target_rps"]
+            and step["achieved_rps"] < step["target_rps"] * min_throughput_ratio
+        )
+        if behind or step["error_rate"] > max_error_rate or p95 is None or p95 > slo_ms:
+            return {
+                "saturated_at_rps": step["target_rps"],
+                "max_sustained_rps": sustained,
+            }
+        sustained = step["target_rps"]
+
+    return {"saturated_at_rps": None, "max_sustained_rps": sustained}
+
+
+def _wait_until_healthy(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not become healthy within {timeout}s")
+
+
+@contextmanager
+def boot_services(
+    api_port: int = 8000,
+    mock_port: int = 8100,
+    workers: int = 1,
+    mock_args: list[str] | None = None,
+    start_db: bool = False,
+):
+    """
+    Start the mock OpenAI server and `app.api.main:app` (with `workers`
+    uvicorn workers) pointed at it; optionally start Postgres through
+    docker compose. Yields the API base URL and stops both processes on exit.
+    """
+    if start_db:
+        subprocess.run(["docker", "compose", "up", "-d", "--wait"], check=True)
+
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "OPENAI_API_KEY": "mock",
+    }
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "app.loadtest.mock_openai",
+                "--port",
+                str(mock_port),
+                *(mock_args or []),
+            ],
+            env=env,
+        )
+    ]
+
+    try:
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "app.api.main:app",
+                    "--port",
+                    str(api_port),
+                    "--workers",
+                    str(workers),
+                    "--log-level",
+                    "warning",
+                ],
+                env=env,
+            )
+        )
+        api_url = f"http://127.0.0.1:{api_port}"
+        _wait_until_healthy(f"{api_url}/health")
+        yield api_url
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+
+async def run_load_test(
+    url: str,
+    rps_steps: list[float],
+    duration: float = 30.0,
+    mix: dict[str, float] | None = None,
+    replay: Path | None = None,
+    replay_timing: bool = False,
+    speed: float = 1.0,
+    stream: bool = False,
+    slo_ms: float = 5000.0,
+    timeout: float = 120.0,
+    client: httpx.AsyncClient | None = None,
+) -> dict:
+    """
+    Drive the API at each RPS step in turn and report per-step latency
+    histograms by query type and the saturation point.
+    """
+    client = client or httpx.AsyncClient(
+        base_url=url,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+    )
+    replayed = read_replay(replay) if replay else None
+
+    steps = []
+    async with client:
+        if replayed and replay_timing:
+            steps.append(
+                await run_step(client, replayed, None, duration, stream, speed)
+            )
+        else:
+            for rps in rps_steps:
+                workload = (
+                    itertools.cycle(replayed)
+                    if replayed
+                    else generated_workload(
+                        mix or parse_mix("analytics=1,document=1,hybrid=1")
+                    )
+                )
+                logger.info(f"Running {rps} rps for {duration}s")
+                steps.append(await run_step(client, workload, rps, duration, stream))
+
+    return {
+        "url": url,
+        "duration_s": duration,
+        "stream": stream,
+        "slo_p95_ms": slo_ms,
+        "steps": steps,
+        "saturation": saturation_point(steps, slo_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the query API")
+    parser.add_argument("--url", default=os.getenv("API_URL", "http://localhost:8000"))
+    parser.add_argument("--rps", nargs="+", type=float, default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    parser.add_argument(
+        "--mix", type=parse_mix, default="analytics=1,document=1,hybrid=1"
+    )
+    parser.add_argument(
+        "--replay", type=Path, help="query log to replay (JSONL or text)"
+    )
+    parser.add_argument(
+        "--replay-timing",
+        action="store_true",
+        help="send replayed queries at their recorded offsets instead of --rps",
+    )
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--stream", action="store_true", help="use /query/stream")
+    parser.add_argument("--slo-ms", type=float, default=5000.0, help="p95 objective")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument(
+        "--boot",
+        action="store_true",
+        help="start the mock OpenAI server and the API locally",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--api-port", type=int, default=8000)
+    parser.add_argument("--mock-port", type=int, default=8100)
+    parser.add_argument("--start-db", action="store_true")
+    parser.add_argument(
+        "--mock-arg",
+        action="append",
+        default=[],
+        help="extra mock server argument, e.g. --mock-arg=--first-token-ms=800",
+    )
+    args = parser.parse_args()
+
+    def run(url: str) -> dict:
+        return asyncio.run(
+            run_load_test(
+                url,
+                args.rps,
+                duration=args.duration,
+                mix=args.mix,
+                replay=args.replay,
+                replay_timing=args.replay_timing,
+                speed=args.speed,
+                stream=args.stream,
+                slo_ms=args.slo_ms,
+            )
+        )
+
+    if args.boot:
+        with boot_services(
+            args.api_port, args.mock_port, args.workers, args.mock_arg, args.start_db
+        ) as url:
+            report = run(url)
+        report["workers"] = args.workers
+    else:
+        report = run(args.url)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
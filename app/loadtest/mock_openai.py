@@ -0,0 +1,155 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from app.evaluation.benchmark import HashingEmbedder
+import argparse
+import asyncio
+import json
+import os
+import time
+import uvicorn
+
+# Simulated model timings, in milliseconds
+MOCK_EMBEDDING_LATENCY_MS = float(os.getenv("MOCK_EMBEDDING_LATENCY_MS", "30"))
+MOCK_CHAT_FIRST_TOKEN_MS = float(os.getenv("MOCK_CHAT_FIRST_TOKEN_MS", "400"))
+MOCK_CHAT_TOKEN_MS = float(os.getenv("MOCK_CHAT_TOKEN_MS", "15"))
+MOCK_CHAT_TOKENS = int(os.getenv("MOCK_CHAT_TOKENS", "120"))
+
+ANSWER_WORDS = (
+    "- Banks remain well capitalised but face profitability pressure "
+    "(eba_risk_assessment_report_2025.pdf, p.12). "
+).split()
+
+
+def create_app(
+    embedding_latency_ms: float = MOCK_EMBEDDING_LATENCY_MS,
+    first_token_ms: float = MOCK_CHAT_FIRST_TOKEN_MS,
+    token_ms: float = MOCK_CHAT_TOKEN_MS,
+    answer_tokens: int = MOCK_CHAT_TOKENS,
+) -> FastAPI:
+    """
+    OpenAI-compatible stand-in for load tests.
+    Serves /v1/embeddings with deterministic hashed vectors and
+    /v1/chat/completions with a canned answer, streamed or not, after the
+    configured latencies. Point the app at it with OPENAI_BASE_URL.
+    """
+    app = FastAPI(title="Mock OpenAI")
+    embedder = HashingEmbedder()
+
+    def answer_tokens_list() -> list[str]:
+        return [ANSWER_WORDS[i % len(ANSWER_WORDS)] + " " for i in range(answer_tokens)]
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+
+        await asyncio.sleep(embedding_latency_ms / 1000)
+        vectors = embedder.embed(inputs)
+        tokens = sum(len(text.split()) for text in inputs)
+
+        return {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": vector.tolist()}
+                for i, vector in enumerate(vectors)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4o-mini")
+        created = int(time.time())
+        tokens = answer_tokens_list()
+
+        if not body.get("stream"):
+            await asyncio.sleep((first_token_ms + token_ms * len(tokens)) / 1000)
+            return {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 0,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": len(tokens),
+                },
+            }
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            payload = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        def usage_chunk() -> str:
+            payload = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": 0,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": len(tokens),
+                },
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            await asyncio.sleep(first_token_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            for token in tokens:
+                yield chunk({"content": token})
+                await asyncio.sleep(token_ms / 1000)
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield usage_chunk()
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument(
+        "--embedding-latency-ms", type=float, default=MOCK_EMBEDDING_LATENCY_MS
+    )
+    parser.add_argument(
+        "--first-token-ms", type=float, default=MOCK_CHAT_FIRST_TOKEN_MS
+    )
+    parser.add_argument("--token-ms", type=float, default=MOCK_CHAT_TOKEN_MS)
+    parser.add_argument("--answer-tokens", type=int, default=MOCK_CHAT_TOKENS)
+    args = parser.parse_args()
+
+    app = create_app(
+        embedding_latency_ms=args.embedding_latency_ms,
+        first_token_ms=args.first_token_ms,
+        token_ms=args.token_ms,
+        answer_tokens=args.answer_tokens,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from sqlalchemy import text
+from app.core.db import async_engine
+import numpy as np
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+CORPUS_VERSION_TTL = float(os.getenv("CORPUS_VERSION_TTL", "30"))
+
+_corpus_version: tuple[float, int | None] = (0.0, None)
+
+
+async def corpus_version() -> int | None:
+    """
+    Latest RAG ingestion run id, used to invalidate cached answers.
+    Re-read at most every CORPUS_VERSION_TTL seconds.
+    Returns None when the version cannot be determined.
+    """
+    global _corpus_version
+
+    checked_at, version = _corpus_version
+    if version is not None and time.monotonic() - checked_at < CORPUS_VERSION_TTL:
+        return version
+
+    try:
+        async with async_engine.connect() as conn:
+            result = await conn.execute(text("""
+                    SELECT COALESCE(MAX(run_id), 0)
+                    FROM meta.ingestion_runs
+                    WHERE target_schema = 'rag' AND status = 'success'
+                """))
+            version = result.scalar_one()
+    except Exception as e:
+        logger.warning(f"Could not read corpus version: {e}")
+        return None
+
+    _corpus_version = (time.monotonic(), version)
+    return version
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by the retrieved chunk_ids.
+    A cached answer is reused when the new query embedding is within
+    `threshold` cosine similarity of a cached query for the same chunks.
+    All entries are dropped when the corpus version changes.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_SIZE,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.version: int | None = None
+        self._entries: OrderedDict[tuple, list[tuple[np.ndarray, dict]]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray | None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _check_version(self, version: int) -> None:
+        if version != self.version:
+            self._entries.clear()
+            self._size = 0
+            self.version = version
+
+    def get(self, embedding, chunk_ids: list[int], version: int) -> dict | None:
+        query = self._unit(embedding)
+        key = tuple(chunk_ids)
+
+        with self._lock:
+            self._check_version(version)
+            candidates = self._entries.get(key)
+
+            if query is not None and candidates:
+                matrix = np.stack([vec for vec, _ in candidates])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+
+                if scores[best] >= self.threshold:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return candidates[best][1]
+
+            self.misses += 1
+            return None
+
+    def put(self, embedding, chunk_ids: list[int], version: int, result: dict):
+        query = self._unit(embedding)
+        if query is None:
+            return
+
+        key = tuple(chunk_ids)
+
+        with self._lock:
+            self._check_version(version)
+            self._entries.setdefault(key, []).append((query, result))
+            self._entries.move_to_end(key)
+            self._size += 1
+
+            while self._size > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+answer_cache = SemanticAnswerCache()
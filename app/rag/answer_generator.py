@@ -1,9 +1,15 @@
-from app.core.openai_client import chat
+from collections.abc import AsyncIterator
+from app.core.openai_client import achat, achat_stream
+from app.core.embedding_cache import aget_cached_embedding
+from app.rag.answer_cache import answer_cache, corpus_version
+from app.rag.context_packer import CONTEXT_CANDIDATES_PER_K, pack_context
 from app.rag.retriever import retrieve_chunks
 import logging
 
 logger = logging.getLogger(__name__)
 
+CHAT_MODEL = "gpt-4o-mini"
+
 SYSTEM_PROMPT = """You are a Regulatory Analytics Assistant.
 Use ONLY the provided sources. If the answer is not in the sources, say you don't know.
 Cite sources as: (file, p.X). Be concise and factual.
@@ -13,31 +19,20 @@ Cite sources as: (file, p.X). Be concise and factual.
 def _format_sources(chunks: list[dict]) -> str:
     parts = []
     for i, c in enumerate(chunks, start=1):
+        page = c["page_number"]
+        if c.get("page_end") and c["page_end"] != page:
+            page = f"{page}-{c['page_end']}"
         parts.append(
-            f"[{i}] file={c['file_name']} page={c['page_number']} score={c.get('similarity', 0):.3f}\n"
+            f"[{i}] file={c['file_name']} page={page} score={c.get('similarity', 0):.3f}\n"
             f"{c['content']}"
         )
     return "\n\n".join(parts)
 
 
-def answer_with_rag(query: str, top_k: int = 5) -> dict:
-    """
-    Core RAG logic.
-    Returns answer text + retrieved chunks.
-    """
-    try:
-        chunks = retrieve_chunks(query, top_k=top_k)
-
-        if not chunks:
-            return {
-                "answer": "No relevant documents found for this query.",
-                "chunks": [],
-                "sources": [],
-            }
-
-        sources_text = _format_sources(chunks)
+def _build_messages(query: str, chunks: list[dict]) -> list[dict]:
+    sources_text = _format_sources(chunks)
 
-        user_prompt = f"""Question:
+    user_prompt = f"""Question:
 {query}
 
 Sources:
@@ -47,25 +42,107 @@ Task:
 Answer the question using ONLY the sources. Provide 2-5 bullet points, then a short "Sources used" list with citations.
 """
 
-        answer = chat(
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-            ],
-            model="gpt-4o-mini",
-            temperature=0.0,
-        )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _build_sources(chunks: list[dict]) -> list[dict]:
+    return [
+        {
+            "file": c["file_name"],
+            "page": c.get("page_number"),
+            "score": c.get("similarity", 0),
+        }
+        for c in chunks
+    ]
+
+
+async def retrieve_context(
+    query: str,
+    query_embedding: list[float],
+    top_k: int = 5,
+    filters: dict | None = None,
+) -> list[dict]:
+    """
+    Over-fetch candidates and pack them into at most `top_k` prompt sources.
+    """
+    candidates = await retrieve_chunks(
+        query,
+        top_k=top_k * CONTEXT_CANDIDATES_PER_K,
+        query_embedding=query_embedding,
+        filters=filters,
+    )
+    return await pack_context(query_embedding, candidates, max_chunks=top_k)
+
+
+async def answer_from_chunks(
+    query: str, query_embedding: list[float], chunks: list[dict]
+) -> dict:
+    """
+    Generate an answer from already retrieved chunks.
+    Consults the semantic answer cache before calling the chat model.
+    """
+    if not chunks:
+        return {
+            "answer": "No relevant documents found for this query.",
+            "chunks": [],
+            "sources": [],
+        }
+
+    chunk_ids = [c.get("chunk_id") for c in chunks]
+    version = await corpus_version()
 
-        sources = [
-            {
-                "file": c["file_name"],
-                "page": c.get("page_number"),
-                "score": c.get("similarity", 0),
+    if version is not None:
+        cached = answer_cache.get(query_embedding, chunk_ids, version)
+        if cached is not None:
+            logger.info("Answer cache hit")
+            return {
+                "answer": cached["answer"],
+                "chunks": chunks,
+                "sources": cached["sources"],
             }
-            for c in chunks
-        ]
 
-        return {"answer": answer, "chunks": chunks, "sources": sources}
+    answer = await achat(
+        messages=_build_messages(query, chunks),
+        model=CHAT_MODEL,
+        temperature=0.0,
+    )
+
+    sources = _build_sources(chunks)
+
+    if version is not None:
+        answer_cache.put(
+            query_embedding,
+            chunk_ids,
+            version,
+            {"answer": answer, "sources": sources},
+        )
+
+    return {"answer": answer, "chunks": chunks, "sources": sources}
+
+
+async def answer_with_rag(
+    query: str,
+    top_k: int = 5,
+    query_embedding: list[float] | None = None,
+    filters: dict | None = None,
+) -> dict:
+    """
+    Core RAG logic.
+    Returns answer text + retrieved chunks.
+    Pass `query_embedding` when the caller already embedded the query, and
+    `filters` to scope retrieval (see retriever.FILTER_KEYS).
+    """
+    try:
+        if query_embedding is None:
+            query_embedding = await aget_cached_embedding(query)
+        chunks = await retrieve_context(
+            query, query_embedding, top_k=top_k, filters=filters
+        )
+
+        return await answer_from_chunks(query, query_embedding, chunks)
 
     except Exception as e:
         logger.error(f"Error in answer_with_rag: {e}")
@@ -76,9 +153,73 @@ Answer the question using ONLY the sources. Provide 2-5 bullet points, then a sh
         }
 
 
-def generate_rag_answer(query: str, top_k: int = 5) -> dict:
+async def stream_rag_answer(
+    query: str,
+    top_k: int = 5,
+    query_embedding: list[float] | None = None,
+    filters: dict | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Streaming variant of answer_with_rag.
+    Yields a {"event": "sources"} event as soon as retrieval finishes,
+    then {"event": "token"} events as the model produces the answer.
+    """
+    if query_embedding is None:
+        query_embedding = await aget_cached_embedding(query)
+    chunks = await retrieve_context(
+        query, query_embedding, top_k=top_k, filters=filters
+    )
+
+    if not chunks:
+        yield {"event": "sources", "sources": []}
+        yield {"event": "token", "text": "No relevant documents found for this query."}
+        return
+
+    chunk_ids = [c.get("chunk_id") for c in chunks]
+    version = await corpus_version()
+    cached = (
+        answer_cache.get(query_embedding, chunk_ids, version)
+        if version is not None
+        else None
+    )
+
+    if cached is not None:
+        logger.info("Answer cache hit")
+        yield {"event": "sources", "sources": cached["sources"]}
+        yield {"event": "token", "text": cached["answer"]}
+        return
+
+    sources = _build_sources(chunks)
+    yield {"event": "sources", "sources": sources}
+
+    parts = []
+    async for token in achat_stream(
+        messages=_build_messages(query, chunks),
+        model=CHAT_MODEL,
+        temperature=0.0,
+    ):
+        parts.append(token)
+        yield {"event": "token", "text": token}
+
+    if version is not None:
+        answer_cache.put(
+            query_embedding,
+            chunk_ids,
+            version,
+            {"answer": "".join(parts), "sources": sources},
+        )
+
+
+async def generate_rag_answer(
+    query: str,
+    top_k: int = 5,
+    query_embedding: list[float] | None = None,
+    filters: dict | None = None,
+) -> dict:
     """
     Public interface for RAG answering.
     Returns structured dict with answer and sources.
     """
-    return answer_with_rag(query, top_k=top_k)
+    return await answer_with_rag(
+        query, top_k=top_k, query_embedding=query_embedding, filters=filters
+    )
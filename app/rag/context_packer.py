@@ -0,0 +1,223 @@
+from sqlalchemy import text
+from app.core.db import async_engine
+from app.core.metrics import stage
+from app.ingestion.chunker import count_tokens, truncate_tokens
+from app.rag.retriever import RETRIEVER_BACKEND
+from app.rag.vector_index import vector_index
+import numpy as np
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Prompt budget for source text, and how many candidates to retrieve per chunk kept
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_CANDIDATES_PER_K = int(os.getenv("CONTEXT_CANDIDATES_PER_K", "3"))
+# 1.0 ranks purely by relevance, lower values favour diverse sources
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Shorter shared text between two chunks is treated as coincidence
+MIN_OVERLAP_CHARS = 16
+
+EMBEDDINGS_SQL = text("""
+    SELECT chunk_id, embedding
+    FROM rag.document_embeddings
+    WHERE file_name = ANY(:file_names)
+      AND chunk_id = ANY(:chunk_ids)
+""")
+
+
+async def _stored_embeddings(candidates: list[dict]) -> dict:
+    ids = [c["chunk_id"] for c in candidates if c.get("chunk_id") is not None]
+    if not ids:
+        return {}
+    # The file names prune the search to the candidates' partitions
+    file_names = sorted({c.get("file_name") for c in candidates} - {None})
+
+    try:
+        if RETRIEVER_BACKEND == "numpy":
+            return vector_index.vectors(ids)
+
+        async with async_engine.connect() as conn:
+            result = await conn.execute(
+                EMBEDDINGS_SQL, {"file_names": file_names, "chunk_ids": ids}
+            )
+            # Decoded from pgvector's binary format by the registered codec
+            return {r.chunk_id: r.embedding.to_numpy() for r in result}
+    except Exception as e:
+        logger.warning(f"Stored embeddings unavailable, keeping retrieval order: {e}")
+        return {}
+
+
+def mmr_order(
+    query_embedding, vectors: np.ndarray, lambda_: float = MMR_LAMBDA
+) -> list[int]:
+    """
+    Order candidate rows by maximal marginal relevance: each step picks the
+    row maximising lambda * sim(query, row) - (1 - lambda) * max sim(row, picked).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1.0)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    relevance = vectors @ query
+    pairwise = vectors @ vectors.T
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    order = []
+
+    for _ in range(len(vectors)):
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        picked = int(np.argmax(scores))
+        order.append(picked)
+        available[picked] = False
+        redundancy = np.maximum(redundancy, pairwise[picked])
+
+    return order
+
+
+def _overlap_length(first: str, second: str) -> int:
+    """Length of the longest suffix of `first` that is a prefix of `second`."""
+    joined = second + "\x00" + first[-len(second) :]
+    border = [0] * len(joined)
+
+    # KMP prefix function, linear in the length of the two texts
+    for i in range(1, len(joined)):
+        k = border[i - 1]
+        while k and joined[i] != joined[k]:
+            k = border[k - 1]
+        if joined[i] == joined[k]:
+            k += 1
+        border[i] = k
+
+    return border[-1]
+
+
+def merge_text(first: str, second: str) -> str | None:
+    """
+    Join `second` onto `first` when it continues it, dropping the repeated
+    overlap. Returns None when the two texts do not overlap.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+
+    overlap = _overlap_length(first, second)
+    if overlap < MIN_OVERLAP_CHARS:
+        return None
+
+    return first + second[overlap:]
+
+
+def merge_adjacent(chunks: list[dict]) -> list[dict]:
+    """
+    Merge overlapping neighbours from the same file and page range into one
+    source. A merged source keeps the rank of its best part.
+    """
+    ordered = sorted(
+        enumerate(chunks),
+        key=lambda item: (
+            item[1]["file_name"],
+            item[1].get("page_number") or 0,
+            item[1].get("chunk_id") or 0,
+        ),
+    )
+
+    merged: list[tuple[int, dict]] = []
+    for rank, chunk in ordered:
+        if merged:
+            prev_rank, prev = merged[-1]
+            prev_end = prev.get("page_end") or prev.get("page_number") or 0
+            if (
+                prev["file_name"] == chunk["file_name"]
+                and (prev.get("page_number") or 0)
+                <= (chunk.get("page_number") or 0)
+                <= prev_end
+            ):
+                content = merge_text(prev["content"], chunk["content"])
+                if content is not None:
+                    best = prev if prev_rank < rank else chunk
+                    merged[-1] = (
+                        min(prev_rank, rank),
+                        {
+                            **best,
+                            "content": content,
+                            "page_number": prev.get("page_number"),
+                            "page_end": max(
+                                prev_end,
+                                chunk.get("page_end") or chunk.get("page_number") or 0,
+                            ),
+                            "similarity": max(
+                                prev.get("similarity", 0), chunk.get("similarity", 0)
+                            ),
+                        },
+                    )
+                    continue
+
+        merged.append((rank, chunk))
+
+    return [chunk for _, chunk in sorted(merged, key=lambda item: item[0])]
+
+
+async def pack_context(
+    query_embedding,
+    candidates: list[dict],
+    max_chunks: int = 5,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+) -> list[dict]:
+    """
+    Turn over-fetched retrieval candidates into prompt sources:
+    MMR re-ranking on the stored embeddings, then candidates taken in rank
+    order, with overlapping neighbours merged, until `max_chunks` sources or
+    `token_budget` tokens are reached.
+    """
+    if not candidates:
+        return []
+
+    order = list(range(len(candidates)))
+    if query_embedding is not None:
+        with stage("stored_embeddings"):
+            vectors = await _stored_embeddings(candidates)
+        with_vectors = [
+            i for i, c in enumerate(candidates) if c.get("chunk_id") in vectors
+        ]
+
+        if len(with_vectors) > 1:
+            matrix = np.stack(
+                [vectors[candidates[i]["chunk_id"]] for i in with_vectors]
+            )
+            reranked = [with_vectors[j] for j in mmr_order(query_embedding, matrix)]
+            missing = set(order) - set(with_vectors)
+            order = reranked + [i for i in order if i in missing]
+
+    # Walk the ranking, merging as we go, so slots freed by merged neighbours
+    # or by sources over the budget are refilled from further down the list
+    tokens: dict[str, int] = {}
+
+    def size(chunk: dict) -> int:
+        content = chunk["content"]
+        if content not in tokens:
+            tokens[content] = count_tokens(content)
+        return tokens[content]
+
+    taken = []
+    packed = []
+    for i in order:
+        merged = merge_adjacent(taken + [candidates[i]])
+        if len(merged) > max_chunks:
+            continue
+        if sum(size(chunk) for chunk in merged) > token_budget:
+            if not taken:
+                # Always keep the best source, cut down to the budget
+                best = candidates[i]
+                return [
+                    {**best, "content": truncate_tokens(best["content"], token_budget)}
+                ]
+            continue
+        taken.append(candidates[i])
+        packed = merged
+
+    return packed
@@ -1,36 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import text
-from app.core.db import engine
-from app.core.openai_client import get_embedding
+from app.core.db import copy_vectors, engine
+from app.core.openai_client import get_embeddings
+from app.rag.index_manager import maybe_rebuild
+import logging
 
-BATCH_SIZE = 50
+logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 100
+MAX_CONCURRENCY = 4
 
-def generate_embeddings():
-    with engine.begin() as conn:
+
+def _fetch_pending(after_chunk_id: int, limit: int) -> list[tuple[int, str]]:
+    """
+    Next page of chunks without an embedding, in chunk_id order.
+    Keyset pagination keeps each page cheap and makes reruns resume naturally.
+    """
+    with engine.connect() as conn:
         rows = conn.execute(
             text("""
-                SELECT chunk_id, content
-                FROM rag.document_chunks_raw
-                WHERE chunk_id NOT IN (
-                    SELECT chunk_id FROM rag.document_embeddings
-                )
-                ORDER BY chunk_id
-            """)
+                SELECT dcr.chunk_id, dcr.content
+                FROM rag.document_chunks_raw dcr
+                WHERE dcr.chunk_id > :after_chunk_id
+                  AND NOT EXISTS (
+                      SELECT 1 FROM rag.document_embeddings de
+                      WHERE de.file_name = dcr.file_name
+                        AND de.chunk_id = dcr.chunk_id
+                  )
+                ORDER BY dcr.chunk_id
+                LIMIT :limit
+            """),
+            {"after_chunk_id": after_chunk_id, "limit": limit},
         ).fetchall()
 
-        print(f"Generating embeddings for {len(rows)} chunks")
+    return [(row[0], row[1]) for row in rows]
+
+
+def _embed_batch(batch: list[tuple[int, str]]) -> list[tuple[int, list[float]]]:
+    embeddings = get_embeddings([content for _, content in batch])
+    return [(chunk_id, emb) for (chunk_id, _), emb in zip(batch, embeddings)]
+
+
+def _write_batch(records: list[tuple[int, list[float]]]) -> None:
+    """
+    Bulk-load one batch with binary COPY into a staging table, then merge.
+    Each batch is its own transaction, so finished work survives a crash.
+    """
+
+    with engine.begin() as conn:
+        conn.execute(
+            text("""
+                CREATE TEMP TABLE embeddings_stage (
+                    chunk_id integer,
+                    embedding vector(1536)
+                ) ON COMMIT DROP
+            """)
+        )
+        copy_vectors(
+            conn,
+            "embeddings_stage",
+            ["chunk_id", "embedding"],
+            [chunk_id for chunk_id, _ in records],
+            [embedding for _, embedding in records],
+        )
+        conn.execute(
+            text("""
+                INSERT INTO rag.document_embeddings (chunk_id, file_name, embedding)
+                SELECT s.chunk_id, dcr.file_name, s.embedding
+                FROM embeddings_stage s
+                JOIN rag.document_chunks_raw dcr ON dcr.chunk_id = s.chunk_id
+                ON CONFLICT (file_name, chunk_id) DO NOTHING
+            """)
+        )
+
+
+def embed_window(
+    rows: list[tuple[int, str]],
+    pool: ThreadPoolExecutor,
+    batch_size: int = BATCH_SIZE,
+):
+    """
+    Split rows into batches and embed them concurrently.
+    Yields embedded batches in input order.
+    """
+    batches = [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+    yield from pool.map(_embed_batch, batches)
+
+
+def generate_embeddings(
+    batch_size: int = BATCH_SIZE, max_concurrency: int = MAX_CONCURRENCY
+) -> int:
+    """
+    Backfill embeddings for all chunks that do not have one yet.
+    Returns the number of embeddings written.
+    """
+    window_size = batch_size * max_concurrency
+    last_chunk_id = 0
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        while True:
+            rows = _fetch_pending(last_chunk_id, window_size)
+            if not rows:
+                break
+
+            for records in embed_window(rows, pool, batch_size=batch_size):
+                _write_batch(records)
+                written += len(records)
+
+            last_chunk_id = rows[-1][0]
+            logger.info(f"Embedded {written} chunks (up to chunk_id {last_chunk_id})")
+
+    print(f"Generated embeddings for {written} chunks")
 
-        for chunk_id, content in rows:
-            embedding = get_embedding(content)
+    if written:
+        maybe_rebuild()
 
-            conn.execute(
-                text("""
-                    INSERT INTO rag.document_embeddings (chunk_id, embedding)
-                    VALUES (:chunk_id, :embedding)
-                """),
-                {"chunk_id": chunk_id, "embedding": embedding},
-            )
+    return written
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     generate_embeddings()
@@ -0,0 +1,539 @@
+from sqlalchemy import text
+from app.core.db import async_engine, engine
+import numpy as np
+import argparse
+import json
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "idx_document_embeddings_vector"
+INDEX_TABLE = "rag.document_embeddings"
+
+ANN_RECALL_TARGET = float(os.getenv("ANN_RECALL_TARGET", "0.95"))
+REBUILD_GROWTH_FACTOR = float(os.getenv("ANN_REBUILD_GROWTH_FACTOR", "2.0"))
+MIN_ROWS_FOR_REBUILD = 1000
+EMBEDDING_DIMENSIONS = 1536
+
+# Representation the ANN index is built over. The full-precision vector stays
+# in the table and rescores the shortlist read from a compact index:
+# "vector" (full precision), "halfvec" (float16), "binary" (1 bit per
+# dimension) or "reduced" (first ANN_REDUCED_DIMENSIONS dimensions)
+ANN_STORAGE = os.getenv("ANN_STORAGE", "vector")
+ANN_REDUCED_DIMENSIONS = int(os.getenv("ANN_REDUCED_DIMENSIONS", "512"))
+
+# Shortlist size per requested result, by storage. Coarser representations
+# need a longer shortlist to keep recall after rescoring.
+RESCORE_FACTORS = {"vector": 1, "halfvec": 2, "reduced": 4, "binary": 10}
+ANN_RESCORE_FACTOR = os.getenv("ANN_RESCORE_FACTOR")
+SEARCH_PARAMS_TTL = 60.0
+
+# Build parameters each index method accepts
+METHOD_PARAMS = {"ivfflat": {"lists"}, "hnsw": {"m", "ef_construction"}}
+
+# Size of the noise added to sampled embeddings before they are used as
+# recall queries, relative to the vector's norm. Stored vectors are their
+# own nearest neighbour, which would make every query trivially easy.
+RECALL_QUERY_NOISE = 0.3
+
+# (recall target, hnsw.ef_search, fraction of ivfflat lists to probe)
+RECALL_TIERS = [
+    (0.90, 40, 0.02),
+    (0.95, 100, 0.05),
+    (0.98, 200, 0.10),
+    (1.00, 400, 0.20),
+]
+
+_search_params_cache: tuple[float, dict | None] = (0.0, None)
+
+
+def index_params(method: str, row_count: int) -> dict:
+    """
+    Build parameters sized to the table.
+    ivfflat follows the pgvector guidance of rows/1000 lists up to 1M rows
+    and sqrt(rows) above that.
+    """
+    if method == "ivfflat":
+        if row_count <= 1_000_000:
+            lists = max(1, row_count // 1000)
+        else:
+            lists = int(math.sqrt(row_count))
+        return {"lists": lists}
+
+    if method == "hnsw":
+        if row_count < 1_000_000:
+            return {"m": 16, "ef_construction": 64}
+        return {"m": 24, "ef_construction": 128}
+
+    raise ValueError(f"Unknown index method: {method}")
+
+
+def check_params(method: str, params: dict | None):
+    """Reject build parameters that do not belong to `method`."""
+    if method not in METHOD_PARAMS:
+        raise ValueError(f"Unknown index method: {method}")
+    unknown = set(params or {}) - METHOD_PARAMS[method]
+    if unknown:
+        raise ValueError(
+            f"{method} does not take {', '.join(sorted(unknown))}; "
+            f"valid parameters are {', '.join(sorted(METHOD_PARAMS[method]))}"
+        )
+
+
+def index_expression(storage: str, dimensions: int | None = None) -> str:
+    """
+    Indexed expression and operator class for a storage mode. Must match
+    the distance expressions in rag.search_chunks.
+    """
+    if storage == "vector":
+        return "embedding vector_cosine_ops"
+    if storage == "halfvec":
+        return f"(embedding::halfvec({EMBEDDING_DIMENSIONS})) halfvec_cosine_ops"
+    if storage == "binary":
+        return (
+            f"(binary_quantize(embedding)::bit({EMBEDDING_DIMENSIONS})) "
+            "bit_hamming_ops"
+        )
+    if storage == "reduced":
+        dimensions = dimensions or ANN_REDUCED_DIMENSIONS
+        if not 0 < dimensions < EMBEDDING_DIMENSIONS:
+            raise ValueError(f"Reduced dimensions out of range: {dimensions}")
+        return (
+            f"(subvector(embedding, 1, {int(dimensions)})::vector({int(dimensions)})) "
+            "vector_cosine_ops"
+        )
+
+    raise ValueError(f"Unknown embedding storage: {storage}")
+
+
+def rescore_factor(storage: str) -> int:
+    if ANN_RESCORE_FACTOR:
+        return max(1, int(ANN_RESCORE_FACTOR))
+    return RESCORE_FACTORS.get(storage, 1)
+
+
+def search_params(
+    method: str | None,
+    build_params: dict,
+    recall_target: float = ANN_RECALL_TARGET,
+    top_k: int = 5,
+    storage: str = "vector",
+    dimensions: int | None = None,
+) -> dict:
+    """
+    Per-query search settings for the requested recall target.
+    Returns values for rag.search_chunks' ef_search, probes, storage,
+    dimensions and rescore_factor arguments.
+    """
+    tier = next((t for t in RECALL_TIERS if recall_target <= t[0]), RECALL_TIERS[-1])
+    _, ef_search, probe_fraction = tier
+
+    factor = rescore_factor(storage)
+    params = {
+        "ef_search": None,
+        "probes": None,
+        "storage": storage,
+        "dimensions": dimensions,
+        "rescore_factor": factor,
+    }
+
+    if method == "hnsw":
+        # HNSW returns at most ef_search rows, so it must cover the shortlist
+        params["ef_search"] = max(ef_search, top_k * factor)
+    elif method == "ivfflat":
+        lists = build_params.get("lists", 100)
+        params["probes"] = max(1, math.ceil(lists * probe_fraction))
+
+    return params
+
+
+def _latest_build(conn) -> dict | None:
+    row = (
+        conn.execute(
+            text("""
+                SELECT method, params, row_count, build_seconds, built_at,
+                       storage, dimensions
+                FROM rag.index_builds
+                WHERE index_name = :index_name
+                ORDER BY build_id DESC
+                LIMIT 1
+            """),
+            {"index_name": INDEX_NAME},
+        )
+        .mappings()
+        .first()
+    )
+    if row is None:
+        return None
+
+    build = dict(row)
+    if isinstance(build["params"], str):
+        build["params"] = json.loads(build["params"])
+    return build
+
+
+async def current_search_params(top_k: int = 5) -> dict:
+    """
+    Search settings for the live index, re-read at most every
+    SEARCH_PARAMS_TTL seconds. Falls back to server defaults on error.
+    """
+    global _search_params_cache
+
+    checked_at, build = _search_params_cache
+    if build is None or time.monotonic() - checked_at > SEARCH_PARAMS_TTL:
+        try:
+            async with async_engine.connect() as conn:
+                build = await conn.run_sync(_latest_build) or {}
+            _search_params_cache = (time.monotonic(), build)
+        except Exception as e:
+            logger.warning(f"Could not read index build info: {e}")
+            build = {}
+            _search_params_cache = (time.monotonic(), build)
+
+    # docker/init.sql creates an HNSW index before any build is recorded
+    return search_params(
+        build.get("method", "hnsw"),
+        build.get("params") or {},
+        top_k=top_k,
+        storage=build.get("storage") or "vector",
+        dimensions=build.get("dimensions"),
+    )
+
+
+def _partitions(conn) -> list[str]:
+    """Partitions of INDEX_TABLE, empty when it is a plain table."""
+    return (
+        conn.execute(
+            text("""
+                SELECT n.nspname || '.' || c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE i.inhparent = to_regclass(:table)
+                ORDER BY 1
+            """),
+            {"table": INDEX_TABLE},
+        )
+        .scalars()
+        .all()
+    )
+
+
+def build_index(
+    method: str = "hnsw",
+    params: dict | None = None,
+    storage: str = ANN_STORAGE,
+    dimensions: int | None = None,
+) -> dict:
+    """
+    Build a new ANN index next to the live one and swap it in.
+    The build runs CONCURRENTLY so searches keep working meanwhile; on a
+    partitioned table each partition's index is built concurrently and
+    attached to a new parent index.
+    `storage` selects the representation the index is built over.
+    """
+    check_params(method, params)
+    if storage == "reduced":
+        dimensions = dimensions or ANN_REDUCED_DIMENSIONS
+    else:
+        dimensions = None
+    expression = index_expression(storage, dimensions)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        row_count = conn.execute(
+            text(f"SELECT COUNT(*) FROM {INDEX_TABLE}")
+        ).scalar_one()
+        params = params or index_params(method, row_count)
+        with_clause = ", ".join(f"{k} = {int(v)}" for k, v in params.items())
+
+        logger.info(
+            f"Building {method} index over {storage} on {row_count} rows with {params}"
+        )
+        started = time.perf_counter()
+
+        partitions = _partitions(conn)
+        if partitions:
+            conn.execute(text(f"DROP INDEX IF EXISTS rag.{INDEX_NAME}_new"))
+            conn.execute(text(f"""
+                    CREATE INDEX {INDEX_NAME}_new ON ONLY {INDEX_TABLE}
+                    USING {method} ({expression})
+                    WITH ({with_clause})
+                """))
+            for partition in partitions:
+                child = f"{partition.split('.')[-1]}_vector_new"
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS rag.{child}"))
+                conn.execute(text(f"""
+                        CREATE INDEX CONCURRENTLY {child} ON {partition}
+                        USING {method} ({expression})
+                        WITH ({with_clause})
+                    """))
+                conn.execute(
+                    text(
+                        f"ALTER INDEX rag.{INDEX_NAME}_new ATTACH PARTITION rag.{child}"
+                    )
+                )
+        else:
+            conn.execute(
+                text(f"DROP INDEX CONCURRENTLY IF EXISTS rag.{INDEX_NAME}_new")
+            )
+            conn.execute(text(f"""
+                    CREATE INDEX CONCURRENTLY {INDEX_NAME}_new ON {INDEX_TABLE}
+                    USING {method} ({expression})
+                    WITH ({with_clause})
+                """))
+
+        build_seconds = time.perf_counter() - started
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS rag.{INDEX_NAME}"))
+        conn.execute(text(f"ALTER INDEX rag.{INDEX_NAME}_new RENAME TO {INDEX_NAME}"))
+        for partition in partitions:
+            child = partition.split(".")[-1]
+            # Dropping the parent index drops attached children only; an
+            # unattached one left by an earlier upgrade would block the rename
+            conn.execute(text(f"DROP INDEX IF EXISTS rag.{child}_vector"))
+            conn.execute(
+                text(f"ALTER INDEX rag.{child}_vector_new RENAME TO {child}_vector")
+            )
+        conn.execute(
+            text("""
+                INSERT INTO rag.index_builds
+                    (index_name, method, params, row_count, build_seconds,
+                     storage, dimensions)
+                VALUES (:index_name, :method, :params, :row_count, :build_seconds,
+                        :storage, :dimensions)
+            """),
+            {
+                "index_name": INDEX_NAME,
+                "method": method,
+                "params": json.dumps(params),
+                "row_count": row_count,
+                "build_seconds": build_seconds,
+                "storage": storage,
+                "dimensions": dimensions,
+            },
+        )
+
+    logger.info(f"Built {method} index in {build_seconds:.1f}s")
+    return {
+        "method": method,
+        "params": params,
+        "storage": storage,
+        "dimensions": dimensions,
+        "row_count": row_count,
+        "build_seconds": build_seconds,
+    }
+
+
+def maybe_rebuild(growth_factor: float = REBUILD_GROWTH_FACTOR) -> dict | None:
+    """
+    Rebuild when the table has grown by `growth_factor` since the last build,
+    keeping the method and storage of the previous build. Returns the build
+    info or None.
+    """
+    with engine.connect() as conn:
+        row_count = conn.execute(
+            text(f"SELECT COUNT(*) FROM {INDEX_TABLE}")
+        ).scalar_one()
+        build = _latest_build(conn)
+
+    if row_count < MIN_ROWS_FOR_REBUILD:
+        return None
+
+    if build and row_count < build["row_count"] * growth_factor:
+        return None
+
+    if not build:
+        return build_index("hnsw")
+    return build_index(
+        build["method"],
+        storage=build.get("storage") or "vector",
+        dimensions=build.get("dimensions"),
+    )
+
+
+def perturb_queries(
+    embeddings: list[str], noise: float = RECALL_QUERY_NOISE, seed: int = 0
+) -> list[str]:
+    """
+    Stored embeddings (pgvector text) moved off their stored position by
+    Gaussian noise of `noise` times their norm, as vector literals.
+    """
+    rng = np.random.default_rng(seed)
+    queries = []
+    for embedding in embeddings:
+        vector = np.array(embedding.strip("[]").split(","), dtype=np.float64)
+        scale = noise * np.linalg.norm(vector) / math.sqrt(len(vector))
+        vector += rng.normal(0.0, scale, len(vector))
+        queries.append("[" + ",".join(f"{v:.7g}" for v in vector) + "]")
+    return queries
+
+
+def measure_recall(
+    samples: int = 50,
+    top_k: int = 10,
+    recall_target: float = ANN_RECALL_TARGET,
+    query_noise: float = RECALL_QUERY_NOISE,
+) -> dict:
+    """
+    Recall@k of the ANN index against exact search. Queries are stored
+    embeddings perturbed by `query_noise`, so they are near the data but
+    not in it.
+    """
+    with engine.connect() as conn:
+        build = _latest_build(conn) or {}
+        queries = (
+            conn.execute(
+                text(f"""
+                SELECT embedding::text FROM {INDEX_TABLE}
+                ORDER BY random()
+                LIMIT :samples
+            """),
+                {"samples": samples},
+            )
+            .scalars()
+            .all()
+        )
+
+    queries = perturb_queries(queries, query_noise)
+
+    params = search_params(
+        build.get("method"),
+        build.get("params") or {},
+        recall_target,
+        top_k,
+        storage=build.get("storage") or "vector",
+        dimensions=build.get("dimensions"),
+    )
+    search_sql = text("""
+        SELECT chunk_id
+        FROM rag.search_chunks(
+            CAST(:embedding AS vector), :top_k, :ef_search, :probes,
+            :storage, :dimensions, :rescore_factor
+        )
+    """)
+
+    # Ground truth is a plain sequential scan. rag.search_chunks runs dynamic
+    # SQL and sets its own planner settings, so it could still use the index
+    exact_sql = text(f"""
+        SELECT chunk_id
+        FROM {INDEX_TABLE}
+        ORDER BY embedding <=> CAST(:embedding AS vector)
+        LIMIT :top_k
+    """)
+
+    recalls = []
+    latencies = []
+
+    for embedding in queries:
+        args = {"embedding": embedding, "top_k": top_k, **params}
+
+        with engine.begin() as conn:
+            started = time.perf_counter()
+            approx = set(conn.execute(search_sql, args).scalars())
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        with engine.begin() as conn:
+            conn.execute(text("SET LOCAL enable_indexscan = off"))
+            exact_args = {"embedding": embedding, "top_k": top_k}
+            exact = set(conn.execute(exact_sql, exact_args).scalars())
+
+        if exact:
+            recalls.append(len(approx & exact) / len(exact))
+
+    latencies.sort()
+    return {
+        "samples": len(recalls),
+        "top_k": top_k,
+        "search_params": params,
+        "recall": sum(recalls) / len(recalls) if recalls else None,
+        "latency_ms_p50": latencies[len(latencies) // 2] if latencies else None,
+    }
+
+
+def report(samples: int = 50, top_k: int = 10) -> dict:
+    with engine.connect() as conn:
+        build = _latest_build(conn)
+        size = conn.execute(
+            text("""
+                SELECT pg_size_pretty(sum(pg_relation_size(relid)))
+                FROM (
+                    SELECT to_regclass(:name) AS relid
+                    UNION ALL
+                    SELECT inhrelid FROM pg_inherits
+                    WHERE inhparent = to_regclass(:name)
+                ) AS index_parts
+            """),
+            {"name": f"rag.{INDEX_NAME}"},
+        ).scalar_one()
+        row_count = conn.execute(
+            text(f"SELECT COUNT(*) FROM {INDEX_TABLE}")
+        ).scalar_one()
+
+    return {
+        "index": INDEX_NAME,
+        "size": size,
+        "rows": row_count,
+        "last_build": build,
+        "recall": measure_recall(samples=samples, top_k=top_k),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the ANN index on embeddings")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Build or rebuild the index")
+    build.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    build.add_argument("--lists", type=int)
+    build.add_argument("--m", type=int)
+    build.add_argument("--ef-construction", type=int)
+    build.add_argument(
+        "--storage",
+        choices=list(RESCORE_FACTORS),
+        default=ANN_STORAGE,
+        help="Representation to index; full vectors rescore the shortlist",
+    )
+    build.add_argument(
+        "--dimensions", type=int, help="Leading dimensions kept by --storage reduced"
+    )
+
+    sub.add_parser("rebuild-if-needed", help="Rebuild if the table has grown")
+
+    rep = sub.add_parser("report", help="Show size, build time and recall")
+    rep.add_argument("--samples", type=int, default=50)
+    rep.add_argument("--top-k", type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        overrides = {
+            k: v
+            for k, v in {
+                "lists": args.lists,
+                "m": args.m,
+                "ef_construction": args.ef_construction,
+            }.items()
+            if v is not None
+        }
+        try:
+            check_params(args.method, overrides)
+        except ValueError as e:
+            parser.error(str(e))
+        result = build_index(
+            args.method, overrides or None, args.storage, args.dimensions
+        )
+    elif args.command == "rebuild-if-needed":
+        result = maybe_rebuild() or {"rebuilt": False}
+    else:
+        result = report(samples=args.samples, top_k=args.top_k)
+
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
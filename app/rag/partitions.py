@@ -0,0 +1,462 @@
+from sqlalchemy import text
+from app.core.db import async_engine, engine
+from app.rag.index_manager import (
+    INDEX_NAME,
+    _latest_build,
+    index_expression,
+    index_params,
+)
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_TABLE = "rag.document_chunks_raw"
+EMBEDDINGS_TABLE = "rag.document_embeddings"
+DEFAULT_SUFFIX = "default"
+
+# Give each ingested document its own partition pair
+PARTITION_BY_DOCUMENT = os.getenv("PARTITION_BY_DOCUMENT", "true").lower() == "true"
+# Connections a single search fans out over, one group of partitions each
+PARTITION_SEARCH_WORKERS = int(os.getenv("PARTITION_SEARCH_WORKERS", "4"))
+PARTITIONS_TTL = 60.0
+
+CHUNK_COLUMNS = (
+    "chunk_id, file_name, page_number, page_end, chunk_index, content, created_at"
+)
+EMBEDDING_COLUMNS = "embedding_id, chunk_id, file_name, embedding, created_at"
+
+_partitions_cache: tuple[float, dict | None] = (0.0, None)
+
+
+def partition_suffix(file_name: str) -> str:
+    """Short, stable table name suffix for a document's partitions."""
+    return "d" + hashlib.sha1(file_name.encode("utf-8")).hexdigest()[:12]
+
+
+def partition_tables(suffix: str) -> tuple[str, str]:
+    return f"{CHUNKS_TABLE}_{suffix}", f"{EMBEDDINGS_TABLE}_{suffix}"
+
+
+def search_groups(
+    partitions: list[str],
+    file_names: list[str] | None = None,
+    workers: int = PARTITION_SEARCH_WORKERS,
+) -> list[list[str]]:
+    """
+    Split the partitioned documents in scope into at most `workers` groups
+    to search concurrently. Returns no groups when fewer than two
+    partitions are in scope, so the caller runs a single search.
+    """
+    if file_names is not None:
+        wanted = set(file_names)
+        partitions = [name for name in partitions if name in wanted]
+
+    if len(partitions) < 2 or workers < 2:
+        return []
+
+    workers = min(workers, len(partitions))
+    return [partitions[i::workers] for i in range(workers)]
+
+
+def is_partitioned(conn) -> bool:
+    return (
+        conn.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": EMBEDDINGS_TABLE},
+        ).scalar()
+        or False
+    )
+
+
+def _partitions_state(conn) -> dict:
+    if not is_partitioned(conn):
+        return {"file_names": [], "default_empty": False}
+
+    file_names = (
+        conn.execute(
+            text("SELECT file_name FROM rag.document_partitions ORDER BY file_name")
+        )
+        .scalars()
+        .all()
+    )
+    default_empty = conn.execute(text(f"""
+            SELECT NOT EXISTS (SELECT 1 FROM {EMBEDDINGS_TABLE}_{DEFAULT_SUFFIX})
+        """)).scalar_one()
+    return {"file_names": list(file_names), "default_empty": default_empty}
+
+
+async def partition_groups(file_names: list[str] | None = None) -> list[list[str]]:
+    """
+    Search groups for the current partition layout, re-read at most every
+    PARTITIONS_TTL seconds. Searches fan out only while the default
+    partition is empty, since groups address partitions by document.
+    """
+    global _partitions_cache
+
+    checked_at, state = _partitions_cache
+    if state is None or time.monotonic() - checked_at > PARTITIONS_TTL:
+        try:
+            async with async_engine.connect() as conn:
+                state = await conn.run_sync(_partitions_state)
+        except Exception as e:
+            logger.warning(f"Could not read partition layout: {e}")
+            state = {"file_names": [], "default_empty": False}
+        _partitions_cache = (time.monotonic(), state)
+
+    if not state["default_empty"]:
+        return []
+    return search_groups(state["file_names"], file_names)
+
+
+def _literal(conn, value: str) -> str:
+    # Partition bounds are DDL and cannot take bind parameters
+    return conn.execute(text("SELECT quote_literal(:value)"), {"value": value}).scalar()
+
+
+def _in_default(conn, file_name: str) -> bool:
+    return conn.execute(
+        text(f"""
+            SELECT EXISTS (
+                SELECT 1 FROM {CHUNKS_TABLE}_{DEFAULT_SUFFIX} WHERE file_name = :file_name
+            )
+        """),
+        {"file_name": file_name},
+    ).scalar_one()
+
+
+def _registered(conn, file_name: str) -> bool:
+    return (
+        conn.execute(
+            text("SELECT 1 FROM rag.document_partitions WHERE file_name = :file_name"),
+            {"file_name": file_name},
+        ).first()
+        is not None
+    )
+
+
+def create_partition(file_name: str) -> bool:
+    """
+    Create an empty partition pair for a new document, so its chunks and
+    embeddings get their own table and ANN index partition on insert.
+    Documents already stored in the default partition are left there
+    (move them with attach_document). Returns True when created.
+    """
+    suffix = partition_suffix(file_name)
+    chunks_table, embeddings_table = partition_tables(suffix)
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn) or _registered(conn, file_name):
+            return False
+        if _in_default(conn, file_name):
+            return False
+
+        bound = _literal(conn, file_name)
+        conn.execute(text(f"""
+                CREATE TABLE {chunks_table}
+                PARTITION OF {CHUNKS_TABLE} FOR VALUES IN ({bound})
+            """))
+        conn.execute(text(f"""
+                CREATE TABLE {embeddings_table}
+                PARTITION OF {EMBEDDINGS_TABLE} FOR VALUES IN ({bound})
+            """))
+        conn.execute(
+            text("""
+                INSERT INTO rag.document_partitions (file_name, partition_suffix)
+                VALUES (:file_name, :suffix)
+            """),
+            {"file_name": file_name, "suffix": suffix},
+        )
+
+    logger.info(f"Created partitions {suffix} for {file_name}")
+    return True
+
+
+def _build_partition_index(conn, embeddings_table: str) -> float:
+    """ANN index on a standalone table, matching the live index build."""
+    build = _latest_build(conn) or {}
+    method = build.get("method", "hnsw")
+    params = build.get("params") or index_params(method, 0)
+    expression = index_expression(
+        build.get("storage") or "vector", build.get("dimensions")
+    )
+    with_clause = ", ".join(f"{k} = {int(v)}" for k, v in params.items())
+    index = f"{embeddings_table.split('.')[-1]}_vector"
+
+    started = time.perf_counter()
+    conn.execute(text(f"DROP INDEX IF EXISTS rag.{index}"))
+    conn.execute(text(f"""
+            CREATE INDEX {index} ON {embeddings_table}
+            USING {method} ({expression})
+            WITH ({with_clause})
+        """))
+    return time.perf_counter() - started
+
+
+def _sync_copy(conn, file_name: str, chunks_table: str, embeddings_table: str):
+    """Make the copied tables match the default partition's rows again."""
+    for table, default, columns in (
+        (chunks_table, f"{CHUNKS_TABLE}_{DEFAULT_SUFFIX}", CHUNK_COLUMNS),
+        (embeddings_table, f"{EMBEDDINGS_TABLE}_{DEFAULT_SUFFIX}", EMBEDDING_COLUMNS),
+    ):
+        conn.execute(
+            text(f"""
+                DELETE FROM {table} t
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {default} d
+                    WHERE d.file_name = :file_name AND d.chunk_id = t.chunk_id
+                )
+            """),
+            {"file_name": file_name},
+        )
+        conn.execute(
+            text(f"""
+                INSERT INTO {table} ({columns})
+                SELECT {columns} FROM {default} d
+                WHERE d.file_name = :file_name
+                  AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.chunk_id = d.chunk_id)
+            """),
+            {"file_name": file_name},
+        )
+
+
+def attach_document(file_name: str) -> dict:
+    """
+    Give a document its own partition pair without a full index rebuild.
+    Rows are copied from the default partition (or a previously detached
+    pair is reused) into standalone tables, the ANN index is built there
+    while searches continue, and both tables are attached in one short
+    transaction that locks out writers to the default partition and copies
+    rows written in the meantime. The attach scans the default partition,
+    so move large backlogs in a maintenance window.
+    """
+    suffix = partition_suffix(file_name)
+    chunks_table, embeddings_table = partition_tables(suffix)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not is_partitioned(conn):
+            raise RuntimeError("Apply db/partitioned_storage.sql first")
+        if _registered(conn, file_name):
+            return {"file_name": file_name, "partition": suffix, "attached": False}
+
+        bound = _literal(conn, file_name)
+        reused = (
+            conn.execute(
+                text("SELECT to_regclass(:table)"), {"table": chunks_table}
+            ).scalar()
+            is not None
+        )
+
+        if not reused:
+            conn.execute(text(f"""
+                    CREATE TABLE {chunks_table}
+                    (LIKE {CHUNKS_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED)
+                """))
+            conn.execute(text(f"""
+                    CREATE TABLE {embeddings_table}
+                    (LIKE {EMBEDDINGS_TABLE} INCLUDING DEFAULTS)
+                """))
+            conn.execute(
+                text(f"""
+                    INSERT INTO {chunks_table} ({CHUNK_COLUMNS})
+                    SELECT {CHUNK_COLUMNS} FROM {CHUNKS_TABLE}_{DEFAULT_SUFFIX}
+                    WHERE file_name = :file_name
+                """),
+                {"file_name": file_name},
+            )
+            conn.execute(
+                text(f"""
+                    INSERT INTO {embeddings_table} ({EMBEDDING_COLUMNS})
+                    SELECT {EMBEDDING_COLUMNS} FROM {EMBEDDINGS_TABLE}_{DEFAULT_SUFFIX}
+                    WHERE file_name = :file_name
+                """),
+                {"file_name": file_name},
+            )
+
+        # Lets ATTACH skip scanning the new tables for the partition bound
+        for table in (chunks_table, embeddings_table):
+            conn.execute(
+                text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS partition_bound")
+            )
+            conn.execute(text(f"""
+                    ALTER TABLE {table} ADD CONSTRAINT partition_bound
+                    CHECK (file_name IS NOT NULL AND file_name = {bound})
+                """))
+
+        # Detached tables keep their index partition
+        build_seconds = (
+            0.0 if reused else _build_partition_index(conn, embeddings_table)
+        )
+        rows = conn.execute(text(f"SELECT COUNT(*) FROM {embeddings_table}")).scalar()
+
+    with engine.begin() as conn:
+        # Hold off writers to the default partition until the rows are
+        # moved, and catch up with chunks and embeddings written (or
+        # re-ingested) since the copy
+        conn.execute(text(f"""
+                LOCK TABLE {CHUNKS_TABLE}_{DEFAULT_SUFFIX},
+                    {EMBEDDINGS_TABLE}_{DEFAULT_SUFFIX}
+                IN SHARE ROW EXCLUSIVE MODE
+            """))
+        if not reused:
+            _sync_copy(conn, file_name, chunks_table, embeddings_table)
+            rows = conn.execute(
+                text(f"SELECT COUNT(*) FROM {embeddings_table}")
+            ).scalar()
+
+        conn.execute(
+            text(f"DELETE FROM {CHUNKS_TABLE}_{DEFAULT_SUFFIX} WHERE file_name = :f"),
+            {"f": file_name},
+        )
+        conn.execute(text(f"""
+                ALTER TABLE {CHUNKS_TABLE}
+                ATTACH PARTITION {chunks_table} FOR VALUES IN ({bound})
+            """))
+        conn.execute(text(f"""
+                ALTER TABLE {EMBEDDINGS_TABLE}
+                ATTACH PARTITION {embeddings_table} FOR VALUES IN ({bound})
+            """))
+        conn.execute(
+            text("""
+                INSERT INTO rag.document_partitions (file_name, partition_suffix)
+                VALUES (:file_name, :suffix)
+            """),
+            {"file_name": file_name, "suffix": suffix},
+        )
+
+    logger.info(f"Attached {file_name} as {suffix} ({rows} embeddings)")
+    return {
+        "file_name": file_name,
+        "partition": suffix,
+        "attached": True,
+        "reused": reused,
+        "embeddings": rows,
+        "index_build_seconds": build_seconds,
+    }
+
+
+def detach_document(file_name: str, drop: bool = False) -> dict:
+    """
+    Retire a document by detaching its partition pair. The tables are kept
+    (and can be attached again) unless `drop` is set. No index is rebuilt.
+    """
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return {"file_name": file_name, "detached": False}
+
+        suffix = conn.execute(
+            text("""
+                DELETE FROM rag.document_partitions
+                WHERE file_name = :file_name
+                RETURNING partition_suffix
+            """),
+            {"file_name": file_name},
+        ).scalar()
+        if suffix is None:
+            return {"file_name": file_name, "detached": False}
+
+        chunks_table, embeddings_table = partition_tables(suffix)
+        conn.execute(
+            text(f"ALTER TABLE {EMBEDDINGS_TABLE} DETACH PARTITION {embeddings_table}")
+        )
+        # The detached table keeps a copy of the foreign key to the chunks
+        # parent, which would block detaching the chunks partition
+        foreign_keys = (
+            conn.execute(
+                text("""
+                    SELECT conname FROM pg_constraint
+                    WHERE conrelid = to_regclass(:table) AND contype = 'f'
+                """),
+                {"table": embeddings_table},
+            )
+            .scalars()
+            .all()
+        )
+        for name in foreign_keys:
+            conn.execute(
+                text(f'ALTER TABLE {embeddings_table} DROP CONSTRAINT "{name}"')
+            )
+        conn.execute(
+            text(f"ALTER TABLE {CHUNKS_TABLE} DETACH PARTITION {chunks_table}")
+        )
+
+        if drop:
+            conn.execute(text(f"DROP TABLE {embeddings_table}, {chunks_table}"))
+
+    logger.info(f"Detached {file_name} ({suffix}){' and dropped it' if drop else ''}")
+    return {
+        "file_name": file_name,
+        "partition": suffix,
+        "detached": True,
+        "dropped": drop,
+    }
+
+
+def report() -> dict:
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return {"partitioned": False}
+
+        rows = conn.execute(text(f"""
+                SELECT p.file_name, p.partition_suffix, p.attached_at,
+                       (SELECT COUNT(*) FROM pg_inherits i
+                        JOIN pg_class c ON c.oid = i.inhrelid
+                        WHERE i.inhparent = to_regclass('{EMBEDDINGS_TABLE}')
+                          AND c.relname = 'document_embeddings_' || p.partition_suffix
+                       ) = 1 AS attached
+                FROM rag.document_partitions p
+                ORDER BY p.file_name
+            """)).mappings().all()
+        default_documents = conn.execute(text(f"""
+                    SELECT DISTINCT file_name FROM {CHUNKS_TABLE}_{DEFAULT_SUFFIX}
+                    ORDER BY file_name
+                """)).scalars().all()
+
+    return {
+        "partitioned": True,
+        "index": INDEX_NAME,
+        "partitions": [dict(r) for r in rows],
+        "default_documents": list(default_documents),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage per-document partitions of the RAG tables"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    attach = sub.add_parser("attach", help="Move documents into their own partition")
+    attach.add_argument("file_names", nargs="*")
+    attach.add_argument(
+        "--all", action="store_true", help="Every document in the default partition"
+    )
+
+    detach = sub.add_parser("detach", help="Retire a document's partition")
+    detach.add_argument("file_name")
+    detach.add_argument("--drop", action="store_true", help="Drop the tables too")
+
+    sub.add_parser("report", help="List partitions and unpartitioned documents")
+
+    args = parser.parse_args()
+
+    if args.command == "attach":
+        file_names = args.file_names
+        if args.all:
+            file_names = report().get("default_documents", [])
+        result = [attach_document(name) for name in file_names]
+    elif args.command == "detach":
+        result = detach_document(args.file_name, drop=args.drop)
+    else:
+        result = report()
+
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
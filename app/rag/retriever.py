@@ -1,25 +1,329 @@
 from sqlalchemy import text
-from app.core.db import engine
-from app.core.openai_client import get_embedding
+from app.core.db import as_vector, async_engine, free_connections
+from app.core.embedding_cache import aget_cached_embedding
+from app.core.metrics import stage
+from app.rag.index_manager import current_search_params, search_params
+from app.rag.partitions import partition_groups
+from app.rag.vector_index import EMBEDDING_DIM, vector_index
+from datetime import date
+import numpy as np
+import asyncio
+import logging
+import os
 
+logger = logging.getLogger(__name__)
 
-def retrieve_chunks(query: str, top_k: int = 5) -> list[dict]:
-    query_embedding = get_embedding(query)
+# "pgvector" searches in Postgres, "numpy" searches an exported in-process snapshot
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "pgvector")
 
-    with engine.connect() as conn:
-        rows = (
-            conn.execute(
-                text("""
-                SELECT chunk_id, file_name, page_number, content, similarity
-                FROM rag.search_chunks(
-                    CAST(:embedding AS vector),
-                    :top_k
+# Fuse full-text and vector results with reciprocal rank fusion. Full-text
+# search runs in Postgres, so it is off by default with the numpy snapshot,
+# which otherwise answers unfiltered queries without a database round trip
+LEXICAL_SEARCH = (
+    os.getenv("LEXICAL_SEARCH", str(RETRIEVER_BACKEND == "pgvector")).lower() == "true"
+)
+RRF_K = 60
+RRF_CANDIDATES_PER_K = 4
+
+# Metadata filters pushed into rag.search_chunks and rag.search_chunks_lexical
+FILTER_KEYS = (
+    "file_names",
+    "document_ids",
+    "page_from",
+    "page_to",
+    "published_from",
+    "published_to",
+)
+
+SEARCH_SQL = text("""
+    SELECT chunk_id, file_name, page_number, content, similarity
+    FROM rag.search_chunks(
+        CAST(:embedding AS vector),
+        :top_k,
+        :ef_search,
+        :probes,
+        :storage,
+        :dimensions,
+        :rescore_factor,
+        CAST(:file_names AS text[]),
+        CAST(:document_ids AS integer[]),
+        :page_from,
+        :page_to,
+        CAST(:published_from AS date),
+        CAST(:published_to AS date)
+    )
+""")
+
+LEXICAL_SEARCH_SQL = text("""
+    SELECT chunk_id, file_name, page_number, content, similarity
+    FROM rag.search_chunks_lexical(
+        :query,
+        CAST(:embedding AS vector),
+        :top_k,
+        CAST(:file_names AS text[]),
+        CAST(:document_ids AS integer[]),
+        :page_from,
+        :page_to,
+        CAST(:published_from AS date),
+        CAST(:published_to AS date)
+    )
+""")
+
+
+def filter_params(filters: dict | None) -> dict:
+    """
+    Bind parameters for the search functions' metadata filters.
+    Accepts FILTER_KEYS; single file names or ids are wrapped in a list and
+    ISO date strings are parsed. Unset filters are None.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown search filters: {sorted(unknown)}")
+
+    params = {key: filters.get(key) for key in FILTER_KEYS}
+    for key in ("file_names", "document_ids"):
+        if isinstance(params[key], (str, int)):
+            params[key] = [params[key]]
+        elif params[key] is not None:
+            params[key] = list(params[key])
+    for key in ("published_from", "published_to"):
+        if isinstance(params[key], str):
+            params[key] = date.fromisoformat(params[key])
+    return params
+
+
+def _use_snapshot(params: dict) -> bool:
+    # The numpy snapshot holds no document metadata, filtered searches go to Postgres
+    return RETRIEVER_BACKEND == "numpy" and all(
+        params.get(key) is None for key in FILTER_KEYS
+    )
+
+
+def warmup_statements() -> list[tuple]:
+    """Search statements to prepare on each pooled connection at startup."""
+    probe = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    probe[0] = 1.0
+    filters = filter_params(None)
+
+    statements = [
+        (
+            SEARCH_SQL,
+            {
+                "embedding": probe,
+                "top_k": 0,
+                **search_params(None, {}, top_k=0),
+                **filters,
+            },
+        )
+    ]
+    if LEXICAL_SEARCH:
+        statements.append(
+            (
+                LEXICAL_SEARCH_SQL,
+                {"query": "", "embedding": probe, "top_k": 0, **filters},
+            )
+        )
+    return statements
+
+
+def reciprocal_rank_fusion(
+    result_lists: list[list[dict]], top_k: int, k: int = RRF_K
+) -> list[dict]:
+    """
+    Merge ranked result lists by summing 1 / (k + rank) per chunk_id.
+    Each returned dict carries its fused score as `rrf_score`.
+    """
+    scores: dict = {}
+    chunks: dict = {}
+
+    for results in result_lists:
+        for rank, chunk in enumerate(results, start=1):
+            chunk_id = chunk["chunk_id"]
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(chunk_id, chunk)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [{**chunks[chunk_id], "rrf_score": scores[chunk_id]} for chunk_id in ranked]
+
+
+async def _search_partitions(
+    query_embedding, top_k: int, params: dict, groups: list[list[str]]
+) -> list[dict]:
+    """
+    Search groups of document partitions concurrently and merge the
+    per-group top-k by similarity. Each group searches on a connection of
+    its own, and groups are folded together when the pool has fewer
+    connections free, so a search never holds one connection while it
+    waits for another.
+    """
+    workers = max(1, min(len(groups), free_connections(async_engine)))
+    if workers < len(groups):
+        groups = [sum(groups[i::workers], []) for i in range(workers)]
+
+    async def search_group(file_names):
+        async with async_engine.connect() as conn:
+            result = await conn.execute(
+                SEARCH_SQL,
+                {
+                    "embedding": as_vector(query_embedding),
+                    "top_k": top_k,
+                    **params,
+                    "file_names": file_names,
+                },
+            )
+            return [dict(r) for r in result.mappings().all()]
+
+    results = await asyncio.gather(*(search_group(group) for group in groups))
+    merged = [chunk for chunks in results for chunk in chunks]
+    merged.sort(key=lambda chunk: chunk["similarity"], reverse=True)
+    return merged[:top_k]
+
+
+async def _vector_search(conn, query_embedding, top_k: int, params: dict):
+    with stage("vector_search"):
+        if _use_snapshot(params):
+            return vector_index.search(query_embedding, top_k=top_k)
+
+        result = await conn.execute(
+            SEARCH_SQL,
+            {"embedding": as_vector(query_embedding), "top_k": top_k, **params},
+        )
+        return [dict(r) for r in result.mappings().all()]
+
+
+async def _search(query_embedding, top_k: int, params: dict) -> list[dict]:
+    """
+    Vector search for one query on connections it takes itself: the
+    snapshot, a fan-out over partition groups, or a single search.
+    """
+    if _use_snapshot(params):
+        return await _vector_search(None, query_embedding, top_k, params)
+
+    groups = await partition_groups(params.get("file_names"))
+    if groups:
+        with stage("vector_search"):
+            return await _search_partitions(query_embedding, top_k, params, groups)
+
+    async with async_engine.connect() as conn:
+        return await _vector_search(conn, query_embedding, top_k, params)
+
+
+async def _lexical_search(
+    conn, query: str, query_embedding, top_k: int, filters: dict | None = None
+):
+    try:
+        # Savepoint keeps the connection usable if the search fails
+        with stage("lexical_search"):
+            async with conn.begin_nested():
+                result = await conn.execute(
+                    LEXICAL_SEARCH_SQL,
+                    {
+                        "query": query,
+                        "embedding": as_vector(query_embedding),
+                        "top_k": top_k,
+                        **(filters or filter_params(None)),
+                    },
                 )
-            """),
-                {"embedding": query_embedding, "top_k": top_k},
+                return [dict(r) for r in result.mappings().all()]
+    except Exception as e:
+        # Databases without db/lexical_search.sql fall back to vector-only
+        logger.warning(f"Lexical search failed, using vector results only: {e}")
+        return []
+
+
+async def retrieve_chunks(
+    query: str,
+    top_k: int = 5,
+    query_embedding: list[float] | None = None,
+    filters: dict | None = None,
+) -> list[dict]:
+    """
+    Top-k chunks for a query. `filters` (see FILTER_KEYS) restrict the
+    search to documents, a page range or a publication date range inside
+    the database search, so the top-k is taken over matching chunks only.
+    """
+    if query_embedding is None:
+        query_embedding = await aget_cached_embedding(query)
+    filters = filter_params(filters)
+
+    if not LEXICAL_SEARCH:
+        if _use_snapshot(filters):
+            return await _search(query_embedding, top_k, filters)
+
+        params = await current_search_params(top_k)
+        return await _search(query_embedding, top_k, {**params, **filters})
+
+    candidates = top_k * RRF_CANDIDATES_PER_K
+    params = await current_search_params(candidates)
+
+    async def vector_branch():
+        if _use_snapshot(filters):
+            return await _search(query_embedding, candidates, filters)
+        return await _search(query_embedding, candidates, {**params, **filters})
+
+    async def lexical_branch():
+        async with async_engine.connect() as conn:
+            return await _lexical_search(
+                conn, query, query_embedding, candidates, filters
             )
-            .mappings()
-            .all()
+
+    vector_results, lexical_results = await asyncio.gather(
+        vector_branch(), lexical_branch()
+    )
+
+    return reciprocal_rank_fusion([vector_results, lexical_results], top_k)
+
+
+async def retrieve_chunks_batch(
+    query_embeddings: list[list[float]],
+    top_k: int = 5,
+    connections: int = 4,
+    queries: list[str] | None = None,
+) -> list[list[dict]]:
+    """
+    Run many searches over a small, fixed number of pooled connections.
+    When `queries` are given and lexical search is enabled, each query is
+    also searched by full text and the two lists are fused.
+    Results are returned in the same order as the embeddings.
+    """
+    if not query_embeddings:
+        return []
+
+    hybrid = LEXICAL_SEARCH and queries is not None
+    candidates = top_k * RRF_CANDIDATES_PER_K if hybrid else top_k
+
+    if RETRIEVER_BACKEND == "numpy" and not hybrid:
+        with stage("vector_search"):
+            return vector_index.search_many(query_embeddings, top_k=top_k)
+
+    params = {**await current_search_params(candidates), **filter_params(None)}
+    results: list[list[dict]] = [[] for _ in query_embeddings]
+
+    async def worker(indices: range):
+        async with async_engine.connect() as conn:
+            for i in indices:
+                # Queries already run in parallel, one per connection
+                vector_results = await _vector_search(
+                    conn, query_embeddings[i], candidates, params
+                )
+                if not hybrid:
+                    results[i] = vector_results
+                    continue
+
+                lexical_results = await _lexical_search(
+                    conn, queries[i], query_embeddings[i], candidates
+                )
+                results[i] = reciprocal_rank_fusion(
+                    [vector_results, lexical_results], top_k
+                )
+
+    connections = max(1, min(connections, len(query_embeddings)))
+    await asyncio.gather(
+        *(
+            worker(range(n, len(query_embeddings), connections))
+            for n in range(connections)
         )
+    )
 
-    return [dict(r) for r in rows]
+    return results
@@ -0,0 +1,207 @@
+from pathlib import Path
+from sqlalchemy import text
+from app.core.db import engine
+import numpy as np
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", "data/processed/vector_index"))
+EMBEDDING_DIM = 1536
+EXPORT_FETCH_SIZE = 2000
+
+CURRENT_FILE = "CURRENT"
+MATRIX_FILE = "embeddings.npy"
+METADATA_FILE = "chunks.parquet"
+MANIFEST_FILE = "manifest.json"
+
+
+def _parse_vector(value) -> np.ndarray:
+    if isinstance(value, str):
+        return np.array(value.strip("[]").split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def snapshot_version() -> str:
+    """Timestamp version down to the nanosecond, so versions sort by age."""
+    now = time.time_ns()
+    seconds = time.strftime("%Y%m%d%H%M%S", time.localtime(now // 10**9))
+    return f"v{seconds}{now % 10**9:09d}"
+
+
+def export_index(index_dir: Path = VECTOR_INDEX_DIR) -> str:
+    """
+    Snapshot rag.document_embeddings into a memory-mappable float32 matrix.
+    Rows are L2-normalised so a dot product equals cosine similarity.
+    A chunk metadata sidecar is written next to it, and the CURRENT pointer
+    is switched atomically once the snapshot is complete.
+    Returns the new snapshot version.
+    """
+    version = snapshot_version()
+    snapshot_dir = index_dir / version
+    index_dir.mkdir(parents=True, exist_ok=True)
+    # Never reuse a directory that running processes may have memory-mapped
+    snapshot_dir.mkdir()
+
+    with engine.connect().execution_options(
+        isolation_level="REPEATABLE READ", stream_results=True
+    ) as conn:
+        count = conn.execute(
+            text("SELECT COUNT(*) FROM rag.document_embeddings")
+        ).scalar_one()
+
+        matrix = np.lib.format.open_memmap(
+            snapshot_dir / MATRIX_FILE,
+            mode="w+",
+            dtype=np.float32,
+            shape=(count, EMBEDDING_DIM),
+        )
+        metadata = {"chunk_id": [], "file_name": [], "page_number": [], "content": []}
+
+        result = conn.execute(text("""
+                SELECT dcr.chunk_id, dcr.file_name, dcr.page_number, dcr.content,
+                       de.embedding::text
+                FROM rag.document_embeddings de
+                JOIN rag.document_chunks_raw dcr
+                  ON dcr.file_name = de.file_name AND dcr.chunk_id = de.chunk_id
+                ORDER BY de.chunk_id
+            """))
+
+        row_idx = 0
+        for rows in result.partitions(EXPORT_FETCH_SIZE):
+            for chunk_id, file_name, page_number, content, embedding in rows:
+                vector = _parse_vector(embedding)
+                norm = np.linalg.norm(vector)
+                matrix[row_idx] = vector / norm if norm > 0 else vector
+                metadata["chunk_id"].append(chunk_id)
+                metadata["file_name"].append(file_name)
+                metadata["page_number"].append(page_number)
+                metadata["content"].append(content)
+                row_idx += 1
+
+    matrix.flush()
+    del matrix
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pq.write_table(pa.table(metadata), snapshot_dir / METADATA_FILE)
+    (snapshot_dir / MANIFEST_FILE).write_text(
+        json.dumps({"version": version, "count": row_idx, "dim": EMBEDDING_DIM})
+    )
+
+    tmp_pointer = index_dir / f"{CURRENT_FILE}.tmp"
+    tmp_pointer.write_text(version)
+    tmp_pointer.replace(index_dir / CURRENT_FILE)
+
+    # Keep the new and the previous snapshot so live readers are not pulled away
+    snapshots = sorted(p for p in index_dir.iterdir() if p.is_dir())
+    for old in snapshots[:-2]:
+        shutil.rmtree(old, ignore_errors=True)
+
+    logger.info(f"Exported {row_idx} embeddings to snapshot {version}")
+    return version
+
+
+class VectorIndex:
+    """
+    In-process exact cosine search over an exported snapshot.
+    The matrix is memory-mapped, so the OS page cache is shared between
+    workers. The snapshot is reloaded when the CURRENT pointer changes.
+    """
+
+    def __init__(self, index_dir: Path = VECTOR_INDEX_DIR):
+        self.index_dir = Path(index_dir)
+        self.version: str | None = None
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _current_version(self) -> str | None:
+        try:
+            return (self.index_dir / CURRENT_FILE).read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load(self, version: str):
+        # Arrow is only imported by processes that use the numpy backend
+        import pyarrow.parquet as pq
+
+        snapshot_dir = self.index_dir / version
+        matrix = np.load(snapshot_dir / MATRIX_FILE, mmap_mode="r")
+        table = pq.read_table(snapshot_dir / METADATA_FILE)
+        metadata = {name: table.column(name).to_pylist() for name in table.column_names}
+        positions = {chunk_id: i for i, chunk_id in enumerate(metadata["chunk_id"])}
+        logger.info(f"Loaded vector index {version} with {matrix.shape[0]} rows")
+        return matrix, metadata, positions
+
+    def refresh(self):
+        version = self._current_version()
+        if version is None:
+            raise FileNotFoundError(
+                f"No vector index snapshot in {self.index_dir}; "
+                "run `python -m app.rag.vector_index` first"
+            )
+
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self._state = self._load(version)
+                    self.version = version
+
+        return self._state
+
+    def vectors(self, chunk_ids) -> dict:
+        """Normalised stored embeddings for the given chunk ids, where present."""
+        matrix, _, positions = self.refresh()
+        return {
+            chunk_id: np.asarray(matrix[positions[chunk_id]])
+            for chunk_id in chunk_ids
+            if chunk_id in positions
+        }
+
+    def search_many(self, query_embeddings, top_k: int = 5) -> list[list[dict]]:
+        matrix, metadata, _ = self.refresh()
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1.0)
+
+        scores = queries @ matrix.T
+        k = min(top_k, scores.shape[1])
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append(
+                [
+                    {
+                        "chunk_id": metadata["chunk_id"][i],
+                        "file_name": metadata["file_name"][i],
+                        "page_number": metadata["page_number"][i],
+                        "content": metadata["content"][i],
+                        "similarity": float(row[i]),
+                    }
+                    for i in top
+                ]
+            )
+
+        return results
+
+    def search(self, query_embedding, top_k: int = 5) -> list[dict]:
+        return self.search_many([query_embedding], top_k=top_k)[0]
+
+
+vector_index = VectorIndex()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Exported vector index snapshot {export_index()}")
@@ -0,0 +1,51 @@
+-- Upgrade for databases created before ANN index management.
+-- Fresh databases get the same objects from docker/init.sql.
+
+CREATE TABLE IF NOT EXISTS rag.index_builds (
+    build_id SERIAL PRIMARY KEY,
+    index_name VARCHAR(100) NOT NULL,
+    method VARCHAR(20) NOT NULL,
+    params JSONB NOT NULL,
+    row_count BIGINT NOT NULL,
+    build_seconds DOUBLE PRECISION NOT NULL,
+    built_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+DROP FUNCTION IF EXISTS rag.search_chunks(vector, integer);
+
+CREATE OR REPLACE FUNCTION rag.search_chunks(
+    query_embedding vector(1536),
+    match_count integer DEFAULT 5,
+    ef_search integer DEFAULT NULL,
+    probes integer DEFAULT NULL
+)
+RETURNS TABLE (
+    chunk_id integer,
+    file_name varchar(500),
+    page_number integer,
+    content text,
+    similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF ef_search IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+    END IF;
+    IF probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', probes::text, true);
+    END IF;
+
+    RETURN QUERY
+    SELECT
+        dcr.chunk_id,
+        dcr.file_name,
+        dcr.page_number,
+        dcr.content,
+        1 - (de.embedding <=> query_embedding) as similarity
+    FROM rag.document_chunks_raw dcr
+    JOIN rag.document_embeddings de ON dcr.chunk_id = de.chunk_id
+    ORDER BY de.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
@@ -0,0 +1,10 @@
+-- Upgrade for databases created before chunks could span pages.
+-- Fresh databases get the same objects from docker/init.sql.
+-- page_number is the first page of a chunk and page_end its last page;
+-- rows written before this upgrade keep page_end NULL (single page).
+
+ALTER TABLE rag.document_chunks_raw
+    ADD COLUMN IF NOT EXISTS page_end INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_raw_file_pages
+    ON rag.document_chunks_raw (file_name, page_number, page_end);
@@ -0,0 +1,43 @@
+-- Upgrade for databases created before hybrid lexical retrieval.
+-- Fresh databases get the same objects from docker/init.sql.
+
+ALTER TABLE rag.document_chunks_raw
+    ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_raw_content_tsv
+    ON rag.document_chunks_raw USING gin (content_tsv);
+
+-- Full-text search over chunk content. Query terms are OR-ed and ranked
+-- with ts_rank_cd; similarity is still the cosine score so results can be
+-- fused with rag.search_chunks.
+CREATE OR REPLACE FUNCTION rag.search_chunks_lexical(
+    query_text text,
+    query_embedding vector(1536),
+    match_count integer DEFAULT 5
+)
+RETURNS TABLE (
+    chunk_id integer,
+    file_name varchar(500),
+    page_number integer,
+    content text,
+    similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH q AS (
+        SELECT replace(plainto_tsquery('english', query_text)::text, '&', '|')::tsquery AS tsq
+    )
+    SELECT
+        dcr.chunk_id,
+        dcr.file_name,
+        dcr.page_number,
+        dcr.content,
+        1 - (de.embedding <=> query_embedding) as similarity
+    FROM rag.document_chunks_raw dcr
+    CROSS JOIN q
+    JOIN rag.document_embeddings de ON dcr.chunk_id = de.chunk_id
+    WHERE dcr.content_tsv @@ q.tsq
+    ORDER BY ts_rank_cd(dcr.content_tsv, q.tsq) DESC
+    LIMIT match_count;
+$$;
@@ -0,0 +1,5 @@
+-- Upgrade for the API startup warm-up, which loads the vector index and
+-- survey tables into shared buffers with pg_prewarm. Fresh databases get the
+-- extension from docker/init.sql.
+
+CREATE EXTENSION IF NOT EXISTS pg_prewarm;
@@ -0,0 +1,92 @@
+-- Upgrade for compact (halfvec / binary / reduced-dimension) ANN indexes.
+-- Fresh databases get the same objects from docker/init.sql.
+
+ALTER TABLE rag.index_builds
+    ADD COLUMN IF NOT EXISTS storage VARCHAR(20) NOT NULL DEFAULT 'vector',
+    ADD COLUMN IF NOT EXISTS dimensions INTEGER;
+
+DROP FUNCTION IF EXISTS rag.search_chunks(vector, integer, integer, integer);
+
+CREATE OR REPLACE FUNCTION rag.search_chunks(
+    query_embedding vector(1536),
+    match_count integer DEFAULT 5,
+    ef_search integer DEFAULT NULL,
+    probes integer DEFAULT NULL,
+    storage text DEFAULT 'vector',
+    dimensions integer DEFAULT NULL,
+    rescore_factor integer DEFAULT 4
+)
+RETURNS TABLE (
+    chunk_id integer,
+    file_name varchar(500),
+    page_number integer,
+    content text,
+    similarity float
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    compact_distance text;
+BEGIN
+    -- Transaction-local ANN search settings, chosen by the caller
+    IF ef_search IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+    END IF;
+    IF probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', probes::text, true);
+    END IF;
+
+    IF storage IS NULL OR storage = 'vector' THEN
+        RETURN QUERY
+        SELECT
+            dcr.chunk_id,
+            dcr.file_name,
+            dcr.page_number,
+            dcr.content,
+            1 - (de.embedding <=> query_embedding) as similarity
+        FROM rag.document_chunks_raw dcr
+        JOIN rag.document_embeddings de ON dcr.chunk_id = de.chunk_id
+        ORDER BY de.embedding <=> query_embedding
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    -- Distance over a compact index expression. These must match the
+    -- expressions built by python -m app.rag.index_manager build --storage
+    compact_distance := CASE storage
+        WHEN 'halfvec' THEN
+            'de.embedding::halfvec(1536) <=> $1::halfvec(1536)'
+        WHEN 'binary' THEN
+            'binary_quantize(de.embedding)::bit(1536) <~> binary_quantize($1)'
+        WHEN 'reduced' THEN
+            format(
+                'subvector(de.embedding, 1, %1$s)::vector(%1$s) <=> subvector($1, 1, %1$s)::vector(%1$s)',
+                dimensions
+            )
+    END;
+    IF compact_distance IS NULL THEN
+        RAISE EXCEPTION 'Unknown embedding storage: %', storage;
+    END IF;
+
+    -- Over-fetch from the compact index, then rescore at full precision
+    RETURN QUERY EXECUTE format($query$
+        WITH shortlist AS (
+            SELECT de.chunk_id, de.embedding
+            FROM rag.document_embeddings de
+            ORDER BY %s
+            LIMIT $2
+        )
+        SELECT
+            dcr.chunk_id,
+            dcr.file_name,
+            dcr.page_number,
+            dcr.content,
+            1 - (s.embedding <=> $1) AS similarity
+        FROM shortlist s
+        JOIN rag.document_chunks_raw dcr ON dcr.chunk_id = s.chunk_id
+        ORDER BY s.embedding <=> $1
+        LIMIT $3
+    $query$, compact_distance)
+    USING query_embedding, match_count * rescore_factor, match_count;
+END;
+$$;
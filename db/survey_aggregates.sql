@@ -0,0 +1,17 @@
+-- Upgrade for databases created before the survey aggregate views.
+-- Fresh databases get the same objects from docker/init.sql.
+-- Refresh after loading survey data: python -m app.analytics.aggregates
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS finance.survey_label_stats AS
+SELECT
+    item_code,
+    item_label,
+    COUNT(*) AS response_count,
+    AVG(value) AS avg_value,
+    COUNT(DISTINCT period) AS period_count
+FROM finance.survey_metrics
+GROUP BY item_code, item_label;
+
+-- Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_survey_label_stats_key
+    ON finance.survey_label_stats(item_code, item_label);
@@ -0,0 +1,27 @@
+-- Upgrade for databases created before the structured survey loader.
+-- Fresh databases get the same objects from docker/init.sql.
+-- Survey values are shares (e.g. 0.129412), so they are stored unrounded,
+-- and (exercise, period, item_code, value) becomes the upsert key. Question
+-- rows that carry only a label keep a NULL value, and NULLS NOT DISTINCT
+-- lets them take part in the upsert. Safe to re-run.
+
+DROP MATERIALIZED VIEW IF EXISTS finance.survey_label_stats;
+
+ALTER TABLE finance.survey_metrics
+    ALTER COLUMN value TYPE DOUBLE PRECISION,
+    ALTER COLUMN value DROP NOT NULL;
+
+-- Rows that only differed below two decimals collapse onto one key
+DELETE FROM finance.survey_metrics a
+USING finance.survey_metrics b
+WHERE a.ctid < b.ctid
+  AND (a.exercise, a.period, a.item_code) = (b.exercise, b.period, b.item_code)
+  AND a.value IS NOT DISTINCT FROM b.value;
+
+DROP INDEX IF EXISTS finance.idx_survey_metrics_key;
+CREATE UNIQUE INDEX idx_survey_metrics_key
+    ON finance.survey_metrics(exercise, period, item_code, value)
+    NULLS NOT DISTINCT;
+
+-- Then re-create the aggregate view with db/survey_aggregates.sql and
+-- reload: python -m app.ingestion.ingest_structured --force
@@ -1,4 +1,5 @@
 CREATE EXTENSION IF NOT EXISTS vector;
+CREATE EXTENSION IF NOT EXISTS pg_prewarm;
 
 CREATE SCHEMA IF NOT EXISTS meta;
 CREATE SCHEMA IF NOT EXISTS finance;
@@ -101,6 +102,11 @@ CREATE TABLE rag.documents (
     is_active BOOLEAN DEFAULT TRUE
 );
 
+-- Metadata filters of rag.search_chunks resolve documents by these
+CREATE INDEX idx_documents_file_name ON rag.documents(file_name);
+CREATE INDEX idx_documents_publication_date ON rag.documents(publication_date)
+    WHERE publication_date IS NOT NULL;
+
 CREATE TABLE rag.chunks (
     chunk_id SERIAL PRIMARY KEY,
     document_id INTEGER NOT NULL REFERENCES rag.documents(document_id) ON DELETE CASCADE,
@@ -123,38 +129,141 @@ CREATE TABLE finance.survey_metrics (
     period VARCHAR(50) NOT NULL,
     item_code VARCHAR(50) NOT NULL,
     item_label TEXT NOT NULL,
-    value NUMERIC(20, 2),
+    -- NULL on question rows that carry only a label
+    value DOUBLE PRECISION,
     answer_rank INTEGER,
     source VARCHAR(255),
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Upsert key of python -m app.ingestion.ingest_structured
+    UNIQUE NULLS NOT DISTINCT (exercise, period, item_code, value)
 );
 
 CREATE INDEX idx_survey_metrics_period ON finance.survey_metrics(period);
 CREATE INDEX idx_survey_metrics_item_code ON finance.survey_metrics(item_code);
 
+-- Per-label aggregates read by the analytics handlers.
+-- Refresh after loading survey data: python -m app.analytics.aggregates
+CREATE MATERIALIZED VIEW finance.survey_label_stats AS
+SELECT
+    item_code,
+    item_label,
+    COUNT(*) AS response_count,
+    AVG(value) AS avg_value,
+    COUNT(DISTINCT period) AS period_count
+FROM finance.survey_metrics
+GROUP BY item_code, item_label;
+
+CREATE UNIQUE INDEX idx_survey_label_stats_key
+    ON finance.survey_label_stats(item_code, item_label);
+
+-- Chunks and embeddings are partitioned by document. Each document gets
+-- its own partition pair (and ANN index partition) on ingestion; rows of
+-- documents without one land in the default partitions.
+-- Manage with: python -m app.rag.partitions
 CREATE TABLE rag.document_chunks_raw (
-    chunk_id SERIAL PRIMARY KEY,
+    chunk_id SERIAL,
     file_name VARCHAR(500) NOT NULL,
     page_number INTEGER,
+    page_end INTEGER,
     chunk_index INTEGER NOT NULL,
     content TEXT NOT NULL,
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (file_name, chunk_id)
+) PARTITION BY LIST (file_name);
+
+CREATE TABLE rag.document_chunks_raw_default
+    PARTITION OF rag.document_chunks_raw DEFAULT;
+
+CREATE INDEX idx_document_chunks_raw_file_pages ON rag.document_chunks_raw
+    (file_name, page_number, page_end);
+
+-- Lookups by chunk_id alone (embedding backfill) probe each partition
+CREATE INDEX idx_document_chunks_raw_chunk_id ON rag.document_chunks_raw (chunk_id);
+
+CREATE INDEX idx_document_chunks_raw_content_tsv ON rag.document_chunks_raw
+    USING gin (content_tsv);
 
 CREATE TABLE rag.document_embeddings (
-    embedding_id SERIAL PRIMARY KEY,
-    chunk_id INTEGER NOT NULL REFERENCES rag.document_chunks_raw(chunk_id) ON DELETE CASCADE,
+    embedding_id SERIAL,
+    chunk_id INTEGER NOT NULL,
+    file_name VARCHAR(500) NOT NULL,
     embedding vector(1536) NOT NULL,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(chunk_id)
+    UNIQUE (file_name, chunk_id),
+    FOREIGN KEY (file_name, chunk_id)
+        REFERENCES rag.document_chunks_raw (file_name, chunk_id) ON DELETE CASCADE
+) PARTITION BY LIST (file_name);
+
+CREATE TABLE rag.document_embeddings_default
+    PARTITION OF rag.document_embeddings DEFAULT;
+
+-- HNSW needs no training data, so it can be created on the empty table.
+-- Each partition gets its own index. Rebuild or retune with:
+-- python -m app.rag.index_manager build
+CREATE INDEX idx_document_embeddings_vector ON rag.document_embeddings
+    USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Documents with their own partition pair, see app/rag/partitions.py
+CREATE TABLE rag.document_partitions (
+    file_name VARCHAR(500) PRIMARY KEY,
+    partition_suffix VARCHAR(20) NOT NULL,
+    attached_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX idx_document_embeddings_vector ON rag.document_embeddings 
-    USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+CREATE TABLE rag.index_builds (
+    build_id SERIAL PRIMARY KEY,
+    index_name VARCHAR(100) NOT NULL,
+    method VARCHAR(20) NOT NULL,
+    params JSONB NOT NULL,
+    row_count BIGINT NOT NULL,
+    build_seconds DOUBLE PRECISION NOT NULL,
+    built_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Representation the index is built over: vector, halfvec, binary or reduced
+    storage VARCHAR(20) NOT NULL DEFAULT 'vector',
+    dimensions INTEGER
+);
+
+-- File names in scope for a metadata-filtered search. Document id and
+-- publication date filters are resolved against rag.documents.
+-- Returns NULL when no filter is given (search everything).
+CREATE OR REPLACE FUNCTION rag.scoped_file_names(
+    file_names text[] DEFAULT NULL,
+    document_ids integer[] DEFAULT NULL,
+    published_from date DEFAULT NULL,
+    published_to date DEFAULT NULL
+)
+RETURNS text[]
+LANGUAGE sql STABLE
+AS $$
+    SELECT CASE
+        WHEN document_ids IS NULL AND published_from IS NULL AND published_to IS NULL
+            THEN file_names
+        ELSE ARRAY(
+            SELECT d.file_name::text
+            FROM rag.documents d
+            WHERE (file_names IS NULL OR d.file_name = ANY(file_names))
+              AND (document_ids IS NULL OR d.document_id = ANY(document_ids))
+              AND (published_from IS NULL OR d.publication_date >= published_from)
+              AND (published_to IS NULL OR d.publication_date <= published_to)
+        )
+    END;
+$$;
 
 CREATE OR REPLACE FUNCTION rag.search_chunks(
     query_embedding vector(1536),
-    match_count integer DEFAULT 5
+    match_count integer DEFAULT 5,
+    ef_search integer DEFAULT NULL,
+    probes integer DEFAULT NULL,
+    storage text DEFAULT 'vector',
+    dimensions integer DEFAULT NULL,
+    rescore_factor integer DEFAULT 4,
+    file_names text[] DEFAULT NULL,
+    document_ids integer[] DEFAULT NULL,
+    page_from integer DEFAULT NULL,
+    page_to integer DEFAULT NULL,
+    published_from date DEFAULT NULL,
+    published_to date DEFAULT NULL
 )
 RETURNS TABLE (
     chunk_id integer,
@@ -165,17 +274,157 @@ RETURNS TABLE (
 )
 LANGUAGE plpgsql
 AS $$
+DECLARE
+    scoped_files text[];
+    filtered boolean;
+    filter_clause text := 'TRUE';
+    shortlist_distance text;
 BEGIN
-    RETURN QUERY
-    SELECT 
+    -- Transaction-local ANN search settings, chosen by the caller
+    IF ef_search IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+    END IF;
+    IF probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', probes::text, true);
+    END IF;
+
+    scoped_files := rag.scoped_file_names(
+        file_names, document_ids, published_from, published_to
+    );
+    filtered := scoped_files IS NOT NULL OR page_from IS NOT NULL OR page_to IS NOT NULL;
+
+    IF scoped_files IS NOT NULL AND cardinality(scoped_files) = 0 THEN
+        RETURN;
+    END IF;
+
+    IF NOT filtered AND (storage IS NULL OR storage = 'vector') THEN
+        RETURN QUERY
+        SELECT 
+            dcr.chunk_id,
+            dcr.file_name,
+            dcr.page_number,
+            dcr.content,
+            1 - (de.embedding <=> query_embedding) as similarity
+        FROM rag.document_chunks_raw dcr
+        JOIN rag.document_embeddings de
+          ON de.file_name = dcr.file_name AND de.chunk_id = dcr.chunk_id
+        ORDER BY de.embedding <=> query_embedding
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    -- Distance the shortlist is read by. Compact expressions must match
+    -- the ones built by python -m app.rag.index_manager build --storage
+    shortlist_distance := CASE coalesce(storage, 'vector')
+        WHEN 'vector' THEN
+            'de.embedding <=> $1'
+        WHEN 'halfvec' THEN
+            'de.embedding::halfvec(1536) <=> $1::halfvec(1536)'
+        WHEN 'binary' THEN
+            'binary_quantize(de.embedding)::bit(1536) <~> binary_quantize($1)'
+        WHEN 'reduced' THEN
+            format(
+                'subvector(de.embedding, 1, %1$s)::vector(%1$s) <=> subvector($1, 1, %1$s)::vector(%1$s)',
+                dimensions
+            )
+    END;
+    IF shortlist_distance IS NULL THEN
+        RAISE EXCEPTION 'Unknown embedding storage: %', storage;
+    END IF;
+
+    IF filtered THEN
+        -- Keep scanning the ANN index until enough rows pass the filters
+        -- (pgvector >= 0.8); the final ORDER BY restores exact order.
+        -- Selective filters are planned on the B-tree index instead and
+        -- searched exactly.
+        PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+        PERFORM set_config('ivfflat.iterative_scan', 'relaxed_order', true);
+
+        IF scoped_files IS NOT NULL THEN
+            -- Both sides so that partitions of either table are pruned
+            filter_clause := filter_clause
+                || ' AND dcr.file_name = ANY($4) AND de.file_name = ANY($4)';
+        END IF;
+        IF page_to IS NOT NULL THEN
+            filter_clause := filter_clause || ' AND dcr.page_number <= $6';
+        END IF;
+        IF page_from IS NOT NULL THEN
+            filter_clause := filter_clause
+                || ' AND coalesce(dcr.page_end, dcr.page_number) >= $5';
+        END IF;
+    END IF;
+
+    -- Read a shortlist by index distance, then rank at full precision
+    RETURN QUERY EXECUTE format($query$
+        WITH shortlist AS MATERIALIZED (
+            SELECT dcr.chunk_id, dcr.file_name, dcr.page_number, dcr.content,
+                   de.embedding
+            FROM rag.document_embeddings de
+            JOIN rag.document_chunks_raw dcr
+              ON dcr.file_name = de.file_name AND dcr.chunk_id = de.chunk_id
+            WHERE %s
+            ORDER BY %s
+            LIMIT $2
+        )
+        SELECT
+            s.chunk_id,
+            s.file_name,
+            s.page_number,
+            s.content,
+            1 - (s.embedding <=> $1) AS similarity
+        FROM shortlist s
+        ORDER BY s.embedding <=> $1
+        LIMIT $3
+    $query$, filter_clause, shortlist_distance)
+    USING query_embedding, match_count * greatest(rescore_factor, 1), match_count,
+          scoped_files, page_from, page_to;
+END;
+$$;
+
+-- Full-text search over chunk content. Query terms are OR-ed and ranked
+-- with ts_rank_cd; similarity is still the cosine score so results can be
+-- fused with rag.search_chunks. Takes the same metadata filters.
+CREATE OR REPLACE FUNCTION rag.search_chunks_lexical(
+    query_text text,
+    query_embedding vector(1536),
+    match_count integer DEFAULT 5,
+    file_names text[] DEFAULT NULL,
+    document_ids integer[] DEFAULT NULL,
+    page_from integer DEFAULT NULL,
+    page_to integer DEFAULT NULL,
+    published_from date DEFAULT NULL,
+    published_to date DEFAULT NULL
+)
+RETURNS TABLE (
+    chunk_id integer,
+    file_name varchar(500),
+    page_number integer,
+    content text,
+    similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH q AS (
+        SELECT
+            replace(plainto_tsquery('english', query_text)::text, '&', '|')::tsquery AS tsq,
+            rag.scoped_file_names(
+                file_names, document_ids, published_from, published_to
+            ) AS scoped_files
+    )
+    SELECT
         dcr.chunk_id,
         dcr.file_name,
         dcr.page_number,
         dcr.content,
         1 - (de.embedding <=> query_embedding) as similarity
     FROM rag.document_chunks_raw dcr
-    JOIN rag.document_embeddings de ON dcr.chunk_id = de.chunk_id
-    ORDER BY de.embedding <=> query_embedding
+    CROSS JOIN q
+    JOIN rag.document_embeddings de
+      ON de.file_name = dcr.file_name AND de.chunk_id = dcr.chunk_id
+    WHERE dcr.content_tsv @@ q.tsq
+      AND (q.scoped_files IS NULL OR dcr.file_name = ANY(q.scoped_files))
+      AND (page_to IS NULL OR dcr.page_number <= page_to)
+      AND (page_from IS NULL OR coalesce(dcr.page_end, dcr.page_number) >= page_from)
+    ORDER BY ts_rank_cd(dcr.content_tsv, q.tsq) DESC
     LIMIT match_count;
-END;
 $$;
@@ -1,12 +1,23 @@
+import os
 import pytest
 
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("STARTUP_WARMUP", "false")
+
 
 @pytest.fixture(autouse=True)
 def mock_openai_embedding(monkeypatch):
     def fake_embedding(text, model=None):
         return [0.0] * 1536
 
+    async def fake_async_embedding(text, model=None):
+        return fake_embedding(text, model)
+
     monkeypatch.setattr(
         "app.core.openai_client.get_embedding",
         fake_embedding,
     )
+    monkeypatch.setattr(
+        "app.core.openai_client.aget_embedding",
+        fake_async_embedding,
+    )
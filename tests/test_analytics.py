@@ -1,3 +1,6 @@
+import asyncio
+
+
 def test_profitability_expectations_returns_list():
     from app.analytics.handlers import profitability_expectations
 
@@ -15,5 +18,87 @@ def test_profitability_expectations_returns_list():
 
             return Conn()
 
-    result = profitability_expectations(DummyEngine())
+    result = asyncio.run(profitability_expectations(DummyEngine()))
     assert isinstance(result, list)
+
+
+def test_registry_covers_survey_topics():
+    from app.analytics.handlers import HANDLERS
+    from app.analytics.router import detect_topic
+
+    assert set(HANDLERS) == {
+        "profitability",
+        "capital",
+        "liquidity",
+        "asset_quality",
+        "funding",
+    }
+    assert (
+        detect_topic("What are banks' profitability expectations?") == "profitability"
+    )
+    assert detect_topic("How do banks see asset quality developing?") == "asset_quality"
+    assert detect_topic("Which funding instruments will banks use?") == "funding"
+    assert detect_topic("What is the weather?") is None
+
+
+def test_label_dictionary_matches_topics():
+    from app.analytics.labels import match_topics
+
+    labels = {
+        "a1": "Q1 Do you expect an overall increase in your banks ROE?",
+        "b2": "Q9 Which funding instruments do you intend to focus on?",
+        "c3": "a) Yes",
+    }
+
+    topics = match_topics(labels)
+
+    assert topics["profitability"] == ["a1"]
+    assert topics["funding"] == ["b2"]
+    assert topics["liquidity"] == []
+
+
+def test_router_dispatches_to_registered_handler(monkeypatch):
+    from app.analytics import router
+
+    async def fake_handler(engine):
+        return [{"answer": "b) Retail deposits", "responses": 12, "avg_value": None}]
+
+    monkeypatch.setitem(
+        router.HANDLERS,
+        "funding",
+        {"handler": fake_handler, "description": "banks' funding plans"},
+    )
+
+    result = asyncio.run(router.handle_analytics_query("funding plans of banks"))
+
+    assert result["data"][0]["responses"] == 12
+    assert "banks' funding plans" in result["summary"]
+
+
+def test_arrow_backend_aggregates_and_hot_reloads(tmp_path):
+    import os
+    import pandas as pd
+    from app.analytics.arrow_backend import SurveyTable
+
+    path = tmp_path / "survey.parquet"
+    rows = [
+        ("TR2025", "p1", "Q1 Profitability outlook", 1.0),
+        ("TR2024", "p1", "Q1 Profitability outlook", 3.0),
+        ("TR2025", "f1", "Q9 Funding instruments", 2.0),
+    ]
+    pd.DataFrame(
+        rows, columns=["period", "item_code", "item_label", "value"]
+    ).to_parquet(path)
+
+    table = SurveyTable(path)
+    assert table.topic_stats("profitability") == [
+        {"answer": "Q1 Profitability outlook", "responses": 2, "avg_value": 2.0}
+    ]
+
+    pd.DataFrame(
+        rows[2:], columns=["period", "item_code", "item_label", "value"]
+    ).to_parquet(path)
+    os.utime(path, ns=(0, 1))
+
+    assert table.topic_stats("profitability") == []
+    assert table.topic_stats("funding")[0]["responses"] == 1
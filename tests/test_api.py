@@ -0,0 +1,165 @@
+def test_query_stream_sends_sources_before_tokens(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.api.main import app
+
+    async def fake_classify(query):
+        return "document", [0.1] * 1536
+
+    async def fake_stream(query, query_embedding=None, filters=None):
+        assert query_embedding == [0.1] * 1536
+        yield {"event": "sources", "sources": [{"file": "doc.pdf", "page": 3}]}
+        yield {"event": "token", "text": "Credit "}
+        yield {"event": "token", "text": "risk."}
+
+    monkeypatch.setattr("app.api.main.aclassify_query", fake_classify)
+    monkeypatch.setattr("app.api.main.stream_rag_answer", fake_stream)
+
+    with TestClient(app) as client:
+        response = client.post("/query/stream", json={"query": "credit risk?"})
+        metrics = client.get("/metrics")
+
+    assert response.status_code == 200
+    # Recorded when the stream ends, after the query type is known
+    assert (
+        'assistant_request_duration_seconds_count{path="/query/stream",'
+        'query_type="document"}'
+    ) in metrics.text
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [
+        line.split(": ", 1)[1]
+        for line in response.text.splitlines()
+        if line.startswith("event: ")
+    ]
+    assert events == ["meta", "token", "token", "done"]
+    assert '"file": "doc.pdf"' in response.text
+
+
+def test_query_reports_server_timing_and_prometheus_metrics(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.api.main import app
+    from app.core.metrics import stage
+
+    async def fake_classify(query):
+        with stage("embedding"):
+            pass
+        return "document", [0.1] * 1536
+
+    async def fake_rag(query, query_embedding=None, filters=None):
+        with stage("vector_search"):
+            pass
+        return {"answer": "Credit risk.", "sources": []}
+
+    monkeypatch.setattr("app.api.main.aclassify_query", fake_classify)
+    monkeypatch.setattr("app.api.main.generate_rag_answer", fake_rag)
+
+    with TestClient(app) as client:
+        response = client.post("/query", json={"query": "credit risk?"})
+        metrics = client.get("/metrics")
+
+    timing = response.headers["Server-Timing"]
+    for name in ("embedding", "classify", "vector_search", "total"):
+        assert f"{name};dur=" in timing
+
+    assert metrics.status_code == 200
+    assert 'assistant_stage_duration_seconds_count{stage="classify"}' in metrics.text
+    assert (
+        'assistant_request_duration_seconds_count{path="/query",query_type="document"}'
+        in metrics.text
+    )
+    assert 'assistant_cache_lookups_total{cache="embedding",result="misses"}' in (
+        metrics.text
+    )
+    assert 'assistant_db_pool_connections{engine="async",state="checked_out"}' in (
+        metrics.text
+    )
+
+
+def test_query_passes_search_filters_to_retrieval(monkeypatch):
+    from datetime import date
+    from fastapi.testclient import TestClient
+    from app.api.main import app
+
+    seen = {}
+
+    async def fake_classify(query):
+        return "document", [0.1] * 1536
+
+    async def fake_rag(query, query_embedding=None, filters=None):
+        seen["filters"] = filters
+        return {"answer": "Credit risk.", "sources": []}
+
+    monkeypatch.setattr("app.api.main.aclassify_query", fake_classify)
+    monkeypatch.setattr("app.api.main.generate_rag_answer", fake_rag)
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/query",
+            json={
+                "query": "credit risk?",
+                "filters": {"published_from": "2025-12-01", "page_to": 20},
+            },
+        )
+
+    assert response.status_code == 200
+    assert seen["filters"]["published_from"] == date(2025, 12, 1)
+    assert seen["filters"]["page_to"] == 20
+    assert seen["filters"]["file_names"] is None
+
+
+def test_ready_reports_warm_up_progress(monkeypatch):
+    import asyncio
+    from fastapi.testclient import TestClient
+    from app.api import warmup
+    from app.api.main import app
+
+    async def fake_check_database():
+        return 1
+
+    ready_during_steps = []
+
+    async def failing_step():
+        # Ready once the database answered, before the other steps finish
+        ready_during_steps.append(client.get("/ready").status_code)
+        raise RuntimeError("function rag.search_chunks_lexical does not exist")
+
+    monkeypatch.setattr(
+        warmup, "readiness", {"ready": False, "finished": False, "steps": {}}
+    )
+    monkeypatch.setattr("app.api.main.readiness", warmup.readiness)
+    monkeypatch.setattr(warmup, "_check_database", fake_check_database)
+    monkeypatch.setattr(warmup, "warmup_steps", lambda: [("statements", failing_step)])
+
+    client = TestClient(app)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+    asyncio.run(warmup.warm_up())
+    assert ready_during_steps == [200]
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    steps = response.json()["steps"]
+    assert steps["database"]["ok"]
+    assert not steps["statements"]["ok"]
+
+
+def test_importing_the_app_creates_no_clients_or_engines():
+    import os
+    import subprocess
+    import sys
+
+    # A fresh interpreter without credentials, so nothing else has used them
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    check = (
+        "import app.api.main\n"
+        "from app.core import openai_client\n"
+        "from app.core.db import async_engine, engine\n"
+        "assert openai_client.get_client.cache_info().currsize == 0\n"
+        "assert openai_client.get_async_client.cache_info().currsize == 0\n"
+        "assert not engine.created and not async_engine.created\n"
+        "import sys\n"
+        "assert 'openai' not in sys.modules and 'pyarrow' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", check], env=env, check=True)
@@ -0,0 +1,51 @@
+import asyncio
+
+
+def test_batch_dedups_embeds_once_and_keeps_order(monkeypatch):
+    from app.batch.batch_runner import run_query_batch
+
+    embed_calls = []
+    answered = []
+
+    async def fake_embeddings(queries):
+        embed_calls.append(list(queries))
+        return [[1.0] for _ in queries]
+
+    async def fake_retrieve(embeddings, top_k=5, connections=4, queries=None):
+        return [
+            [{"chunk_id": i, "file_name": "doc.pdf", "page_number": 1, "content": "x"}]
+            for i in range(len(embeddings))
+        ]
+
+    async def fake_answer(query, embedding, chunks):
+        answered.append(query)
+        return {"answer": f"rag:{query}", "chunks": chunks, "sources": []}
+
+    async def fake_analytics(query):
+        return {"summary": f"stats:{query}"}
+
+    monkeypatch.setattr(
+        "app.batch.batch_runner.aget_cached_embeddings", fake_embeddings
+    )
+    monkeypatch.setattr("app.batch.batch_runner.retrieve_chunks_batch", fake_retrieve)
+    monkeypatch.setattr("app.batch.batch_runner.answer_from_chunks", fake_answer)
+    monkeypatch.setattr("app.batch.batch_runner.handle_analytics_query", fake_analytics)
+
+    queries = [
+        "what does the EBA report say",
+        "profitability of banks",
+        " what does the EBA report say ",
+        "",
+    ]
+
+    async def collect():
+        return [item async for item in run_query_batch(queries)]
+
+    results = asyncio.run(collect())
+
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert embed_calls == [["what does the EBA report say"]]
+    assert answered == ["what does the EBA report say"]
+    assert results[0]["answer"] == results[2]["answer"]
+    assert results[1]["answer"] == "stats:profitability of banks"
+    assert "error" in results[3]
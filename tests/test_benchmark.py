@@ -0,0 +1,57 @@
+import asyncio
+
+
+def test_hashing_embedder_matches_vectorised_corpus_embedding():
+    import numpy as np
+    from app.evaluation.benchmark import (
+        HashingEmbedder,
+        SyntheticCorpus,
+        embed_word_ids,
+    )
+
+    embedder = HashingEmbedder(dim=64)
+    corpus = SyntheticCorpus(50, topics=5, vocabulary=300, words_per_chunk=20)
+    _, word_ids = next(corpus.batches())
+
+    vectorised = embed_word_ids(embedder, corpus)(word_ids[:3])
+    from_text = embedder.embed([corpus.text(ids) for ids in word_ids[:3]])
+
+    assert np.allclose(vectorised, from_text, atol=1e-6)
+    assert corpus.queries(5) == SyntheticCorpus(
+        50, topics=5, vocabulary=300, words_per_chunk=20
+    ).queries(5)
+
+
+def test_numpy_benchmark_reports_quality_and_latency():
+    from app.evaluation.benchmark import run_benchmark
+
+    report = asyncio.run(run_benchmark(size=3000, queries=50, top_k=10, dim=256))
+
+    (result,) = report["results"]
+    assert result["backend"] == "numpy"
+    assert result["recall_at_k"] > 0.7
+    assert 0 < result["mrr"] <= result["recall_at_k"]
+    assert set(result["latency_ms"]) == {"p50", "p95", "p99", "mean"}
+    assert result["throughput_qps"] > 0
+    assert "_ranked" not in result
+
+
+def test_compare_reports_flags_recall_and_latency_regressions():
+    from app.evaluation.benchmark import compare_reports
+
+    def report(recall, p95):
+        return {
+            "results": [
+                {
+                    "backend": "pgvector",
+                    "settings": {"recall_target": 0.95},
+                    "recall_at_k": recall,
+                    "mrr": 0.5,
+                    "latency_ms": {"p95": p95},
+                }
+            ]
+        }
+
+    assert compare_reports(report(0.9, 10.0), report(0.91, 9.0)) == []
+    regressions = compare_reports(report(0.8, 20.0), report(0.9, 10.0))
+    assert len(regressions) == 2
@@ -11,3 +11,80 @@ def test_classify_document_query():
 
 def test_classify_hybrid_query():
     assert classify_query("profitability and regulatory risks") == "hybrid"
+
+
+def test_keywords_match_whole_words_only():
+    from app.classification.query_classifier import keyword_intent
+
+    assert keyword_intent("which banks are well capitalised?") is None
+    assert keyword_intent("capital ratios of EU banks") == "analytics"
+
+
+def test_embedding_classifier_uses_centroids_and_returns_embedding(monkeypatch):
+    import asyncio
+    from app.classification import query_classifier
+
+    axes = {"analytics": 0, "document": 1, "hybrid": 2}
+
+    def one_hot(index):
+        vector = [0.0] * 3
+        vector[index] = 1.0
+        return vector
+
+    async def fake_embeddings(queries):
+        return [
+            one_hot(axes[intent])
+            for intent, examples in query_classifier.INTENT_EXAMPLES.items()
+            for _ in examples
+        ]
+
+    embedded = []
+
+    async def fake_embedding(query):
+        embedded.append(query)
+        return [0.9, 0.1, 0.2]
+
+    monkeypatch.setattr(query_classifier, "_centroids", None)
+    monkeypatch.setattr(query_classifier, "aget_cached_embeddings", fake_embeddings)
+    monkeypatch.setattr(query_classifier, "aget_cached_embedding", fake_embedding)
+    monkeypatch.setattr(query_classifier, "CLASSIFIER_MODE", "embedding")
+
+    query_type, embedding = asyncio.run(
+        query_classifier.aclassify_query("how many banks expect higher ROE?")
+    )
+    assert (query_type, embedding) == ("analytics", [0.9, 0.1, 0.2])
+
+    # Keyword fast path does not embed the query
+    assert asyncio.run(query_classifier.aclassify_query("profitability of banks")) == (
+        "analytics",
+        None,
+    )
+    assert embedded == ["how many banks expect higher ROE?"]
+
+
+def test_centroid_analytics_without_survey_topic_uses_rag(monkeypatch):
+    import asyncio
+    from app.classification import query_classifier
+
+    async def fake_embedding(query):
+        return [1.0, 0.0]
+
+    async def fake_centroids():
+        return ["analytics", "document"], query_classifier.np.eye(2, dtype="float32")
+
+    monkeypatch.setattr(query_classifier, "aget_cached_embedding", fake_embedding)
+    monkeypatch.setattr(query_classifier, "intent_centroids", fake_centroids)
+    monkeypatch.setattr(query_classifier, "CLASSIFIER_MODE", "embedding")
+
+    # Nearest to the analytics centroid, but no survey handler covers it
+    query_type, _ = asyncio.run(
+        query_classifier.aclassify_query(
+            "Percentage of respondents expecting loan demand to rise"
+        )
+    )
+    assert query_type == "document"
+
+    query_type, _ = asyncio.run(
+        query_classifier.aclassify_query("Do banks plan more dividends?")
+    )
+    assert query_type == "analytics"
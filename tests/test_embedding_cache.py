@@ -0,0 +1,59 @@
+def test_embedding_cache_memory_and_disk_tiers(tmp_path):
+    from app.core.embedding_cache import EmbeddingCache
+
+    path = tmp_path / "cache.sqlite"
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=60, path=path)
+
+    assert cache.get("m", "What is CET1?") is None
+    cache.put("m", "What is CET1?", [0.5, 0.25])
+
+    assert cache.get("m", "  what is   cet1? ").tolist() == [0.5, 0.25]
+
+    restarted = EmbeddingCache(max_entries=2, ttl_seconds=60, path=path)
+    assert restarted.get("m", "What is CET1?").tolist() == [0.5, 0.25]
+
+    assert cache.stats()["hits_memory"] == 1
+    assert cache.stats()["misses"] == 1
+    assert restarted.stats()["hits_disk"] == 1
+
+
+def test_embedding_cache_evicts_and_expires():
+    from app.core.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_entries=1, ttl_seconds=60)
+    cache.put("m", "a", [1.0])
+    cache.put("m", "b", [2.0])
+    assert cache.get("m", "a") is None
+
+    expired = EmbeddingCache(max_entries=10, ttl_seconds=-1)
+    expired.put("m", "a", [1.0])
+    assert expired.get("m", "a") is None
+
+
+def test_async_cache_embeds_original_text_and_batches_writes(tmp_path, monkeypatch):
+    import asyncio
+    from app.core import embedding_cache as module
+    from app.core.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=60, path=tmp_path / "c.sqlite")
+    monkeypatch.setattr(module, "embedding_cache", cache)
+
+    sent = []
+
+    async def fake_embeddings(texts, model=None):
+        sent.extend(texts)
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr(module.openai_client, "aget_embeddings", fake_embeddings)
+
+    vectors = asyncio.run(module.aget_cached_embeddings(["What is CET1?", "LCR"]))
+    assert sent == ["What is CET1?", "LCR"]
+    assert vectors == [[13.0], [3.0]]
+
+    restarted = EmbeddingCache(
+        max_entries=10, ttl_seconds=60, path=tmp_path / "c.sqlite"
+    )
+    found = asyncio.run(
+        restarted.aget_many("text-embedding-3-small", ["what is  cet1?"])
+    )
+    assert found[0].tolist() == [13.0]
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_embed_window_batches_in_order(monkeypatch):
+    from app.rag.embedding_generator import embed_window
+
+    calls = []
+
+    def fake_embeddings(texts, model=None):
+        calls.append(len(texts))
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr("app.rag.embedding_generator.get_embeddings", fake_embeddings)
+
+    rows = [(i, "x" * i) for i in range(1, 8)]
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        batches = list(embed_window(rows, pool, batch_size=3))
+
+    assert sorted(calls) == [1, 3, 3]
+    flat = [record for batch in batches for record in batch]
+    assert flat == [(i, [float(i)]) for i in range(1, 8)]
+
+
+def test_vector_copy_payload_matches_pgvector_binary_format():
+    import struct
+    from pgvector import Vector
+    from app.core.db import PGCOPY_HEADER, PGCOPY_TRAILER, vector_copy_payload
+
+    vectors = [[0.5, -1.0, 2.0], [1.0, 0.0, 0.25]]
+    payload = vector_copy_payload([7, 8], vectors)
+
+    assert payload.startswith(PGCOPY_HEADER) and payload.endswith(PGCOPY_TRAILER)
+    body = payload[len(PGCOPY_HEADER) : -len(PGCOPY_TRAILER)]
+    row_size = 2 + 4 + 4 + 4 + 4 + 4 * 3
+    assert len(body) == 2 * row_size
+
+    for n, (chunk_id, vector) in enumerate(zip([7, 8], vectors)):
+        row = body[n * row_size : (n + 1) * row_size]
+        assert struct.unpack_from(">hiii", row) == (2, 4, chunk_id, 4 + 4 * 3)
+        assert Vector.from_binary(row[14:]).to_list() == vector
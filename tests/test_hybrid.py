@@ -0,0 +1,34 @@
+import asyncio
+
+
+def test_hybrid_runs_branches_concurrently(monkeypatch):
+    from app.hybrid.hybrid_answer_generator import generate_hybrid_answer
+
+    running = set()
+    overlapped = []
+
+    async def branch(name, result):
+        running.add(name)
+        await asyncio.sleep(0.01)
+        overlapped.append(len(running) == 2)
+        running.discard(name)
+        return result
+
+    async def fake_analytics(query):
+        return await branch("analytics", {"summary": "stats"})
+
+    async def fake_rag(query, query_embedding=None, filters=None):
+        return await branch("rag", {"answer": "docs", "sources": [{"file": "a"}]})
+
+    monkeypatch.setattr(
+        "app.hybrid.hybrid_answer_generator.handle_analytics_query", fake_analytics
+    )
+    monkeypatch.setattr(
+        "app.hybrid.hybrid_answer_generator.generate_rag_answer", fake_rag
+    )
+
+    result = asyncio.run(generate_hybrid_answer("profitability and regulatory risks"))
+
+    assert any(overlapped)
+    assert "stats" in result["answer"] and "docs" in result["answer"]
+    assert result["sources"] == [{"file": "a"}]
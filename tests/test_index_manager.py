@@ -0,0 +1,87 @@
+def test_index_params_sized_to_row_count():
+    from app.rag.index_manager import index_params
+
+    assert index_params("ivfflat", 500) == {"lists": 1}
+    assert index_params("ivfflat", 250_000) == {"lists": 250}
+    assert index_params("ivfflat", 4_000_000) == {"lists": 2000}
+    assert index_params("hnsw", 10_000)["m"] == 16
+
+
+def test_search_params_follow_recall_target():
+    from app.rag.index_manager import search_params
+
+    low = search_params("hnsw", {}, recall_target=0.9)
+    high = search_params("hnsw", {}, recall_target=0.99)
+    assert low["ef_search"] < high["ef_search"]
+    assert search_params("hnsw", {}, recall_target=0.9, top_k=80)["ef_search"] == 80
+
+    probes = search_params("ivfflat", {"lists": 1000}, recall_target=0.95)
+    assert probes["ef_search"] is None
+    assert probes["probes"] == 50
+    assert probes["storage"] == "vector"
+    assert probes["rescore_factor"] == 1
+
+
+def test_compact_storage_overfetches_for_rescoring():
+    import pytest
+    from app.rag.index_manager import index_expression, search_params
+
+    params = search_params("hnsw", {}, recall_target=0.9, top_k=10, storage="binary")
+    assert params["rescore_factor"] == 10
+    assert params["ef_search"] >= 10 * params["rescore_factor"]
+
+    assert "halfvec_cosine_ops" in index_expression("halfvec")
+    assert "bit_hamming_ops" in index_expression("binary")
+    assert "subvector(embedding, 1, 256)::vector(256)" in index_expression(
+        "reduced", 256
+    )
+    with pytest.raises(ValueError):
+        index_expression("int8")
+
+
+def test_partition_search_groups_cover_documents_in_scope():
+    from app.rag.partitions import partition_suffix, search_groups
+
+    documents = [f"report_{i}.pdf" for i in range(10)]
+    groups = search_groups(documents, workers=4)
+    assert len(groups) == 4
+    assert sorted(name for group in groups for name in group) == documents
+
+    scoped = search_groups(documents, ["report_1.pdf", "report_2.pdf", "x.pdf"])
+    assert sorted(name for group in scoped for name in group) == [
+        "report_1.pdf",
+        "report_2.pdf",
+    ]
+    assert search_groups(documents, ["report_1.pdf"]) == []
+
+    suffix = partition_suffix("eba_risk_assessment_report_2025.pdf")
+    assert suffix == partition_suffix("eba_risk_assessment_report_2025.pdf")
+    assert len(f"document_embeddings_{suffix}_vector_new") < 63
+
+
+def test_build_params_must_match_the_method():
+    import pytest
+    from app.rag.index_manager import check_params
+
+    check_params("ivfflat", {"lists": 100})
+    check_params("hnsw", {"m": 16, "ef_construction": 64})
+    with pytest.raises(ValueError, match="lists"):
+        check_params("hnsw", {"lists": 100})
+    with pytest.raises(ValueError):
+        check_params("ivfflat", {"m": 16})
+
+
+def test_recall_queries_are_perturbed_off_the_stored_vectors():
+    import numpy as np
+    from app.rag.index_manager import perturb_queries
+
+    stored = np.random.default_rng(1).normal(size=(5, 1536))
+    stored /= np.linalg.norm(stored, axis=1, keepdims=True)
+    literals = ["[" + ",".join(map(str, v)) + "]" for v in stored]
+
+    queries = perturb_queries(literals, noise=0.3)
+    vectors = np.array([q.strip("[]").split(",") for q in queries], dtype=float)
+    cosine = np.sum(vectors * stored, axis=1) / np.linalg.norm(vectors, axis=1)
+
+    assert np.all(cosine < 0.99) and np.all(cosine > 0.9)
+    assert perturb_queries(literals, noise=0.3) == queries
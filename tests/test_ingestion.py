@@ -0,0 +1,191 @@
+def test_diff_pages_detects_changed_new_and_removed_pages():
+    from app.ingestion.ingest_documents import diff_pages
+
+    old = {"1": "a", "2": "b", "3": "c"}
+    new = {"1": "a", "2": "B", "4": "d"}
+
+    changed, stale = diff_pages(old, new)
+
+    assert sorted(changed) == [2, 4]
+    assert sorted(stale) == [2, 3]
+
+
+def test_diff_pages_unchanged_document_is_a_no_op():
+    from app.ingestion.ingest_documents import diff_pages
+
+    pages = {"1": "a", "2": "b"}
+    assert diff_pages(pages, dict(pages)) == ([], [])
+
+
+def test_csv_row_stream_renders_rows_lazily_for_copy():
+    import csv
+    import io
+    from app.core.db import CsvRowStream
+
+    rows = [
+        ("a.pdf", 1, 0, 'say "hi"\nnext'),
+        ("a.pdf", 2, 0, ""),
+        ("a.pdf", None, 1, "x\x00"),
+    ]
+    stream = CsvRowStream(iter(rows))
+
+    parts = []
+    while chunk := stream.read(8):
+        parts.append(chunk)
+
+    assert stream.row_count == 3
+    parsed = list(csv.reader(io.StringIO("".join(parts))))
+    assert parsed[0][3] == 'say "hi"\nnext'
+    assert parsed[1][3] == ""
+    assert parsed[2] == ["a.pdf", "", "1", "x"]
+
+
+def test_csv_row_stream_writes_none_as_unquoted_null():
+    from datetime import date
+    from app.core.db import CsvRowStream
+
+    rows = [("q1", None, "", date(2024, 3, 31), 1.5)]
+    # COPY (FORMAT csv): unquoted empty is NULL, quoted empty is ''
+    assert CsvRowStream(rows).read() == '"q1",,"",2024-03-31,1.5\n'
+
+
+def test_load_pdf_extracts_in_parallel_and_caches_pages(tmp_path, monkeypatch):
+    import fitz
+    from app.ingestion import pdf_loader
+
+    pdf_path = tmp_path / "doc.pdf"
+    doc = fitz.open()
+    for n in range(5):
+        doc.new_page().insert_text((72, 72), f"page {n + 1} text")
+    doc.new_page()
+    doc.save(pdf_path)
+    doc.close()
+
+    monkeypatch.setattr(pdf_loader, "PAGE_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(pdf_loader, "PAGES_PER_TASK", 2)
+
+    pages = pdf_loader.load_pdf(pdf_path, workers=2)
+
+    assert [p["page_number"] for p in pages] == [1, 2, 3, 4, 5]
+    assert pages[2]["text"] == "page 3 text"
+
+    checksum = pdf_loader.file_checksum(pdf_path)
+    assert (tmp_path / "cache" / f"{checksum}.parquet").exists()
+
+    pdf_path.unlink()
+    assert pdf_loader.load_pdf(pdf_path, checksum=checksum) == pages
+
+
+def test_chunk_pages_respects_budget_and_spans_pages():
+    from app.ingestion.chunker import chunk_pages, count_tokens
+
+    pages = [
+        {"page_number": 1, "text": "1. Introduction\n" + "Banks hold capital. " * 40},
+        {"page_number": 2, "text": "Liquidity stayed\nample in 2024. " * 40},
+    ]
+
+    chunks = chunk_pages(pages, max_tokens=100, overlap_tokens=10)
+
+    assert all(count_tokens(c["content"]) <= 100 for c in chunks)
+    assert chunks[0]["content"].startswith("1. Introduction")
+    assert any(c["page_number"] == 1 and c["page_end"] == 2 for c in chunks)
+    # Wrapped lines are rejoined and sentences are never cut mid-way
+    assert all(c["content"].endswith(".") for c in chunks)
+    assert "Liquidity stayed ample" in chunks[-1]["content"]
+    # chunk_index counts chunks per starting page
+    first_page = [c["chunk_index"] for c in chunks if c["page_number"] == 1]
+    assert first_page == list(range(len(first_page)))
+
+
+def test_chunk_pages_overlap_never_pushes_chunks_over_budget():
+    import random
+    from app.ingestion.chunker import chunk_pages, count_tokens
+
+    rng = random.Random(7)
+    words = ["capital", "banks", "liquidity", "risk", "the", "of", "ratio", "rose"]
+    sentences = [
+        " ".join(rng.choice(words) for _ in range(rng.randint(3, 80))).capitalize()
+        + "."
+        for _ in range(200)
+    ]
+
+    chunks = chunk_pages(
+        [{"page_number": 1, "text": " ".join(sentences)}],
+        max_tokens=100,
+        overlap_tokens=20,
+    )
+
+    assert max(count_tokens(c["content"]) for c in chunks) <= 100
+    # No chunk is just the previous one with a sentence appended
+    for prev, chunk in zip(chunks, chunks[1:]):
+        assert not chunk["content"].startswith(prev["content"])
+
+
+def test_chunk_pages_starts_new_chunk_at_heading():
+    from app.ingestion.chunker import chunk_pages
+
+    text = "Capital ratios rose. " * 20 + "\nArticle 92\nOwn funds requirements apply."
+    chunks = chunk_pages([{"page_number": 3, "text": text}], max_tokens=400)
+
+    assert len(chunks) == 2
+    assert chunks[1]["content"].startswith("Article 92")
+
+
+def test_contiguous_runs_split_at_unselected_pages():
+    from app.ingestion.ingest_documents import contiguous_runs
+
+    pages = [{"page_number": n, "text": "x"} for n in (1, 2, 3, 5, 6)]
+    runs = contiguous_runs(pages, {1, 2, 5, 6})
+
+    assert [[p["page_number"] for p in run] for run in runs] == [[1, 2], [5, 6]]
+
+
+def test_parse_raq_workbook_produces_typed_long_table(tmp_path):
+    import pandas as pd
+    from app.ingestion import ingest_structured
+
+    sheet = pd.DataFrame(
+        {
+            "Unnamed: 0": [None] * 5,
+            "Autumn-25": ["Q1 Expect higher ROE?", "a) Yes", "Q2 Priorities", "1", 2],
+            "Unnamed: 2": [None, 0.25, None, 0.5, 0.4],
+            **{
+                column: [None, 0.2, None, 0.6, None]
+                for column in list(ingest_structured.RAQ_PERIOD_COLUMNS)[1:]
+            },
+        }
+    )
+    path = tmp_path / "raq.xlsx"
+    sheet.to_excel(path, sheet_name="Results", index=False)
+
+    table = ingest_structured.parse_raq_workbook(path)
+
+    assert table.schema == ingest_structured.SURVEY_SCHEMA
+    latest = [r for r in table.to_pylist() if r["period"] == "TR2025_AUTUMN"]
+    assert [(r["item_label"], r["value"], r["answer_rank"]) for r in latest] == [
+        ("Q1 Expect higher ROE?", None, None),
+        ("a) Yes", 0.25, None),
+        ("Q2 Priorities", None, None),
+        ("Q2 Priorities", 0.5, 1),
+        ("Q2 Priorities", 0.4, 2),
+    ]
+    assert table.num_rows == 5 + 2 * 6
+
+
+def test_convert_workbook_keeps_the_committed_parquet(tmp_path, monkeypatch):
+    import pyarrow.parquet as pq
+    from app.analytics.arrow_backend import SURVEY_PARQUET_PATH
+    from app.ingestion import ingest_structured
+
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(ingest_structured, "STRUCTURED_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(
+        ingest_structured, "LOADED_SURVEY_PATH", cache_dir / "loaded.parquet"
+    )
+    committed = SURVEY_PARQUET_PATH.read_bytes()
+
+    table = ingest_structured.convert_workbook(ingest_structured.RAQ_WORKBOOK, "abc")
+
+    assert SURVEY_PARQUET_PATH.read_bytes() == committed
+    assert pq.read_table(cache_dir / "loaded.parquet").num_rows == table.num_rows
+    assert (cache_dir / f"abc-v{ingest_structured.RAQ_PARSER_VERSION}.parquet").exists()
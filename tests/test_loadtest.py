@@ -0,0 +1,74 @@
+import asyncio
+
+
+def test_mock_openai_speaks_the_openai_protocol():
+    import httpx
+    from openai import AsyncOpenAI
+    from app.loadtest.mock_openai import create_app
+
+    app = create_app(
+        embedding_latency_ms=0, first_token_ms=0, token_ms=0, answer_tokens=5
+    )
+
+    async def run():
+        http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+        client = AsyncOpenAI(
+            api_key="mock", base_url="http://mock/v1", http_client=http_client
+        )
+        embeddings = await client.embeddings.create(
+            model="text-embedding-3-small", input=["capital", "liquidity"]
+        )
+        stream = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": "hi"}],
+            stream=True,
+        )
+        tokens = [c.choices[0].delta.content async for c in stream if c.choices]
+        await http_client.aclose()
+        return embeddings, tokens
+
+    embeddings, tokens = asyncio.run(run())
+
+    assert [len(d.embedding) for d in embeddings.data] == [1536, 1536]
+    assert len([t for t in tokens if t]) == 5
+
+
+def test_load_test_reports_per_type_latency_and_saturation():
+    import httpx
+    from fastapi import FastAPI
+    from app.loadtest.load_test import DEFAULT_QUERIES, run_load_test
+
+    app = FastAPI()
+
+    @app.post("/query")
+    async def query(body: dict):
+        slow = body["query"] in DEFAULT_QUERIES["document"]
+        await asyncio.sleep(0.05 if slow else 0.0)
+        return {
+            "query_type": "document" if slow else "analytics",
+            "answer": "x",
+            "sources": [],
+        }
+
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://api"
+    )
+    report = asyncio.run(
+        run_load_test(
+            "http://api",
+            rps_steps=[40, 80],
+            duration=0.5,
+            mix={"analytics": 0.5, "document": 0.5},
+            slo_ms=30,
+            client=client,
+        )
+    )
+
+    first = report["steps"][0]
+    assert first["sent"] == 20
+    assert set(first["by_type"]) == {"analytics", "document"}
+    assert sum(first["by_type"]["document"]["histogram"].values()) == (
+        first["by_type"]["document"]["count"]
+    )
+    # Document queries take ~50ms, so the 30ms p95 objective is broken at once
+    assert report["saturation"] == {"saturated_at_rps": 40, "max_sustained_rps": None}
@@ -1,7 +1,10 @@
+import asyncio
+
+
 def test_rag_answer_structure(monkeypatch):
     from app.rag.answer_generator import answer_with_rag
 
-    def fake_retrieve(*args, **kwargs):
+    async def fake_retrieve(*args, **kwargs):
         return [
             {
                 "file_name": "doc.pdf",
@@ -13,8 +16,194 @@ def test_rag_answer_structure(monkeypatch):
 
     monkeypatch.setattr("app.rag.answer_generator.retrieve_chunks", fake_retrieve)
 
-    monkeypatch.setattr("app.rag.answer_generator.chat", lambda **kwargs: "test answer")
+    async def fake_chat(**kwargs):
+        return "test answer"
 
-    result = answer_with_rag("test query")
+    monkeypatch.setattr("app.rag.answer_generator.achat", fake_chat)
+
+    result = asyncio.run(answer_with_rag("test query"))
     assert "answer" in result
     assert "chunks" in result
+
+
+def test_semantic_answer_cache_matches_similar_queries():
+    from app.rag.answer_cache import SemanticAnswerCache
+
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=10)
+    entry = {"answer": "cached", "sources": [{"file": "doc.pdf", "page": 1}]}
+    cache.put([1.0, 0.0], [1, 2], 1, entry)
+
+    assert cache.get([0.99, 0.05], [1, 2], 1) == entry
+    assert cache.get([0.0, 1.0], [1, 2], 1) is None
+    assert cache.get([1.0, 0.0], [2, 3], 1) is None
+    assert cache.get([1.0, 0.0], [1, 2], 2) is None
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    from app.rag.retriever import reciprocal_rank_fusion
+
+    vector = [{"chunk_id": 1}, {"chunk_id": 2}, {"chunk_id": 3}]
+    lexical = [{"chunk_id": 3}, {"chunk_id": 4}]
+
+    fused = reciprocal_rank_fusion([vector, lexical], top_k=3)
+
+    assert [c["chunk_id"] for c in fused] == [3, 1, 2]
+    assert fused[0]["rrf_score"] > fused[1]["rrf_score"]
+
+
+def test_filter_params_normalise_search_filters():
+    from datetime import date
+    import pytest
+    from app.rag.retriever import filter_params
+
+    params = filter_params({"file_names": "report.pdf", "published_to": "2025-12-31"})
+    assert params["file_names"] == ["report.pdf"]
+    assert params["published_to"] == date(2025, 12, 31)
+    assert params["page_from"] is None
+    assert all(v is None for v in filter_params(None).values())
+
+    with pytest.raises(ValueError):
+        filter_params({"author": "EBA"})
+
+
+def test_mmr_order_prefers_diverse_sources():
+    from app.rag.context_packer import mmr_order
+
+    vectors = [[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]]
+
+    assert mmr_order([1.0, 0.0], vectors, lambda_=1.0) == [0, 1, 2]
+    assert mmr_order([1.0, 0.0], vectors, lambda_=0.3) == [0, 2, 1]
+
+
+def test_merge_adjacent_removes_overlapping_text():
+    from app.rag.context_packer import merge_adjacent
+
+    chunks = [
+        {
+            "chunk_id": 8,
+            "file_name": "a.pdf",
+            "page_number": 2,
+            "content": "overlap text here. Second part ends.",
+            "similarity": 0.8,
+        },
+        {
+            "chunk_id": 7,
+            "file_name": "a.pdf",
+            "page_number": 2,
+            "content": "First part. Shared overlap text here.",
+            "similarity": 0.7,
+        },
+        {
+            "chunk_id": 9,
+            "file_name": "b.pdf",
+            "page_number": 2,
+            "content": "Unrelated.",
+            "similarity": 0.6,
+        },
+    ]
+
+    merged = merge_adjacent(chunks)
+
+    assert len(merged) == 2
+    assert merged[0]["content"] == (
+        "First part. Shared overlap text here. Second part ends."
+    )
+    assert merged[0]["chunk_id"] == 8
+    assert merged[0]["similarity"] == 0.8
+
+
+def test_pack_context_fills_token_budget(monkeypatch):
+    from app.rag import context_packer
+
+    async def no_embeddings(candidates):
+        return {}
+
+    monkeypatch.setattr(context_packer, "_stored_embeddings", no_embeddings)
+
+    candidates = [
+        {"chunk_id": i, "file_name": f"{i}.pdf", "page_number": 1, "content": "w" * 400}
+        for i in range(4)
+    ]
+
+    packed = asyncio.run(
+        context_packer.pack_context([1.0], candidates, max_chunks=3, token_budget=250)
+    )
+
+    assert [c["chunk_id"] for c in packed] == [0, 1]
+
+
+def test_pack_context_refills_slots_freed_by_merging(monkeypatch):
+    from app.rag import context_packer
+
+    async def no_embeddings(candidates):
+        return {}
+
+    monkeypatch.setattr(context_packer, "_stored_embeddings", no_embeddings)
+
+    candidates = [
+        {
+            "chunk_id": 1,
+            "file_name": "a.pdf",
+            "page_number": 2,
+            "content": "First part. Shared overlap text here.",
+        },
+        {
+            "chunk_id": 2,
+            "file_name": "a.pdf",
+            "page_number": 2,
+            "content": "overlap text here. Second part ends.",
+        },
+        {"chunk_id": 3, "file_name": "b.pdf", "page_number": 1, "content": "Other."},
+        {"chunk_id": 4, "file_name": "c.pdf", "page_number": 1, "content": "Third."},
+    ]
+
+    packed = asyncio.run(
+        context_packer.pack_context([1.0], candidates, max_chunks=3, token_budget=1000)
+    )
+
+    assert [c["chunk_id"] for c in packed] == [1, 3, 4]
+    assert packed[0]["content"].endswith("Second part ends.")
+
+
+def test_partition_fan_out_folds_groups_into_free_connections(monkeypatch):
+    from contextlib import asynccontextmanager
+    from app.rag import retriever
+
+    searched = []
+    open_connections = 0
+
+    class FakeResult:
+        def __init__(self, file_names):
+            self.rows = [
+                {"chunk_id": len(name), "file_name": name, "similarity": len(name) / 10}
+                for name in file_names
+            ]
+
+        def mappings(self):
+            return self
+
+        def all(self):
+            return self.rows
+
+    class FakeConnection:
+        async def execute(self, statement, params):
+            searched.append(sorted(params["file_names"]))
+            return FakeResult(params["file_names"])
+
+    class FakeEngine:
+        @asynccontextmanager
+        async def connect(self):
+            nonlocal open_connections
+            open_connections += 1
+            assert open_connections <= 2
+            yield FakeConnection()
+            open_connections -= 1
+
+    monkeypatch.setattr(retriever, "async_engine", FakeEngine())
+    monkeypatch.setattr(retriever, "free_connections", lambda engine: 2)
+
+    groups = [["a.pdf"], ["bb.pdf"], ["ccc.pdf"], ["dddd.pdf"]]
+    results = asyncio.run(retriever._search_partitions([1.0], 3, {}, groups))
+
+    assert sorted(searched) == [["a.pdf", "ccc.pdf"], ["bb.pdf", "dddd.pdf"]]
+    assert [r["file_name"] for r in results] == ["dddd.pdf", "ccc.pdf", "bb.pdf"]
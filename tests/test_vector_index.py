@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def _write_snapshot(index_dir, version, vectors, chunk_ids):
+    from app.rag import vector_index as vi
+
+    snapshot = index_dir / version
+    snapshot.mkdir(parents=True)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.save(snapshot / vi.MATRIX_FILE, matrix)
+    pq.write_table(
+        pa.table(
+            {
+                "chunk_id": chunk_ids,
+                "file_name": ["doc.pdf"] * len(chunk_ids),
+                "page_number": list(range(1, len(chunk_ids) + 1)),
+                "content": [f"chunk {i}" for i in chunk_ids],
+            }
+        ),
+        snapshot / vi.METADATA_FILE,
+    )
+    (snapshot / vi.MANIFEST_FILE).write_text(json.dumps({"version": version}))
+    (index_dir / vi.CURRENT_FILE).write_text(version)
+
+
+def test_vector_index_top_k_and_reload(tmp_path):
+    from app.rag.vector_index import VectorIndex
+
+    _write_snapshot(tmp_path, "v1", [[1, 0], [0.8, 0.6], [0, 1]], [10, 11, 12])
+    index = VectorIndex(tmp_path)
+
+    results = index.search([1.0, 0.1], top_k=2)
+    assert [r["chunk_id"] for r in results] == [10, 11]
+    assert set(results[0]) == {
+        "chunk_id",
+        "file_name",
+        "page_number",
+        "content",
+        "similarity",
+    }
+    assert results[0]["similarity"] > results[1]["similarity"]
+
+    _write_snapshot(tmp_path, "v2", [[0, 1], [1, 0]], [20, 21])
+    assert index.search([0.0, 1.0], top_k=1)[0]["chunk_id"] == 20
+    assert index.version == "v2"
+
+
+def test_snapshot_versions_are_unique_and_ordered():
+    from app.rag.vector_index import snapshot_version
+
+    versions = [snapshot_version() for _ in range(100)]
+    assert len(set(versions)) == len(versions)
+    assert versions == sorted(versions)
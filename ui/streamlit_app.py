@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 import os
 
 API_URL = os.getenv("API_URL", "http://localhost:8000")
@@ -29,69 +30,108 @@ with st.container():
         if st.button("🗑️ Clear", use_container_width=True):
             st.rerun()
 
-if ask_button and query.strip():
-    with st.spinner("Processing your query..."):
-        try:
-            response = requests.post(
-                f"{API_URL}/query", json={"query": query}, timeout=30
-            )
-
-            if response.status_code == 200:
-                data = response.json()
 
-                st.markdown("---")
+def iter_sse(response):
+    """Parse a server-sent event stream into (event, data) pairs."""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:") :].strip())
+        elif not line:
+            event = "message"
 
-                query_type = data.get("query_type", "unknown")
 
-                if query_type == "analytics":
-                    badge_color = "blue"
-                    badge_text = "📊 Analytics"
-                elif query_type == "document":
-                    badge_color = "green"
-                    badge_text = "📄 Document"
-                else:
-                    badge_color = "orange"
-                    badge_text = "🔄 Hybrid"
+def render_query_type(query_type):
+    if query_type == "analytics":
+        badge_color = "blue"
+        badge_text = "📊 Analytics"
+    elif query_type == "document":
+        badge_color = "green"
+        badge_text = "📄 Document"
+    else:
+        badge_color = "orange"
+        badge_text = "🔄 Hybrid"
 
-                st.markdown(f"**Query Type:** :{badge_color}[{badge_text}]")
+    st.markdown(f"**Query Type:** :{badge_color}[{badge_text}]")
 
-                st.markdown("### Answer")
-                st.markdown(data.get("answer", "No answer provided"))
 
-                sources = data.get("sources", [])
-                if sources:
-                    st.markdown("---")
-                    st.markdown("### 📚 Sources")
+def render_sources(sources):
+    if not sources:
+        return
 
-                    for i, src in enumerate(sources, 1):
-                        file_name = src.get("file", "Unknown")
-                        page = src.get("page")
-                        score = src.get("score")
+    st.markdown("---")
+    st.markdown("### 📚 Sources")
 
-                        source_text = f"**{i}.** {file_name}"
-                        if page:
-                            source_text += f" (page {page})"
-                        if score:
-                            source_text += f" — relevance: {score:.2%}"
+    for i, src in enumerate(sources, 1):
+        file_name = src.get("file", "Unknown")
+        page = src.get("page")
+        score = src.get("score")
 
-                        st.markdown(source_text)
+        source_text = f"**{i}.** {file_name}"
+        if page:
+            source_text += f" (page {page})"
+        if score:
+            source_text += f" — relevance: {score:.2%}"
 
-            elif response.status_code == 400:
-                st.error("❌ Invalid query. Please enter a valid question.")
+        st.markdown(source_text)
 
-            else:
-                st.error(f"❌ Error: {response.status_code} - {response.text}")
 
-        except requests.exceptions.ConnectionError:
-            st.error(
-                "❌ Cannot connect to the API. Make sure the FastAPI server is running."
+if ask_button and query.strip():
+    try:
+        with st.spinner("Processing your query..."):
+            # Read timeout applies between streamed events, not to the whole answer
+            response = requests.post(
+                f"{API_URL}/query/stream",
+                json={"query": query},
+                stream=True,
+                timeout=(5, 30),
             )
 
-        except requests.exceptions.Timeout:
-            st.error("❌ Request timed out. Please try again.")
+        if response.status_code == 200:
+            st.markdown("---")
+
+            type_slot = st.empty()
+            st.markdown("### Answer")
+            answer_slot = st.empty()
+            sources_slot = st.container()
+
+            answer = ""
+
+            for event, data in iter_sse(response):
+                if event == "meta":
+                    with type_slot.container():
+                        render_query_type(data.get("query_type", "unknown"))
+                    with sources_slot:
+                        render_sources(data.get("sources", []))
+
+                elif event == "token":
+                    answer += data.get("text", "")
+                    answer_slot.markdown(answer + "▌")
+
+                elif event == "error":
+                    st.error(f"❌ Error: {data.get('detail', 'Unknown error')}")
+                    break
+
+            answer_slot.markdown(answer or "No answer provided")
+
+        elif response.status_code == 400:
+            st.error("❌ Invalid query. Please enter a valid question.")
+
+        else:
+            st.error(f"❌ Error: {response.status_code} - {response.text}")
+
+    except requests.exceptions.ConnectionError:
+        st.error(
+            "❌ Cannot connect to the API. Make sure the FastAPI server is running."
+        )
+
+    except requests.exceptions.Timeout:
+        st.error("❌ Request timed out. Please try again.")
 
-        except Exception as e:
-            st.error(f"❌ Unexpected error: {str(e)}")
+    except Exception as e:
+        st.error(f"❌ Unexpected error: {str(e)}")
 
 elif ask_button:
     st.warning("⚠️ Please enter a question first.")